@@ -0,0 +1,62 @@
+import click
+from src.models.schema import backfill_phone_numbers
+from src.services.search import rebuild_product_search
+from src.services.idempotency import sweep_expired_keys
+from src.services.rollup import rebuild_sales_rollup
+from src.services.product_stats import refresh_product_sales_stats
+from src.services.customer_stats import reconcile_customer_stats
+from src.services.reorder import refresh_reorder_suggestions
+from src.services.forecast import refresh_forecasts
+
+
+def register_commands(app):
+    """تسجيل أوامر الصيانة في واجهة flask"""
+
+    @app.cli.command('rebuild-search-index')
+    def rebuild_search_index_command():
+        """إعادة بناء فهرس البحث النصي للمنتجات"""
+        count = rebuild_product_search()
+        click.echo(f'تمت فهرسة {count} منتج')
+
+    @app.cli.command('sweep-idempotency-keys')
+    def sweep_idempotency_keys_command():
+        """حذف مفاتيح Idempotency-Key المنتهية"""
+        count = sweep_expired_keys()
+        click.echo(f'تم حذف {count} مفتاح منتهي')
+
+    @app.cli.command('rebuild-sales-rollup')
+    def rebuild_sales_rollup_command():
+        """إعادة حساب جداول الملخص اليومي للمبيعات من السجل الكامل"""
+        days = rebuild_sales_rollup()
+        click.echo(f'تم حساب ملخص {days} يوم')
+
+    @app.cli.command('refresh-product-stats')
+    @click.option('--full', is_flag=True, help='إعادة حساب إجمالي المبيعات أيضاً')
+    def refresh_product_stats_command(full):
+        """إعادة حساب عدادات مبيعات المنتجات من الملخص اليومي"""
+        refresh_product_sales_stats(full=full)
+        click.echo('تم تحديث عدادات المنتجات')
+
+    @app.cli.command('reconcile-customer-stats')
+    def reconcile_customer_stats_command():
+        """إعادة حساب إنفاق العملاء وعدد فواتيرهم وآخر شراء من جدول المبيعات"""
+        count = reconcile_customer_stats()
+        click.echo(f'تمت مطابقة {count} عميل')
+
+    @app.cli.command('normalize-phone-numbers')
+    def normalize_phone_numbers_command():
+        """إعادة توحيد أرقام هواتف جميع العملاء (بعد تغيير PHONE_COUNTRY_CODE مثلاً)"""
+        count = backfill_phone_numbers(only_missing=False)
+        click.echo(f'تم توحيد أرقام {count} عميل')
+
+    @app.cli.command('refresh-reorder-suggestions')
+    def refresh_reorder_suggestions_command():
+        """إعادة حساب اقتراحات إعادة الطلب لكل المنتجات من سرعة المبيعات"""
+        count = refresh_reorder_suggestions()
+        click.echo(f'تم حساب اقتراحات {count} منتج')
+
+    @app.cli.command('refresh-forecasts')
+    def refresh_forecasts_command():
+        """إعادة حساب توقعات مبيعات المنتجات والفئات"""
+        count = refresh_forecasts()
+        click.echo(f'تم حساب توقعات {count} منتج')
@@ -38,6 +38,40 @@ class Config:
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or SECRET_KEY
     JWT_ACCESS_TOKEN_EXPIRES = 3600  # ساعة واحدة
     
+    # مدة الاحتفاظ بمفاتيح Idempotency-Key (بالثواني) والفاصل بين عمليات تنظيفها
+    IDEMPOTENCY_KEY_TTL = int(os.environ.get('IDEMPOTENCY_KEY_TTL', 24 * 3600))
+    IDEMPOTENCY_SWEEP_INTERVAL = 600
+    # مهلة حجز المفتاح أثناء تنفيذ الطلب الأول (أطول من مهلة العامل في gunicorn)،
+    # بعدها تستطيع إعادة المحاولة تنفيذ الطلب إذا توقف العامل قبل تسجيل النتيجة
+    IDEMPOTENCY_LOCK_TIMEOUT = int(os.environ.get('IDEMPOTENCY_LOCK_TIMEOUT', 60))
+    
+    # مدة صلاحية تقارير الفترات المفتوحة (اليوم/الشهر الحالي) بالثواني
+    REPORT_CACHE_OPEN_TTL = int(os.environ.get('REPORT_CACHE_OPEN_TTL', 60))
+    
+    # البث المباشر: أقصى عدد اتصالات لكل عملية (كل اتصال يشغل خيطاً من خيوط gthread،
+    # فيجب أن يبقى أقل بكثير من --threads) وأقصى مدة للاتصال الواحد قبل إعادة الاتصال
+    LIVE_SALES_MAX_SUBSCRIBERS = int(os.environ.get('LIVE_SALES_MAX_SUBSCRIBERS', 2))
+    LIVE_SALES_STREAM_SECONDS = int(os.environ.get('LIVE_SALES_STREAM_SECONDS', 300))
+    
+    # المهام الخلفية: عدد الخيوط لكل عملية، والفاصل بين نبضات المهام قيد التنفيذ (وفحص المتوقفة)،
+    # والمدة بلا نبضة التي تعتبر بعدها المهمة متوقفة فتعاد إلى الانتظار
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+    JOB_HEARTBEAT_INTERVAL = int(os.environ.get('JOB_HEARTBEAT_INTERVAL', 15))
+    JOB_STALE_AFTER = int(os.environ.get('JOB_STALE_AFTER', 60))
+    
+    # اقتراحات إعادة الطلب: أيام تاريخ المبيعات المستخدمة، ومعامل التنعيم الأسي،
+    # ومدة التوريد الافتراضية للموردين بلا أوامر مستلمة، وعدد الأيام التي يغطيها الطلب
+    REORDER_HISTORY_DAYS = int(os.environ.get('REORDER_HISTORY_DAYS', 90))
+    REORDER_SMOOTHING = float(os.environ.get('REORDER_SMOOTHING', 0.1))
+    REORDER_LEAD_TIME_DAYS = int(os.environ.get('REORDER_LEAD_TIME_DAYS', 7))
+    REORDER_REVIEW_DAYS = int(os.environ.get('REORDER_REVIEW_DAYS', 14))
+    
+    # توقع المبيعات: أيام التاريخ (مضاعف للأسبوع، 104 أسابيع = سنتان كما في bench/forecast.py)،
+    # وأيام التوقع، وعدد المنتجات في كل دفعة حساب
+    FORECAST_HISTORY_DAYS = int(os.environ.get('FORECAST_HISTORY_DAYS', 728))
+    FORECAST_HORIZON_DAYS = 30
+    FORECAST_CHUNK_SIZE = int(os.environ.get('FORECAST_CHUNK_SIZE', 5000))
+    
     # إعدادات التطبيق
     DEBUG = os.environ.get('FLASK_DEBUG', 'False').lower() == 'true'
     PORT = int(os.environ.get('PORT', 5000))
@@ -14,6 +14,15 @@ from src.routes.customers import customers_bp
 from src.routes.suppliers import suppliers_bp
 from src.routes.sales import sales_bp
 from src.routes.settings import settings_bp
+from src.routes.jobs import jobs_bp
+from src.routes.purchase_orders import purchase_orders_bp
+from src.models.schema import upgrade_schema, backfill_normalized_names, backfill_phone_numbers
+from src.services.search import setup_product_search, rebuild_product_search
+from src.services.rollup import ensure_sales_rollup
+from src.services.product_stats import ensure_product_sales_stats
+from src.services.customer_stats import ensure_customer_stats
+from src.services.jobs import init_jobs
+from src.cli import register_commands
 
 def create_app():
     """إنشاء وتكوين التطبيق"""
@@ -34,15 +43,35 @@ def create_app():
     app.register_blueprint(suppliers_bp, url_prefix='/api')
     app.register_blueprint(sales_bp, url_prefix='/api')
     app.register_blueprint(settings_bp, url_prefix='/api')
+    app.register_blueprint(jobs_bp, url_prefix='/api')
+    app.register_blueprint(purchase_orders_bp, url_prefix='/api')
     
     # تهيئة قاعدة البيانات
     db.init_app(app)
     
+    # أوامر الصيانة (flask rebuild-search-index ...)
+    register_commands(app)
+    
     # إنشاء الجداول إذا لم تكن موجودة
     with app.app_context():
         try:
             db.create_all()
+            upgrade_schema()
             print("✅ تم إنشاء جداول قاعدة البيانات بنجاح")
+            
+            # تعبئة الأسماء الموحدة للسجلات السابقة لإضافة الأعمدة
+            backfilled = backfill_normalized_names()
+            backfill_phone_numbers()
+            if setup_product_search():
+                if backfilled:
+                    rebuild_product_search()
+                print("✅ تم تفعيل فهرس البحث النصي للمنتجات")
+            ensure_sales_rollup()
+            ensure_product_sales_stats()
+            ensure_customer_stats()
+            
+            # تشغيل المهام الخلفية واستئناف ما لم يكتمل قبل إعادة التشغيل
+            init_jobs(app)
         except Exception as e:
             print(f"❌ خطأ في إنشاء قاعدة البيانات: {e}")
     
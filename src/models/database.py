@@ -1,8 +1,19 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
 from datetime import datetime
+from src.utils.arabic import normalize_arabic
+from src.utils.phone import normalize_phone
 
 db = SQLAlchemy()
 
+def prefix_search_index(table_name, column_name):
+    """فهرس varchar_pattern_ops في PostgreSQL للبحث بالبادئة (LIKE 'abc%') مع ترتيب اللغة"""
+    # في SQLite يكفي الفهرس العادي لأن البحث بالبادئة نطاق بترتيب ثنائي
+    return db.Index(
+        f'ix_{table_name}_{column_name}_pattern', column_name,
+        postgresql_ops={column_name: 'varchar_pattern_ops'}
+    ).ddl_if(dialect='postgresql')
+
 class Category(db.Model):
     __tablename__ = 'categories'
     
@@ -14,9 +25,13 @@ class Category(db.Model):
 
 class Supplier(db.Model):
     __tablename__ = 'suppliers'
+    __table_args__ = (
+        prefix_search_index('suppliers', 'name_normalized'),
+    )
     
     supplier_id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(255), nullable=False)
+    name_normalized = db.Column(db.String(255), index=True)
     address = db.Column(db.Text)
     phone_number = db.Column(db.String(20))
     email = db.Column(db.String(255), unique=True)
@@ -28,17 +43,21 @@ class Supplier(db.Model):
 
 class Product(db.Model):
     __tablename__ = 'products'
+    __table_args__ = (
+        prefix_search_index('products', 'name_normalized'),
+    )
     
     product_id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(255), nullable=False)
+    name_normalized = db.Column(db.String(255), index=True)
     description = db.Column(db.Text)
     price = db.Column(db.Numeric(10, 2), nullable=False)
     quantity = db.Column(db.Integer, nullable=False, default=0)
     serial_number = db.Column(db.String(255), unique=True)
     brand = db.Column(db.String(100))
     model = db.Column(db.String(100))
-    category_id = db.Column(db.Integer, db.ForeignKey('categories.category_id'))
-    supplier_id = db.Column(db.Integer, db.ForeignKey('suppliers.supplier_id'))
+    category_id = db.Column(db.Integer, db.ForeignKey('categories.category_id'), index=True)
+    supplier_id = db.Column(db.Integer, db.ForeignKey('suppliers.supplier_id'), index=True)
     location = db.Column(db.String(255))
     min_stock_level = db.Column(db.Integer, default=5)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -49,12 +68,27 @@ class Product(db.Model):
 
 class Customer(db.Model):
     __tablename__ = 'customers'
+    __table_args__ = (
+        db.Index('ix_customers_lifetime_spend', 'lifetime_spend', 'customer_id'),
+        db.Index('ix_customers_purchase_count', 'purchase_count', 'customer_id'),
+        db.Index('ix_customers_last_purchase_at', 'last_purchase_at', 'customer_id'),
+        prefix_search_index('customers', 'name_normalized'),
+        prefix_search_index('customers', 'phone_digits_reversed'),
+    )
     
     customer_id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(255), nullable=False)
+    name_normalized = db.Column(db.String(255), index=True)
     address = db.Column(db.Text)
     phone_number = db.Column(db.String(20))
+    # الرقم الموحد (966501234567) ومعكوسه للبحث بآخر أرقام الهاتف عبر الفهرس
+    phone_digits = db.Column(db.String(20), index=True)
+    phone_digits_reversed = db.Column(db.String(20), index=True)
     email = db.Column(db.String(255), unique=True)
+    # قيم مشتقة من المبيعات تحدث مع كل بيع أو إرجاع (انظر services/customer_stats.py)
+    lifetime_spend = db.Column(db.Numeric(12, 2), default=0)
+    purchase_count = db.Column(db.Integer, default=0)
+    last_purchase_at = db.Column(db.DateTime)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -63,6 +97,10 @@ class Customer(db.Model):
 
 class Sale(db.Model):
     __tablename__ = 'sales'
+    __table_args__ = (
+        db.Index('ix_sales_sale_date_status', 'sale_date', 'status'),
+        db.Index('ix_sales_customer_id_sale_date', 'customer_id', 'sale_date'),
+    )
     
     sale_id = db.Column(db.Integer, primary_key=True)
     customer_id = db.Column(db.Integer, db.ForeignKey('customers.customer_id'))
@@ -82,8 +120,8 @@ class SaleItem(db.Model):
     __tablename__ = 'sale_items'
     
     sale_item_id = db.Column(db.Integer, primary_key=True)
-    sale_id = db.Column(db.Integer, db.ForeignKey('sales.sale_id'), nullable=False)
-    product_id = db.Column(db.Integer, db.ForeignKey('products.product_id'), nullable=False)
+    sale_id = db.Column(db.Integer, db.ForeignKey('sales.sale_id'), nullable=False, index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.product_id'), nullable=False, index=True)
     quantity = db.Column(db.Integer, nullable=False)
     unit_price = db.Column(db.Numeric(10, 2), nullable=False)
     total_price = db.Column(db.Numeric(10, 2), nullable=False)
@@ -95,11 +133,46 @@ class Return(db.Model):
     __tablename__ = 'returns'
     
     return_id = db.Column(db.Integer, primary_key=True)
-    sale_item_id = db.Column(db.Integer, db.ForeignKey('sale_items.sale_item_id'), nullable=False)
+    sale_item_id = db.Column(db.Integer, db.ForeignKey('sale_items.sale_item_id'), nullable=False, index=True)
     return_date = db.Column(db.DateTime, default=datetime.utcnow)
     quantity = db.Column(db.Integer, nullable=False)
     reason = db.Column(db.Text)
 
+class PurchaseOrder(db.Model):
+    __tablename__ = 'purchase_orders'
+    __table_args__ = (
+        db.Index('ix_purchase_orders_supplier_id_order_id', 'supplier_id', 'purchase_order_id'),
+    )
+    
+    purchase_order_id = db.Column(db.Integer, primary_key=True)
+    supplier_id = db.Column(db.Integer, db.ForeignKey('suppliers.supplier_id'), nullable=False)
+    # pending ثم received أو cancelled
+    status = db.Column(db.String(20), nullable=False, default='pending', index=True)
+    order_date = db.Column(db.DateTime, default=datetime.utcnow)
+    expected_date = db.Column(db.Date)
+    received_at = db.Column(db.DateTime)
+    total_amount = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    notes = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # العلاقات
+    supplier = db.relationship('Supplier', backref='purchase_orders', lazy=True)
+    items = db.relationship('PurchaseOrderItem', backref='purchase_order', lazy=True, cascade='all, delete-orphan')
+
+class PurchaseOrderItem(db.Model):
+    __tablename__ = 'purchase_order_items'
+    
+    purchase_order_item_id = db.Column(db.Integer, primary_key=True)
+    purchase_order_id = db.Column(db.Integer, db.ForeignKey('purchase_orders.purchase_order_id'), nullable=False, index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.product_id'), nullable=False, index=True)
+    quantity = db.Column(db.Integer, nullable=False)
+    unit_cost = db.Column(db.Numeric(10, 2), nullable=False)
+    total_cost = db.Column(db.Numeric(12, 2), nullable=False)
+    
+    # العلاقات
+    product = db.relationship('Product', lazy=True)
+
 class User(db.Model):
     __tablename__ = 'users'
     
@@ -119,3 +192,147 @@ class Setting(db.Model):
     value = db.Column(db.Text)
     description = db.Column(db.Text)
 
+class SalesDailyRollup(db.Model):
+    __tablename__ = 'sales_daily_rollup'
+    
+    # ملخص المبيعات لكل يوم، يحدث في نفس معاملة البيع أو الإرجاع
+    day = db.Column(db.Date, primary_key=True)
+    revenue = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    transactions = db.Column(db.Integer, nullable=False, default=0)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    tax_amount = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    discount_amount = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    returned_units = db.Column(db.Integer, nullable=False, default=0)
+    returns_amount = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+
+class SalesDailyProductRollup(db.Model):
+    __tablename__ = 'sales_daily_product_rollup'
+    
+    day = db.Column(db.Date, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.product_id'), primary_key=True)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    returned_units = db.Column(db.Integer, nullable=False, default=0)
+    returns_amount = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+
+class ProductSalesStats(db.Model):
+    __tablename__ = 'product_sales_stats'
+    
+    # عدادات صافي المبيعات (بعد المرتجعات) لكل منتج لآخر 7 و30 و90 يوماً ومنذ البداية
+    product_id = db.Column(db.Integer, db.ForeignKey('products.product_id'), primary_key=True)
+    units_7d = db.Column(db.Integer, nullable=False, default=0, index=True)
+    revenue_7d = db.Column(db.Numeric(14, 2), nullable=False, default=0, index=True)
+    units_30d = db.Column(db.Integer, nullable=False, default=0, index=True)
+    revenue_30d = db.Column(db.Numeric(14, 2), nullable=False, default=0, index=True)
+    units_90d = db.Column(db.Integer, nullable=False, default=0, index=True)
+    revenue_90d = db.Column(db.Numeric(14, 2), nullable=False, default=0, index=True)
+    units_total = db.Column(db.Integer, nullable=False, default=0, index=True)
+    revenue_total = db.Column(db.Numeric(14, 2), nullable=False, default=0, index=True)
+    # آخر يوم أعيد فيه حساب النوافذ الزمنية
+    refreshed_on = db.Column(db.Date, index=True)
+
+class ReorderSuggestion(db.Model):
+    __tablename__ = 'reorder_suggestions'
+    __table_args__ = (
+        db.Index('ix_reorder_suggestions_supplier_id_product_id', 'supplier_id', 'product_id'),
+    )
+    
+    # نتيجة آخر حساب لاقتراحات إعادة الطلب (services/reorder.py)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.product_id'), primary_key=True)
+    supplier_id = db.Column(db.Integer, db.ForeignKey('suppliers.supplier_id'))
+    daily_demand = db.Column(db.Float, nullable=False, default=0)
+    demand_std = db.Column(db.Float, nullable=False, default=0)
+    lead_time_days = db.Column(db.Integer, nullable=False)
+    safety_stock = db.Column(db.Integer, nullable=False, default=0)
+    reorder_point = db.Column(db.Integer, nullable=False, default=0)
+    on_hand = db.Column(db.Integer, nullable=False, default=0)
+    on_order = db.Column(db.Integer, nullable=False, default=0)
+    days_of_cover = db.Column(db.Float)
+    suggested_quantity = db.Column(db.Integer, nullable=False, default=0, index=True)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class ProductForecast(db.Model):
+    __tablename__ = 'product_forecasts'
+    
+    # توقع المبيعات للأيام القادمة من آخر حساب (services/forecast.py)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.product_id'), primary_key=True)
+    category_id = db.Column(db.Integer, index=True)
+    daily_level = db.Column(db.Float, nullable=False, default=0)
+    units_forecast = db.Column(db.Float, nullable=False, default=0, index=True)
+    revenue_forecast = db.Column(db.Float, nullable=False, default=0, index=True)
+    horizon_days = db.Column(db.Integer, nullable=False)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class CategoryForecast(db.Model):
+    __tablename__ = 'category_forecasts'
+    
+    category_id = db.Column(db.Integer, db.ForeignKey('categories.category_id'), primary_key=True)
+    units_forecast = db.Column(db.Float, nullable=False, default=0)
+    revenue_forecast = db.Column(db.Float, nullable=False, default=0)
+    products_count = db.Column(db.Integer, nullable=False, default=0)
+    horizon_days = db.Column(db.Integer, nullable=False)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class ReportCache(db.Model):
+    __tablename__ = 'report_cache'
+    
+    report_type = db.Column(db.String(50), primary_key=True)
+    period_key = db.Column(db.String(50), primary_key=True)
+    payload = db.Column(db.Text, nullable=False)
+    is_closed = db.Column(db.Boolean, nullable=False, default=False)
+    # فارغة للفترات المغلقة: تبقى صالحة حتى يلغيها بيع أو إرجاع في نفس الفترة
+    expires_at = db.Column(db.DateTime)
+    # يزيد مع كل إلغاء، فلا يحفظ تقرير بدأ بناؤه قبل الإلغاء (انظر services/report_cache.py)
+    generation = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class Job(db.Model):
+    __tablename__ = 'jobs'
+    
+    job_id = db.Column(db.String(36), primary_key=True)
+    job_type = db.Column(db.String(50), nullable=False)
+    params = db.Column(db.Text)
+    # queued, running, completed, failed
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)
+    result = db.Column(db.Text)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    # يحدثه العامل المنفذ دورياً، وانقطاعه يعني أن العملية توقفت أثناء التنفيذ
+    heartbeat_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+class IdempotencyKey(db.Model):
+    __tablename__ = 'idempotency_keys'
+    
+    key = db.Column(db.String(255), primary_key=True)
+    endpoint = db.Column(db.String(255), nullable=False)
+    request_hash = db.Column(db.String(64), nullable=False)
+    # تبقى فارغة أثناء تنفيذ الطلب الأول
+    status_code = db.Column(db.Integer)
+    response_body = db.Column(db.Text)
+    # نهاية مهلة تنفيذ الطلب الأول: بعدها يعتبر متوقفاً وتستطيع إعادة المحاولة حجز المفتاح
+    locked_until = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+# أعمدة الأسماء الموحدة للبحث العربي، تحدث تلقائياً عند كل إضافة أو تعديل
+NORMALIZED_NAME_MODELS = (Product, Customer, Supplier)
+
+def _set_normalized_name(mapper, connection, target):
+    target.name_normalized = normalize_arabic(target.name)
+
+for _model in NORMALIZED_NAME_MODELS:
+    event.listen(_model, 'before_insert', _set_normalized_name)
+    event.listen(_model, 'before_update', _set_normalized_name)
+
+def phone_columns(phone_number):
+    """قيم أعمدة الهاتف الموحدة لرقم كما أدخله المستخدم"""
+    normalized = normalize_phone(phone_number)
+    return {'phone_digits': normalized, 'phone_digits_reversed': normalized[::-1]}
+
+@event.listens_for(Customer, 'before_insert')
+@event.listens_for(Customer, 'before_update')
+def _set_normalized_phone(mapper, connection, target):
+    for key, value in phone_columns(target.phone_number).items():
+        setattr(target, key, value)
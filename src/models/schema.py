@@ -0,0 +1,89 @@
+from sqlalchemy import inspect, text, select, update, bindparam
+from src.models.database import db, Customer, NORMALIZED_NAME_MODELS, phone_columns
+from src.utils.arabic import normalize_arabic
+
+# لا يضيف db.create_all() الأعمدة أو الفهارس الجديدة إلى الجداول الموجودة مسبقاً،
+# لذلك نكمل هنا ما ينقص منها بعد كل تحديث للنماذج
+
+
+def upgrade_schema():
+    """إضافة الأعمدة والفهارس الناقصة إلى الجداول الموجودة"""
+    engine = db.engine
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    
+    with engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            
+            existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                connection.execute(text(
+                    f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'
+                ))
+            
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+
+
+def _backfill(table, source_column, compute, only_missing_column=None, batch_size=500):
+    """حساب أعمدة مشتقة على دفعات مرتبة بالمفتاح الأساسي، ويرجع عدد السجلات المحدثة"""
+    primary_key = table.primary_key.columns.values()[0]
+    statement = None
+    updated = 0
+    last_id = None
+    while True:
+        query = select(primary_key, source_column)
+        if only_missing_column is not None:
+            query = query.where(only_missing_column.is_(None))
+        if last_id is not None:
+            query = query.where(primary_key > last_id)
+        rows = db.session.execute(query.order_by(primary_key).limit(batch_size)).all()
+        if not rows:
+            break
+        
+        params = []
+        for row_id, source in rows:
+            values = compute(source)
+            params.append({'row_id': row_id, **{f'new_{key}': value for key, value in values.items()}})
+        if statement is None:
+            # الإبقاء على updated_at كما هو، فهذه تعبئة وليست تعديلاً من المستخدم
+            statement = update(table).where(
+                primary_key == bindparam('row_id')
+            ).values(
+                updated_at=table.c.updated_at,
+                **{key: bindparam(f'new_{key}') for key in values}
+            )
+        db.session.execute(statement, params)
+        db.session.commit()
+        updated += len(rows)
+        last_id = rows[-1][0]
+    return updated
+
+
+def backfill_normalized_names(batch_size=500):
+    """تعبئة أعمدة الأسماء الموحدة للسجلات القديمة، ويرجع عدد السجلات المحدثة"""
+    updated = 0
+    for model in NORMALIZED_NAME_MODELS:
+        table = model.__table__
+        updated += _backfill(
+            table, table.c.name,
+            lambda name: {'name_normalized': normalize_arabic(name)},
+            only_missing_column=table.c.name_normalized,
+            batch_size=batch_size
+        )
+    return updated
+
+
+def backfill_phone_numbers(only_missing=True, batch_size=500):
+    """تعبئة أرقام الهواتف الموحدة للعملاء، أو إعادة حسابها كلها إذا كان only_missing خطأ"""
+    table = Customer.__table__
+    return _backfill(
+        table, table.c.phone_number, phone_columns,
+        only_missing_column=table.c.phone_digits if only_missing else None,
+        batch_size=batch_size
+    )
@@ -0,0 +1,22 @@
+from sqlalchemy.dialects import postgresql, sqlite
+from src.models.database import db
+
+
+def dialect_insert(model):
+    """جملة INSERT الخاصة بنوع قاعدة البيانات لدعم ON CONFLICT"""
+    if db.session.get_bind().dialect.name == 'postgresql':
+        return postgresql.insert(model)
+    return sqlite.insert(model)
+
+
+def upsert_increments(model, key_columns, fields, rows):
+    """إضافة القيم إلى الصفوف الموجودة أو إنشاؤها في جملة INSERT ... ON CONFLICT واحدة"""
+    if not rows:
+        return
+    statement = dialect_insert(model).values(rows)
+    table = model.__table__
+    statement = statement.on_conflict_do_update(
+        index_elements=key_columns,
+        set_={field: table.c[field] + statement.excluded[field] for field in fields}
+    )
+    db.session.execute(statement)
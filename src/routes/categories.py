@@ -1,19 +1,25 @@
 from flask import Blueprint, request, jsonify
-from src.models.database import db, Category
+from src.models.database import db, Category, Product
+from src.services.product_totals import with_product_totals, serialize_totals
 
 categories_bp = Blueprint('categories', __name__)
 
 @categories_bp.route('/categories', methods=['GET'])
 def get_categories():
     try:
-        categories = Category.query.all()
+        include_stock = request.args.get('include_stock') in ('1', 'true')
+        
+        # عدد المنتجات (وقيمة المخزون عند الطلب) من استعلام تجميعي في نفس الجملة
+        rows = with_product_totals(
+            db.session.query(Category), Category.category_id, include_stock
+        ).order_by(Category.category_id).all()
         
         categories_data = []
-        for category in categories:
+        for row in rows:
             categories_data.append({
-                'category_id': category.category_id,
-                'name': category.name,
-                'products_count': len(category.products)
+                'category_id': row[0].category_id,
+                'name': row[0].name,
+                **serialize_totals(row, include_stock)
             })
         
         return jsonify({'categories': categories_data}), 200
@@ -51,12 +57,17 @@ def create_category():
 @categories_bp.route('/categories/<int:category_id>', methods=['GET'])
 def get_category(category_id):
     try:
-        category = Category.query.get_or_404(category_id)
+        include_stock = request.args.get('include_stock') in ('1', 'true')
+        row = with_product_totals(
+            db.session.query(Category), Category.category_id, include_stock
+        ).filter(Category.category_id == category_id).first()
+        if row is None:
+            return jsonify({'error': 'الفئة غير موجودة'}), 404
         
         category_data = {
-            'category_id': category.category_id,
-            'name': category.name,
-            'products_count': len(category.products)
+            'category_id': row[0].category_id,
+            'name': row[0].name,
+            **serialize_totals(row, include_stock)
         }
         
         return jsonify(category_data), 200
@@ -94,7 +105,7 @@ def delete_category(category_id):
         category = Category.query.get_or_404(category_id)
         
         # التحقق من عدم وجود منتجات مرتبطة بالفئة
-        if category.products:
+        if db.session.query(Product.query.filter(Product.category_id == category_id).exists()).scalar():
             return jsonify({'error': 'لا يمكن حذف الفئة لوجود منتجات مرتبطة بها'}), 400
         
         db.session.delete(category)
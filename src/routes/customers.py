@@ -1,43 +1,132 @@
 from flask import Blueprint, request, jsonify
-from src.models.database import db, Customer, Sale
-from sqlalchemy import or_
+from src.models.database import db, Customer, Sale, SaleItem
+from src.utils.arabic import normalized_word_prefix_filter, prefix_filter
+from src.utils.pagination import get_page_limit, encode_cursor, decode_cursor
+from src.utils.phone import normalize_phone, phone_digits
+from src.services.reports import parse_date_range
+from sqlalchemy import and_, or_, func
+from sqlalchemy.orm import selectinload
+from datetime import datetime
+from decimal import Decimal
 
 customers_bp = Blueprint('customers', __name__)
 
+# ترتيبات قائمة العملاء: العمود وتحويل قيمة المؤشر، وكلها تنازلية عدا customer_id
+CUSTOMER_SORTS = {
+    'customer_id': (Customer.customer_id, int),
+    'total_spend': (Customer.lifetime_spend, Decimal),
+    'purchase_count': (Customer.purchase_count, int),
+    'last_purchase': (Customer.last_purchase_at, datetime.fromisoformat),
+}
+
+
+# أقل عدد أرقام للبحث بآخر الرقم، وأقصى عدد نتائج للبحث بالهاتف
+PHONE_SUFFIX_MIN_DIGITS = 4
+PHONE_MATCH_LIMIT = 20
+
+
+def serialize_customer(customer):
+    return {
+        'customer_id': customer.customer_id,
+        'name': customer.name,
+        'address': customer.address,
+        'phone_number': customer.phone_number,
+        'email': customer.email,
+        'total_purchases': float(customer.lifetime_spend or 0),
+        'purchases_count': customer.purchase_count or 0,
+        'last_purchase_at': customer.last_purchase_at.isoformat() if customer.last_purchase_at else None,
+        'created_at': customer.created_at.isoformat() if customer.created_at else None,
+        'updated_at': customer.updated_at.isoformat() if customer.updated_at else None
+    }
+
+
+def _cursor_value(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
 @customers_bp.route('/customers', methods=['GET'])
 def get_customers():
     try:
         search = request.args.get('search', '')
+        sort = request.args.get('sort', 'customer_id')
+        if sort not in CUSTOMER_SORTS:
+            return jsonify({'error': 'الترتيب يجب أن يكون customer_id أو total_spend أو purchase_count أو last_purchase'}), 400
+        
+        # ترقيم الصفحات بالمؤشر (keyset) على (عمود الترتيب, customer_id)
+        limit = get_page_limit(request.args)
+        try:
+            cursor = decode_cursor(request.args.get('cursor'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
+        # الإجماليات أعمدة في جدول العملاء، فالترتيب والتصفية مسح لنطاق من الفهرس
         query = Customer.query
         
         if search:
             query = query.filter(or_(
-                Customer.name.contains(search),
+                normalized_word_prefix_filter(Customer.name_normalized, search),
                 Customer.phone_number.contains(search),
                 Customer.email.contains(search)
             ))
         
-        customers = query.all()
-        
-        customers_data = []
-        for customer in customers:
-            # حساب إجمالي المشتريات
-            total_purchases = sum(sale.total_amount for sale in customer.sales)
-            
-            customers_data.append({
-                'customer_id': customer.customer_id,
-                'name': customer.name,
-                'address': customer.address,
-                'phone_number': customer.phone_number,
-                'email': customer.email,
-                'total_purchases': float(total_purchases),
-                'purchases_count': len(customer.sales),
-                'created_at': customer.created_at.isoformat() if customer.created_at else None,
-                'updated_at': customer.updated_at.isoformat() if customer.updated_at else None
-            })
-        
-        return jsonify({'customers': customers_data}), 200
+        try:
+            min_spend = request.args.get('min_spend')
+            if min_spend:
+                query = query.filter(Customer.lifetime_spend >= Decimal(min_spend))
+            min_purchases = request.args.get('min_purchases', type=int)
+            if min_purchases:
+                query = query.filter(Customer.purchase_count >= min_purchases)
+            last_from, last_to = parse_date_range(
+                request.args.get('last_purchase_from'), request.args.get('last_purchase_to')
+            )
+        except (ArithmeticError, ValueError):
+            return jsonify({'error': 'قيمة التصفية غير صحيحة'}), 400
+        if last_from:
+            query = query.filter(Customer.last_purchase_at >= last_from)
+        if last_to:
+            query = query.filter(Customer.last_purchase_at < last_to)
+        
+        column, parse_value = CUSTOMER_SORTS[sort]
+        try:
+            if sort == 'customer_id':
+                if cursor:
+                    query = query.filter(Customer.customer_id > int(cursor[0]))
+                query = query.order_by(Customer.customer_id)
+            else:
+                # الترتيب حسب آخر شراء يشمل فقط العملاء الذين اشتروا
+                query = query.filter(column.isnot(None))
+                if cursor:
+                    after_value, after_id = parse_value(cursor[0]), int(cursor[1])
+                    query = query.filter(or_(
+                        column < after_value,
+                        and_(column == after_value, Customer.customer_id < after_id)
+                    ))
+                query = query.order_by(column.desc(), Customer.customer_id.desc())
+        except (ArithmeticError, ValueError, TypeError, IndexError):
+            return jsonify({'error': 'مؤشر الصفحة غير صالح'}), 400
+        
+        customers = query.limit(limit + 1).all()
+        has_more = len(customers) > limit
+        customers = customers[:limit]
+        
+        customers_data = [serialize_customer(customer) for customer in customers]
+        
+        next_cursor = None
+        if has_more:
+            last_customer = customers[-1]
+            if sort == 'customer_id':
+                next_cursor = encode_cursor(last_customer.customer_id)
+            else:
+                next_cursor = encode_cursor(
+                    _cursor_value(getattr(last_customer, column.key)), last_customer.customer_id
+                )
+        
+        return jsonify({
+            'customers': customers_data,
+            'limit': limit,
+            'next_cursor': next_cursor
+        }), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -75,25 +164,49 @@ def create_customer():
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@customers_bp.route('/customers/summary', methods=['GET'])
+def get_customers_summary():
+    try:
+        return jsonify({
+            'total_customers': db.session.query(func.count(Customer.customer_id)).scalar()
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@customers_bp.route('/customers/by-phone/<digits>', methods=['GET'])
+def get_customers_by_phone(digits):
+    try:
+        # مطابقة تامة للرقم الموحد، ثم بآخر الأرقام عبر فهرس الرقم المعكوس
+        suffix = phone_digits(digits)
+        if len(suffix) < PHONE_SUFFIX_MIN_DIGITS:
+            return jsonify({'error': f'أدخل {PHONE_SUFFIX_MIN_DIGITS} أرقام على الأقل'}), 400
+        
+        customers = Customer.query.filter(
+            Customer.phone_digits == normalize_phone(digits)
+        ).order_by(Customer.customer_id).limit(PHONE_MATCH_LIMIT).all()
+        match = 'exact'
+        
+        if not customers:
+            reversed_suffix = suffix[::-1]
+            customers = Customer.query.filter(
+                prefix_filter(Customer.phone_digits_reversed, reversed_suffix)
+            ).order_by(Customer.customer_id).limit(PHONE_MATCH_LIMIT).all()
+            match = 'suffix'
+        
+        return jsonify({
+            'customers': [serialize_customer(customer) for customer in customers],
+            'match': match if customers else None
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @customers_bp.route('/customers/<int:customer_id>', methods=['GET'])
 def get_customer(customer_id):
     try:
         customer = Customer.query.get_or_404(customer_id)
-        
-        # حساب إجمالي المشتريات
-        total_purchases = sum(sale.total_amount for sale in customer.sales)
-        
-        customer_data = {
-            'customer_id': customer.customer_id,
-            'name': customer.name,
-            'address': customer.address,
-            'phone_number': customer.phone_number,
-            'email': customer.email,
-            'total_purchases': float(total_purchases),
-            'purchases_count': len(customer.sales),
-            'created_at': customer.created_at.isoformat() if customer.created_at else None,
-            'updated_at': customer.updated_at.isoformat() if customer.updated_at else None
-        }
+        customer_data = serialize_customer(customer)
         
         return jsonify(customer_data), 200
         
@@ -136,7 +249,7 @@ def delete_customer(customer_id):
         customer = Customer.query.get_or_404(customer_id)
         
         # التحقق من عدم وجود مبيعات مرتبطة بالعميل
-        if customer.sales:
+        if db.session.query(Sale.query.filter(Sale.customer_id == customer_id).exists()).scalar():
             return jsonify({'error': 'لا يمكن حذف العميل لوجود مبيعات مرتبطة به'}), 400
         
         db.session.delete(customer)
@@ -151,11 +264,45 @@ def delete_customer(customer_id):
 @customers_bp.route('/customers/<int:customer_id>/purchases', methods=['GET'])
 def get_customer_purchases(customer_id):
     try:
-        customer = Customer.query.get_or_404(customer_id)
+        include_items = request.args.get('include_items') in ('1', 'true')
+        
+        # ترقيم الصفحات بالمؤشر (keyset) على (sale_date, sale_id) تنازلياً
+        limit = get_page_limit(request.args)
+        try:
+            cursor = decode_cursor(request.args.get('cursor'))
+            if cursor:
+                after_date, after_id = datetime.fromisoformat(cursor[0]), int(cursor[1])
+            range_start, range_end = parse_date_range(request.args.get('from'), request.args.get('to'))
+        except (ValueError, TypeError, IndexError):
+            return jsonify({'error': 'مؤشر الصفحة أو التاريخ غير صالح'}), 400
+        
+        # يستخدم الفهرس (customer_id, sale_date)
+        query = Sale.query.filter(Sale.customer_id == customer_id)
+        if range_start:
+            query = query.filter(Sale.sale_date >= range_start)
+        if range_end:
+            query = query.filter(Sale.sale_date < range_end)
+        if cursor:
+            query = query.filter(or_(
+                Sale.sale_date < after_date,
+                and_(Sale.sale_date == after_date, Sale.sale_id < after_id)
+            ))
+        
+        # العناصر ومنتجاتها باستعلامين إضافيين لكل الصفحة بدلاً من طلب لكل فاتورة
+        if include_items:
+            query = query.options(
+                selectinload(Sale.sale_items).selectinload(SaleItem.product)
+            )
+        
+        sales = query.order_by(Sale.sale_date.desc(), Sale.sale_id.desc()).limit(limit + 1).all()
+        if not sales and not db.session.get(Customer, customer_id):
+            return jsonify({'error': 'العميل غير موجود'}), 404
+        has_more = len(sales) > limit
+        sales = sales[:limit]
         
         purchases_data = []
-        for sale in customer.sales:
-            purchases_data.append({
+        for sale in sales:
+            sale_data = {
                 'sale_id': sale.sale_id,
                 'sale_date': sale.sale_date.isoformat() if sale.sale_date else None,
                 'total_amount': float(sale.total_amount),
@@ -163,10 +310,27 @@ def get_customer_purchases(customer_id):
                 'tax_amount': float(sale.tax_amount),
                 'payment_method': sale.payment_method,
                 'status': sale.status
-            })
+            }
+            if include_items:
+                sale_data['items'] = [{
+                    'sale_item_id': item.sale_item_id,
+                    'product_id': item.product_id,
+                    'product_name': item.product.name,
+                    'quantity': item.quantity,
+                    'unit_price': float(item.unit_price),
+                    'total_price': float(item.total_price)
+                } for item in sale.sale_items]
+            purchases_data.append(sale_data)
         
-        return jsonify({'purchases': purchases_data}), 200
+        next_cursor = None
+        if has_more:
+            next_cursor = encode_cursor(sales[-1].sale_date.isoformat(), sales[-1].sale_id)
+        
+        return jsonify({
+            'purchases': purchases_data,
+            'limit': limit,
+            'next_cursor': next_cursor
+        }), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-
@@ -0,0 +1,18 @@
+from flask import Blueprint, jsonify
+from src.models.database import db, Job
+from src.services.jobs import serialize_job
+
+jobs_bp = Blueprint('jobs', __name__)
+
+@jobs_bp.route('/jobs/<string:job_id>', methods=['GET'])
+def get_job(job_id):
+    try:
+        job = db.session.get(Job, job_id)
+        
+        if not job:
+            return jsonify({'error': 'المهمة غير موجودة'}), 404
+        
+        return jsonify(serialize_job(job)), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -1,9 +1,46 @@
 from flask import Blueprint, request, jsonify
-from src.models.database import db, Product, Category, Supplier
-from sqlalchemy import or_
+from src.models.database import (
+    db, Product, Category, Supplier, ProductSalesStats, PurchaseOrderItem, ReorderSuggestion,
+    ProductForecast, CategoryForecast
+)
+from src.utils.pagination import get_page_limit, encode_cursor, decode_cursor
+from src.services.search import product_search_subquery, product_prefix_subquery, is_short_term
+from src.services.product_cache import serial_cache
+from src.services.idempotency import idempotent
+from src.services.product_stats import ensure_product_sales_stats, product_stats_refreshed_on
+from src.services.reorder import refresh_reorder_suggestions
+from src.services.forecast import refresh_forecasts
+from src.services.jobs import register_job, enqueue_job, enqueue_job_once
+from src.utils.arabic import normalize_arabic
+from sqlalchemy import func, or_, and_
+from datetime import datetime
 
 products_bp = Blueprint('products', __name__)
 
+# نوافذ تقرير الأكثر والأقل مبيعاً وأسماء أعمدة العدادات المقابلة
+MOVERS_WINDOWS = {'7': '7d', '30': '30d', '90': '90d', 'all': 'total'}
+
+def serialize_product(product, category_name=None, supplier_name=None):
+    return {
+        'product_id': product.product_id,
+        'name': product.name,
+        'description': product.description,
+        'price': float(product.price),
+        'quantity': product.quantity,
+        'serial_number': product.serial_number,
+        'brand': product.brand,
+        'model': product.model,
+        'category_id': product.category_id,
+        'category_name': category_name,
+        'supplier_id': product.supplier_id,
+        'supplier_name': supplier_name,
+        'location': product.location,
+        'min_stock_level': product.min_stock_level,
+        'is_low_stock': product.quantity <= product.min_stock_level,
+        'created_at': product.created_at.isoformat() if product.created_at else None,
+        'updated_at': product.updated_at.isoformat() if product.updated_at else None
+    }
+
 @products_bp.route('/products', methods=['GET'])
 def get_products():
     try:
@@ -13,11 +50,38 @@ def get_products():
         supplier_id = request.args.get('supplier_id', type=int)
         low_stock = request.args.get('low_stock', type=bool)
         
-        query = Product.query
+        # ترقيم الصفحات بالمؤشر (keyset) على product_id
+        limit = get_page_limit(request.args)
+        try:
+            cursor = decode_cursor(request.args.get('cursor'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # جلب اسم الفئة والمورد في نفس الاستعلام بدلاً من التحميل الكسول لكل منتج
+        query = db.session.query(
+            Product,
+            Category.name.label('category_name'),
+            Supplier.name.label('supplier_name')
+        ).outerjoin(
+            Category, Product.category_id == Category.category_id
+        ).outerjoin(
+            Supplier, Product.supplier_id == Supplier.supplier_id
+        )
         
-        if search:
+        # البحث عبر فهرس النص الكامل مع ترتيب النتائج حسب الصلة، والحرف والحرفان (أول ضغطات
+        # المفاتيح) ببادئة الاسم على فهرسه، والعودة إلى LIKE إذا كان الفهرس غير متاح
+        short_search = bool(search) and is_short_term(search)
+        search_results = product_search_subquery(search) if search and not short_search else None
+        if search_results is not None:
+            query = query.join(
+                search_results, search_results.c.product_id == Product.product_id
+            ).add_columns(search_results.c.rank)
+        elif short_search:
+            prefix_results = product_prefix_subquery(search)
+            query = query.join(prefix_results, prefix_results.c.product_id == Product.product_id)
+        elif search:
             query = query.filter(or_(
-                Product.name.contains(search),
+                Product.name_normalized.contains(normalize_arabic(search)),
                 Product.brand.contains(search),
                 Product.model.contains(search),
                 Product.serial_number.contains(search)
@@ -25,43 +89,59 @@ def get_products():
         
         if category_id:
             query = query.filter(Product.category_id == category_id)
-            
+        
         if supplier_id:
             query = query.filter(Product.supplier_id == supplier_id)
-            
+        
         if low_stock:
             query = query.filter(Product.quantity <= Product.min_stock_level)
         
-        products = query.all()
+        try:
+            if search_results is not None:
+                # المؤشر عند البحث هو (rank, product_id)
+                if cursor:
+                    after_rank, after_id = float(cursor[0]), int(cursor[1])
+                    query = query.filter(or_(
+                        search_results.c.rank > after_rank,
+                        and_(search_results.c.rank == after_rank, Product.product_id > after_id)
+                    ))
+                query = query.order_by(search_results.c.rank, Product.product_id)
+            else:
+                if cursor:
+                    query = query.filter(Product.product_id > int(cursor[0]))
+                query = query.order_by(Product.product_id)
+        except (ValueError, TypeError, IndexError):
+            return jsonify({'error': 'مؤشر الصفحة غير صالح'}), 400
         
-        products_data = []
-        for product in products:
-            products_data.append({
-                'product_id': product.product_id,
-                'name': product.name,
-                'description': product.description,
-                'price': float(product.price),
-                'quantity': product.quantity,
-                'serial_number': product.serial_number,
-                'brand': product.brand,
-                'model': product.model,
-                'category_id': product.category_id,
-                'category_name': product.category.name if product.category else None,
-                'supplier_id': product.supplier_id,
-                'supplier_name': product.supplier.name if product.supplier else None,
-                'location': product.location,
-                'min_stock_level': product.min_stock_level,
-                'is_low_stock': product.quantity <= product.min_stock_level,
-                'created_at': product.created_at.isoformat() if product.created_at else None,
-                'updated_at': product.updated_at.isoformat() if product.updated_at else None
-            })
+        # جلب عنصر إضافي لمعرفة وجود صفحة تالية
+        rows = query.limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        
+        products_data = [
+            serialize_product(row[0], row.category_name, row.supplier_name)
+            for row in rows
+        ]
         
-        return jsonify({'products': products_data}), 200
+        next_cursor = None
+        if has_more:
+            last = rows[-1]
+            if search_results is not None:
+                next_cursor = encode_cursor(last.rank, last[0].product_id)
+            else:
+                next_cursor = encode_cursor(last[0].product_id)
         
+        return jsonify({
+            'products': products_data,
+            'limit': limit,
+            'next_cursor': next_cursor
+        }), 200
+    
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @products_bp.route('/products', methods=['POST'])
+@idempotent
 def create_product():
     try:
         data = request.get_json()
@@ -97,38 +177,55 @@ def create_product():
             'message': 'تم إضافة المنتج بنجاح',
             'product_id': product.product_id
         }), 201
-        
+    
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@products_bp.route('/products/by-serial/<string:code>', methods=['GET'])
+def get_product_by_serial(code):
+    try:
+        # مسار سريع لمسح الباركود: بحث مطابق على الفهرس الفريد مع ذاكرة مؤقتة
+        product_data = serial_cache.get(code)
+        if product_data is None:
+            product = db.session.query(
+                Product.product_id,
+                Product.name,
+                Product.price,
+                Product.quantity,
+                Product.serial_number
+            ).filter(Product.serial_number == code).first()
+            
+            if not product:
+                return jsonify({'error': 'المنتج غير موجود'}), 404
+            
+            product_data = {
+                'product_id': product.product_id,
+                'name': product.name,
+                'price': float(product.price),
+                'quantity': product.quantity,
+                'serial_number': product.serial_number
+            }
+            serial_cache.set(code, product_data)
+        
+        return jsonify(product_data), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @products_bp.route('/products/<int:product_id>', methods=['GET'])
 def get_product(product_id):
     try:
         product = Product.query.get_or_404(product_id)
         
-        product_data = {
-            'product_id': product.product_id,
-            'name': product.name,
-            'description': product.description,
-            'price': float(product.price),
-            'quantity': product.quantity,
-            'serial_number': product.serial_number,
-            'brand': product.brand,
-            'model': product.model,
-            'category_id': product.category_id,
-            'category_name': product.category.name if product.category else None,
-            'supplier_id': product.supplier_id,
-            'supplier_name': product.supplier.name if product.supplier else None,
-            'location': product.location,
-            'min_stock_level': product.min_stock_level,
-            'is_low_stock': product.quantity <= product.min_stock_level,
-            'created_at': product.created_at.isoformat() if product.created_at else None,
-            'updated_at': product.updated_at.isoformat() if product.updated_at else None
-        }
+        product_data = serialize_product(
+            product,
+            product.category.name if product.category else None,
+            product.supplier.name if product.supplier else None
+        )
         
         return jsonify(product_data), 200
-        
+    
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -171,7 +268,7 @@ def update_product(product_id):
         db.session.commit()
         
         return jsonify({'message': 'تم تحديث المنتج بنجاح'}), 200
-        
+    
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -184,12 +281,14 @@ def delete_product(product_id):
         # التحقق من عدم وجود مبيعات مرتبطة بالمنتج
         if product.sale_items:
             return jsonify({'error': 'لا يمكن حذف المنتج لوجود مبيعات مرتبطة به'}), 400
+        if db.session.query(PurchaseOrderItem.query.filter(PurchaseOrderItem.product_id == product_id).exists()).scalar():
+            return jsonify({'error': 'لا يمكن حذف المنتج لوجود أوامر شراء مرتبطة به'}), 400
         
         db.session.delete(product)
         db.session.commit()
         
         return jsonify({'message': 'تم حذف المنتج بنجاح'}), 200
-        
+    
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -210,7 +309,255 @@ def get_low_stock_products():
             })
         
         return jsonify({'low_stock_products': products_data}), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@products_bp.route('/products/summary', methods=['GET'])
+def get_products_summary():
+    try:
+        # أعداد لوحة التحكم باستعلام COUNT واحد بدلاً من عد صفحة من القائمة
+        total, low_stock = db.session.query(
+            func.count(Product.product_id),
+            func.count(Product.product_id).filter(Product.quantity <= Product.min_stock_level)
+        ).one()
         
+        return jsonify({
+            'total_products': total,
+            'low_stock_products': low_stock
+        }), 200
+    
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@products_bp.route('/products/reports/movers', methods=['GET'])
+def get_product_movers():
+    try:
+        window = request.args.get('window', '30')
+        metric = request.args.get('metric', 'units')
+        limit = get_page_limit(request.args, default=10, maximum=100)
+        
+        if window not in MOVERS_WINDOWS or metric not in ('units', 'revenue'):
+            return jsonify({'error': 'النافذة أو المقياس غير مدعوم'}), 400
+        
+        # قراءة فقط: إعادة حساب النوافذ تعيد كتابة كل صفوف العدادات التي تحدثها عمليات البيع،
+        # فإذا لم تحدث اليوم ترجع العدادات كما هي مع stale وتحدث في مهمة خلفية
+        refreshed_on = product_stats_refreshed_on()
+        stale = refreshed_on is None or refreshed_on < datetime.utcnow().date()
+        if stale:
+            enqueue_job_once('product_sales_stats', {})
+        
+        column = getattr(ProductSalesStats, f'{metric}_{MOVERS_WINDOWS[window]}')
+        query = db.session.query(
+            ProductSalesStats, Product.name, Product.quantity
+        ).join(Product, ProductSalesStats.product_id == Product.product_id)
+        
+        # الترتيب على عمود العداد المفهرس مباشرة
+        top = query.order_by(column.desc(), ProductSalesStats.product_id).limit(limit).all()
+        bottom = query.order_by(column.asc(), ProductSalesStats.product_id).limit(limit).all()
+
+        def serialize(rows):
+            return [{
+                'product_id': stats.product_id,
+                'name': name,
+                'quantity_in_stock': quantity,
+                'units': getattr(stats, f'units_{MOVERS_WINDOWS[window]}'),
+                'revenue': float(getattr(stats, f'revenue_{MOVERS_WINDOWS[window]}'))
+            } for stats, name, quantity in rows]
+        
+        return jsonify({
+            'window': window,
+            'metric': metric,
+            'refreshed_on': refreshed_on.isoformat() if refreshed_on else None,
+            'stale': stale,
+            'top': serialize(top),
+            'bottom': serialize(bottom)
+        }), 200
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+def serialize_reorder_suggestion(suggestion, name, supplier_name):
+    return {
+        'product_id': suggestion.product_id,
+        'name': name,
+        'supplier_id': suggestion.supplier_id,
+        'supplier_name': supplier_name,
+        'on_hand': suggestion.on_hand,
+        'on_order': suggestion.on_order,
+        'daily_demand': suggestion.daily_demand,
+        'days_of_cover': suggestion.days_of_cover,
+        'lead_time_days': suggestion.lead_time_days,
+        'safety_stock': suggestion.safety_stock,
+        'reorder_point': suggestion.reorder_point,
+        'suggested_quantity': suggestion.suggested_quantity
+    }
+
+@products_bp.route('/products/reorder-suggestions', methods=['GET'])
+def get_reorder_suggestions():
+    try:
+        group_by = request.args.get('group_by')
+        supplier_id = request.args.get('supplier_id', type=int)
+        include_all = request.args.get('all') in ('1', 'true')
+        if group_by not in (None, 'supplier'):
+            return jsonify({'error': 'التجميع المدعوم هو supplier فقط'}), 400
+        
+        # القراءة من نتائج آخر حساب (flask refresh-reorder-suggestions أو مهمة خلفية)
+        query = db.session.query(
+            ReorderSuggestion, Product.name, Supplier.name.label('supplier_name')
+        ).join(
+            Product, ReorderSuggestion.product_id == Product.product_id
+        ).outerjoin(
+            Supplier, ReorderSuggestion.supplier_id == Supplier.supplier_id
+        )
+        if not include_all:
+            query = query.filter(ReorderSuggestion.suggested_quantity > 0)
+        if supplier_id:
+            query = query.filter(ReorderSuggestion.supplier_id == supplier_id)
+        
+        computed_at = db.session.query(func.max(ReorderSuggestion.computed_at)).scalar()
+        
+        if group_by == 'supplier':
+            # مجموعة لكل مورد لإنشاء أوامر الشراء مباشرة
+            suppliers = {}
+            rows = query.order_by(ReorderSuggestion.supplier_id, ReorderSuggestion.product_id).all()
+            for suggestion, name, supplier_name in rows:
+                group = suppliers.setdefault(suggestion.supplier_id, {
+                    'supplier_id': suggestion.supplier_id,
+                    'supplier_name': supplier_name,
+                    'total_quantity': 0,
+                    'items': []
+                })
+                group['total_quantity'] += suggestion.suggested_quantity
+                group['items'].append(serialize_reorder_suggestion(suggestion, name, supplier_name))
+            
+            return jsonify({
+                'computed_at': computed_at.isoformat() if computed_at else None,
+                'suppliers': list(suppliers.values())
+            }), 200
+        
+        # ترقيم الصفحات بالمؤشر (keyset) على product_id
+        limit = get_page_limit(request.args)
+        try:
+            cursor = decode_cursor(request.args.get('cursor'))
+            if cursor:
+                query = query.filter(ReorderSuggestion.product_id > int(cursor[0]))
+        except (ValueError, TypeError, IndexError):
+            return jsonify({'error': 'مؤشر الصفحة غير صالح'}), 400
+        
+        rows = query.order_by(ReorderSuggestion.product_id).limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        
+        next_cursor = None
+        if has_more:
+            next_cursor = encode_cursor(rows[-1][0].product_id)
+        
+        return jsonify({
+            'computed_at': computed_at.isoformat() if computed_at else None,
+            'suggestions': [serialize_reorder_suggestion(*row) for row in rows],
+            'limit': limit,
+            'next_cursor': next_cursor
+        }), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@register_job('product_sales_stats')
+def _product_sales_stats_job(params):
+    ensure_product_sales_stats()
+    refreshed_on = product_stats_refreshed_on()
+    return {'refreshed_on': refreshed_on.isoformat() if refreshed_on else None}
+
+@register_job('reorder_suggestions')
+def _reorder_suggestions_job(params):
+    return {'products': refresh_reorder_suggestions()}
+
+@products_bp.route('/products/reorder-suggestions/refresh', methods=['POST'])
+def refresh_reorder_suggestions_job():
+    try:
+        job = enqueue_job('reorder_suggestions', {})
+        
+        return jsonify({
+            'job_id': job.job_id,
+            'status': job.status,
+            'status_url': f'/api/jobs/{job.job_id}'
+        }), 202
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@products_bp.route('/products/forecasts', methods=['GET'])
+def get_forecasts():
+    try:
+        category_id = request.args.get('category_id', type=int)
+        limit = get_page_limit(request.args, default=10, maximum=100)
+        
+        # لوحة التوقعات من نتائج آخر حساب (flask refresh-forecasts أو مهمة خلفية)
+        totals = db.session.query(
+            func.sum(ProductForecast.units_forecast),
+            func.sum(ProductForecast.revenue_forecast),
+            func.max(ProductForecast.computed_at),
+            func.max(ProductForecast.horizon_days)
+        ).one()
+        
+        categories = db.session.query(
+            CategoryForecast, Category.name
+        ).join(
+            Category, CategoryForecast.category_id == Category.category_id
+        ).order_by(CategoryForecast.revenue_forecast.desc()).all()
+        
+        top_query = db.session.query(
+            ProductForecast, Product.name
+        ).join(Product, ProductForecast.product_id == Product.product_id)
+        if category_id:
+            top_query = top_query.filter(ProductForecast.category_id == category_id)
+        top_products = top_query.order_by(
+            ProductForecast.units_forecast.desc(), ProductForecast.product_id
+        ).limit(limit).all()
+        
+        return jsonify({
+            'computed_at': totals[2].isoformat() if totals[2] else None,
+            'horizon_days': totals[3],
+            'total_units': round(totals[0] or 0, 2),
+            'total_revenue': round(totals[1] or 0, 2),
+            'categories': [{
+                'category_id': forecast.category_id,
+                'name': name,
+                'products_count': forecast.products_count,
+                'units_forecast': forecast.units_forecast,
+                'revenue_forecast': forecast.revenue_forecast
+            } for forecast, name in categories],
+            'top_products': [{
+                'product_id': forecast.product_id,
+                'name': name,
+                'category_id': forecast.category_id,
+                'daily_level': forecast.daily_level,
+                'units_forecast': forecast.units_forecast,
+                'revenue_forecast': forecast.revenue_forecast
+            } for forecast, name in top_products]
+        }), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@register_job('product_forecasts')
+def _product_forecasts_job(params):
+    return {'products': refresh_forecasts()}
+
+@products_bp.route('/products/forecasts/refresh', methods=['POST'])
+def refresh_forecasts_job():
+    try:
+        job = enqueue_job('product_forecasts', {})
+        
+        return jsonify({
+            'job_id': job.job_id,
+            'status': job.status,
+            'status_url': f'/api/jobs/{job.job_id}'
+        }), 202
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,262 @@
+from flask import Blueprint, request, jsonify
+from src.models.database import db, Supplier, Product, PurchaseOrder, PurchaseOrderItem
+from src.services.idempotency import idempotent
+from src.services.stock import increment_stock
+from src.utils.pagination import get_page_limit, encode_cursor, decode_cursor
+from src.utils.validation import parse_id, is_positive_int
+from collections import defaultdict
+from datetime import datetime, date
+from decimal import Decimal
+from sqlalchemy import update
+
+purchase_orders_bp = Blueprint('purchase_orders', __name__)
+
+PURCHASE_ORDER_STATUSES = ('pending', 'received', 'cancelled')
+
+class PurchaseOrderError(Exception):
+    """خطأ في بيانات أمر الشراء يعاد للعميل برمز 400"""
+
+
+def serialize_purchase_order(order, items=None):
+    order_data = {
+        'purchase_order_id': order.purchase_order_id,
+        'supplier_id': order.supplier_id,
+        'status': order.status,
+        'order_date': order.order_date.isoformat() if order.order_date else None,
+        'expected_date': order.expected_date.isoformat() if order.expected_date else None,
+        'received_at': order.received_at.isoformat() if order.received_at else None,
+        'total_amount': float(order.total_amount),
+        'notes': order.notes
+    }
+    if items is not None:
+        order_data['items'] = [{
+            'purchase_order_item_id': item.purchase_order_item_id,
+            'product_id': item.product_id,
+            'product_name': product_name,
+            'quantity': item.quantity,
+            'unit_cost': float(item.unit_cost),
+            'total_cost': float(item.total_cost)
+        } for item, product_name in items]
+    return order_data
+
+
+def _order_items(purchase_order_id):
+    """عناصر أمر الشراء مع أسماء المنتجات في استعلام واحد"""
+    return db.session.query(
+        PurchaseOrderItem, Product.name
+    ).join(
+        Product, PurchaseOrderItem.product_id == Product.product_id
+    ).filter(
+        PurchaseOrderItem.purchase_order_id == purchase_order_id
+    ).order_by(PurchaseOrderItem.purchase_order_item_id).all()
+
+
+def _get_order(supplier_id, purchase_order_id):
+    return PurchaseOrder.query.filter_by(
+        supplier_id=supplier_id, purchase_order_id=purchase_order_id
+    ).first()
+
+
+def _order_lines(items):
+    """التحقق من عناصر أمر الشراء وحساب تكلفة كل سطر"""
+    if not items:
+        raise PurchaseOrderError('يجب إضافة منتجات لأمر الشراء')
+    if not isinstance(items, list):
+        raise PurchaseOrderError('عناصر أمر الشراء يجب أن تكون قائمة')
+    
+    lines = []
+    for item_data in items:
+        if not isinstance(item_data, dict):
+            raise PurchaseOrderError('بيانات عنصر أمر الشراء غير صالحة')
+        quantity = item_data.get('quantity')
+        if not item_data.get('product_id') or not is_positive_int(quantity):
+            raise PurchaseOrderError('معرف المنتج والكمية الموجبة مطلوبان لكل عنصر')
+        try:
+            product_id = parse_id(item_data['product_id'])
+        except ValueError:
+            raise PurchaseOrderError('معرف المنتج يجب أن يكون رقماً صحيحاً')
+        try:
+            unit_cost = Decimal(str(item_data.get('unit_cost', 0)))
+            if not unit_cost.is_finite() or unit_cost < 0:
+                raise ArithmeticError
+        except ArithmeticError:
+            raise PurchaseOrderError('تكلفة الوحدة غير صحيحة')
+        lines.append({
+            'product_id': product_id,
+            'quantity': quantity,
+            'unit_cost': unit_cost,
+            'total_cost': unit_cost * quantity
+        })
+    
+    # التحقق من وجود جميع المنتجات في استعلام واحد
+    product_ids = {line['product_id'] for line in lines}
+    found = {row[0] for row in db.session.query(Product.product_id).filter(
+        Product.product_id.in_(product_ids)
+    )}
+    missing = product_ids - found
+    if missing:
+        raise PurchaseOrderError(f'المنتج {min(missing)} غير موجود')
+    return lines
+
+@purchase_orders_bp.route('/suppliers/<int:supplier_id>/purchase-orders', methods=['GET'])
+def get_purchase_orders(supplier_id):
+    try:
+        status = request.args.get('status')
+        
+        # ترقيم الصفحات بالمؤشر (keyset) على purchase_order_id تنازلياً
+        limit = get_page_limit(request.args)
+        try:
+            cursor = decode_cursor(request.args.get('cursor'))
+            after_id = int(cursor[0]) if cursor else None
+        except (ValueError, TypeError, IndexError):
+            return jsonify({'error': 'مؤشر الصفحة غير صالح'}), 400
+        
+        query = PurchaseOrder.query.filter(PurchaseOrder.supplier_id == supplier_id)
+        if status:
+            if status not in PURCHASE_ORDER_STATUSES:
+                return jsonify({'error': 'حالة أمر الشراء غير صحيحة'}), 400
+            query = query.filter(PurchaseOrder.status == status)
+        if after_id:
+            query = query.filter(PurchaseOrder.purchase_order_id < after_id)
+        
+        orders = query.order_by(PurchaseOrder.purchase_order_id.desc()).limit(limit + 1).all()
+        if not orders and not db.session.get(Supplier, supplier_id):
+            return jsonify({'error': 'المورد غير موجود'}), 404
+        has_more = len(orders) > limit
+        orders = orders[:limit]
+        
+        next_cursor = None
+        if has_more:
+            next_cursor = encode_cursor(orders[-1].purchase_order_id)
+        
+        return jsonify({
+            'purchase_orders': [serialize_purchase_order(order) for order in orders],
+            'limit': limit,
+            'next_cursor': next_cursor
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@purchase_orders_bp.route('/suppliers/<int:supplier_id>/purchase-orders', methods=['POST'])
+@idempotent
+def create_purchase_order(supplier_id):
+    try:
+        data = request.get_json() or {}
+        
+        if not db.session.get(Supplier, supplier_id):
+            return jsonify({'error': 'المورد غير موجود'}), 404
+        
+        try:
+            lines = _order_lines(data.get('items'))
+            expected_date = data.get('expected_date')
+            if expected_date:
+                expected_date = date.fromisoformat(expected_date)
+        except ValueError:
+            return jsonify({'error': 'صيغة التاريخ غير صحيحة'}), 400
+        except PurchaseOrderError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        order = PurchaseOrder(
+            supplier_id=supplier_id,
+            expected_date=expected_date or None,
+            total_amount=sum(line['total_cost'] for line in lines),
+            notes=data.get('notes', '')
+        )
+        db.session.add(order)
+        db.session.flush()  # للحصول على purchase_order_id
+        
+        db.session.add_all([
+            PurchaseOrderItem(purchase_order_id=order.purchase_order_id, **line)
+            for line in lines
+        ])
+        db.session.commit()
+        
+        return jsonify({
+            'message': 'تم إنشاء أمر الشراء بنجاح',
+            'purchase_order_id': order.purchase_order_id,
+            'total_amount': float(order.total_amount)
+        }), 201
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@purchase_orders_bp.route('/suppliers/<int:supplier_id>/purchase-orders/<int:purchase_order_id>', methods=['GET'])
+def get_purchase_order(supplier_id, purchase_order_id):
+    try:
+        order = _get_order(supplier_id, purchase_order_id)
+        if order is None:
+            return jsonify({'error': 'أمر الشراء غير موجود'}), 404
+        
+        return jsonify(serialize_purchase_order(order, _order_items(purchase_order_id))), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def _transition(supplier_id, purchase_order_id, **values):
+    """نقل أمر الشراء من pending بتحديث شرطي، فلا يستلم أو يلغى مرتين"""
+    result = db.session.execute(
+        update(PurchaseOrder)
+        .where(
+            PurchaseOrder.purchase_order_id == purchase_order_id,
+            PurchaseOrder.supplier_id == supplier_id,
+            PurchaseOrder.status == 'pending'
+        )
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+@purchase_orders_bp.route('/suppliers/<int:supplier_id>/purchase-orders/<int:purchase_order_id>/receive', methods=['POST'])
+@idempotent
+def receive_purchase_order(supplier_id, purchase_order_id):
+    try:
+        order = _get_order(supplier_id, purchase_order_id)
+        if order is None:
+            return jsonify({'error': 'أمر الشراء غير موجود'}), 404
+        
+        if not _transition(supplier_id, purchase_order_id, status='received', received_at=datetime.utcnow()):
+            db.session.rollback()
+            return jsonify({'error': 'لا يمكن استلام أمر شراء غير معلق'}), 409
+        
+        # زيادة مخزون جميع المنتجات بجملة UPDATE واحدة في نفس المعاملة
+        received = defaultdict(int)
+        for product_id, quantity in db.session.query(
+            PurchaseOrderItem.product_id, PurchaseOrderItem.quantity
+        ).filter(PurchaseOrderItem.purchase_order_id == purchase_order_id):
+            received[product_id] += quantity
+        increment_stock(received)
+        
+        db.session.commit()
+        
+        return jsonify({
+            'message': 'تم استلام أمر الشراء وتحديث المخزون',
+            'purchase_order_id': purchase_order_id,
+            'received': [
+                {'product_id': product_id, 'quantity': quantity}
+                for product_id, quantity in sorted(received.items())
+            ]
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@purchase_orders_bp.route('/suppliers/<int:supplier_id>/purchase-orders/<int:purchase_order_id>/cancel', methods=['POST'])
+def cancel_purchase_order(supplier_id, purchase_order_id):
+    try:
+        if _get_order(supplier_id, purchase_order_id) is None:
+            return jsonify({'error': 'أمر الشراء غير موجود'}), 404
+        
+        if not _transition(supplier_id, purchase_order_id, status='cancelled'):
+            db.session.rollback()
+            return jsonify({'error': 'لا يمكن إلغاء أمر شراء غير معلق'}), 409
+        
+        db.session.commit()
+        
+        return jsonify({'message': 'تم إلغاء أمر الشراء'}), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
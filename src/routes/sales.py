@@ -1,10 +1,41 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context, current_app
 from src.models.database import db, Sale, SaleItem, Product, Customer, Return
+import queue
+import time
 from datetime import datetime, timedelta
-from sqlalchemy import func, and_
+from decimal import Decimal
+from collections import defaultdict
+from src.services.idempotency import idempotent
+from src.services.stock import increment_stock
+from src.services.product_cache import PRODUCT_IDS_OPTION
+from src.services.sales_effects import (
+    SaleRecord, ReturnRecord, apply_sale_effects, apply_return_effects
+)
+from src.services.reports import (
+    daily_sales_report_data, monthly_sales_report_data, timeseries_report_data,
+    parse_date_range, parse_utc_datetime
+)
+from src.services.jobs import register_job, enqueue_job
+from src.services.live_sales import live_sales_feed, format_sse, WAKE
+from src.services.report_cache import (
+    cached_report, daily_period_key, monthly_period_key, is_day_closed, is_month_closed
+)
+from src.services.sales_export import EXPORT_FORMATS, generate_csv, generate_ndjson
+from src.utils.pagination import get_page_limit, encode_cursor, decode_cursor
+from src.utils.validation import parse_id, is_positive_int
+from sqlalchemy import func, and_, or_, update, insert
 
 sales_bp = Blueprint('sales', __name__)
 
+# الحد الأقصى لعدد الفواتير في طلب المزامنة الجماعية
+SALES_BATCH_LIMIT = 2000
+
+# الفاصل بين رسائل الإبقاء على اتصال البث المباشر
+SSE_KEEPALIVE_SECONDS = 15
+
+# المدة التي ينتظرها العميل قبل إعادة الاتصال بالبث (حقل retry وترويسة Retry-After)
+SSE_RETRY_SECONDS = 10
+
 @sales_bp.route('/sales', methods=['GET'])
 def get_sales():
     try:
@@ -14,105 +45,467 @@ def get_sales():
         customer_id = request.args.get('customer_id', type=int)
         status = request.args.get('status')
         
-        query = Sale.query
-        
-        if start_date:
-            query = query.filter(Sale.sale_date >= datetime.fromisoformat(start_date))
-        if end_date:
-            query = query.filter(Sale.sale_date <= datetime.fromisoformat(end_date))
+        # ترقيم الصفحات بالمؤشر (keyset) على (sale_date, sale_id) تنازلياً
+        limit = get_page_limit(request.args)
+        try:
+            cursor = decode_cursor(request.args.get('cursor'))
+            if cursor:
+                after_date, after_id = datetime.fromisoformat(cursor[0]), int(cursor[1])
+        except (ValueError, TypeError, IndexError):
+            return jsonify({'error': 'مؤشر الصفحة غير صالح'}), 400
+        
+        # عدد العناصر كاستعلام فرعي مرتبط واسم العميل بربط خارجي في نفس الجملة
+        items_count = db.session.query(
+            func.count(SaleItem.sale_item_id)
+        ).filter(
+            SaleItem.sale_id == Sale.sale_id
+        ).correlate(Sale).scalar_subquery()
+        
+        query = db.session.query(
+            Sale,
+            Customer.name.label('customer_name'),
+            items_count.label('items_count')
+        ).outerjoin(Customer, Sale.customer_id == Customer.customer_id)
+        
+        # نطاق نصف مفتوح [start, end) على العمود مباشرة حتى يستخدم الفهرس
+        range_start, range_end = parse_date_range(start_date, end_date)
+        if range_start:
+            query = query.filter(Sale.sale_date >= range_start)
+        if range_end:
+            query = query.filter(Sale.sale_date < range_end)
         if customer_id:
             query = query.filter(Sale.customer_id == customer_id)
         if status:
             query = query.filter(Sale.status == status)
+        if cursor:
+            query = query.filter(or_(
+                Sale.sale_date < after_date,
+                and_(Sale.sale_date == after_date, Sale.sale_id < after_id)
+            ))
         
-        sales = query.order_by(Sale.sale_date.desc()).all()
+        rows = query.order_by(Sale.sale_date.desc(), Sale.sale_id.desc()).limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
         
         sales_data = []
-        for sale in sales:
+        for sale, customer_name, sale_items_count in rows:
             sales_data.append({
                 'sale_id': sale.sale_id,
                 'customer_id': sale.customer_id,
-                'customer_name': sale.customer.name if sale.customer else 'عميل نقدي',
+                'customer_name': customer_name or 'عميل نقدي',
                 'sale_date': sale.sale_date.isoformat() if sale.sale_date else None,
                 'total_amount': float(sale.total_amount),
                 'discount_amount': float(sale.discount_amount),
                 'tax_amount': float(sale.tax_amount),
                 'payment_method': sale.payment_method,
                 'status': sale.status,
-                'items_count': len(sale.sale_items)
+                'items_count': sale_items_count
             })
         
-        return jsonify({'sales': sales_data}), 200
+        next_cursor = None
+        if has_more:
+            last_sale = rows[-1][0]
+            next_cursor = encode_cursor(last_sale.sale_date.isoformat(), last_sale.sale_id)
+        
+        return jsonify({
+            'sales': sales_data,
+            'limit': limit,
+            'next_cursor': next_cursor
+        }), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+class SaleError(Exception):
+    """خطأ في بيانات الفاتورة أو المخزون يعاد للعميل برمز 400"""
+
+
+def _to_decimal(value):
+    try:
+        amount = Decimal(str(value or 0))
+    except ArithmeticError:
+        raise SaleError(f'قيمة مالية غير صحيحة: {value}')
+    if not amount.is_finite():
+        raise SaleError(f'قيمة مالية غير صحيحة: {value}')
+    return amount
+
+
+def _decrement_stock(requested):
+    """خصم الكميات بتحديث شرطي لكل منتج، ويفشل إذا لم يعد المخزون كافياً"""
+    for product_id, quantity in sorted(requested.items()):
+        result = db.session.execute(
+            update(Product)
+            .where(Product.product_id == product_id, Product.quantity >= quantity)
+            .values(quantity=Product.quantity - quantity)
+            .execution_options(synchronize_session=False, **{PRODUCT_IDS_OPTION: (product_id,)})
+        )
+        if result.rowcount != 1:
+            return product_id
+    return None
+
+
+def _requested_quantities(items):
+    """التحقق من عناصر الفاتورة وجمع الكمية المطلوبة لكل منتج"""
+    if not items:
+        raise SaleError('يجب إضافة منتجات للفاتورة')
+    if not isinstance(items, list):
+        raise SaleError('عناصر الفاتورة يجب أن تكون قائمة')
+    
+    requested = defaultdict(int)
+    for item_data in items:
+        if not isinstance(item_data, dict):
+            raise SaleError('بيانات عنصر الفاتورة غير صالحة')
+        quantity = item_data.get('quantity')
+        if not item_data.get('product_id') or not is_positive_int(quantity):
+            raise SaleError('معرف المنتج والكمية الموجبة مطلوبان لكل عنصر')
+        # المعرف مفتاح لمطابقة المنتجات المحملة، فيوحد إلى int ("1" و 1 نفس المنتج)
+        try:
+            product_id = parse_id(item_data['product_id'])
+        except ValueError:
+            raise SaleError('معرف المنتج يجب أن يكون رقماً صحيحاً')
+        requested[product_id] += quantity
+    return requested
+
+
+def _parse_customer_id(value):
+    """معرف العميل الاختياري للفاتورة، وNone للعميل النقدي"""
+    if value is None or value == '':
+        return None
+    try:
+        return parse_id(value)
+    except ValueError:
+        raise SaleError('معرف العميل يجب أن يكون رقماً صحيحاً')
+
+
+def _load_products(product_ids):
+    """تحميل المنتجات في استعلام واحد مع قفل الصفوف في PostgreSQL"""
+    # يتجاهل SQLite عبارة FOR UPDATE لأن الكتابة فيه متسلسلة أصلاً
+    return {
+        product.product_id: product
+        for product in Product.query.filter(
+            Product.product_id.in_(product_ids)
+        ).order_by(Product.product_id).with_for_update().all()
+    }
+
+
+def _check_stock(requested, products, available):
+    for product_id, quantity in requested.items():
+        product = products.get(product_id)
+        if not product:
+            raise SaleError(f'المنتج غير موجود: {product_id}')
+        if available[product_id] < quantity:
+            raise SaleError(f'الكمية المطلوبة غير متوفرة للمنتج: {product.name}')
+
+
+def _price_items(items, products):
+    """حساب سعر وإجمالي كل عنصر، ويرجع العناصر والمجموع قبل الضريبة والخصم"""
+    lines = []
+    subtotal = Decimal('0')
+    for item_data in items:
+        product = products[parse_id(item_data['product_id'])]
+        quantity = item_data['quantity']
+        unit_price = _to_decimal(item_data.get('unit_price', product.price))
+        total_price = quantity * unit_price
+        lines.append({
+            'product_id': product.product_id,
+            'quantity': quantity,
+            'unit_price': unit_price,
+            'total_price': total_price
+        })
+        subtotal += total_price
+    return lines, subtotal
+
+
+def _record_sale(data):
+    """إنشاء الفاتورة وعناصرها وخصم المخزون داخل المعاملة الحالية دون commit"""
+    requested = _requested_quantities(data.get('items'))
+    
+    # تحميل جميع منتجات الفاتورة في استعلام واحد
+    products = _load_products(requested.keys())
+    _check_stock(requested, products, {
+        product_id: product.quantity for product_id, product in products.items()
+    })
+    
+    # إنشاء الفاتورة
+    sale = Sale(
+        customer_id=data.get('customer_id'),
+        total_amount=0,  # سيتم حسابه لاحقاً
+        discount_amount=_to_decimal(data.get('discount_amount', 0)),
+        tax_amount=_to_decimal(data.get('tax_amount', 0)),
+        payment_method=data.get('payment_method', 'نقدي'),
+        status=data.get('status', 'completed')
+    )
+    
+    db.session.add(sale)
+    db.session.flush()  # للحصول على sale_id
+    
+    # إضافة عناصر الفاتورة
+    lines, subtotal = _price_items(data['items'], products)
+    sale_items = [SaleItem(sale_id=sale.sale_id, **line) for line in lines]
+    db.session.add_all(sale_items)
+    
+    # تحديث كميات المنتجات بتحديث شرطي يمنع البيع بأكثر من المخزون
+    # حتى لو باعت نقطتا بيع نفس القطعة في نفس اللحظة
+    failed_product_id = _decrement_stock(requested)
+    if failed_product_id is not None:
+        raise SaleError(f'الكمية المطلوبة غير متوفرة للمنتج: {products[failed_product_id].name}')
+    
+    # تحديث إجمالي الفاتورة
+    sale.total_amount = subtotal + sale.tax_amount - sale.discount_amount
+    
+    apply_sale_effects([SaleRecord(
+        sale_id=sale.sale_id,
+        customer_id=sale.customer_id,
+        sale_date=sale.sale_date,
+        total_amount=sale.total_amount,
+        tax_amount=sale.tax_amount,
+        discount_amount=sale.discount_amount,
+        lines=lines
+    )])
+    
+    return sale, sale_items
+
 @sales_bp.route('/sales', methods=['POST'])
+@idempotent
 def create_sale():
     try:
         data = request.get_json()
         
-        if not data.get('items') or len(data['items']) == 0:
-            return jsonify({'error': 'يجب إضافة منتجات للفاتورة'}), 400
-        
-        # إنشاء الفاتورة
-        sale = Sale(
-            customer_id=data.get('customer_id'),
-            total_amount=0,  # سيتم حسابه لاحقاً
-            discount_amount=data.get('discount_amount', 0),
-            tax_amount=data.get('tax_amount', 0),
-            payment_method=data.get('payment_method', 'نقدي'),
-            status=data.get('status', 'completed')
-        )
+        try:
+            sale, sale_items = _record_sale(data)
+        except SaleError as e:
+            db.session.rollback()
+            return jsonify({'error': str(e)}), 400
         
-        db.session.add(sale)
-        db.session.flush()  # للحصول على sale_id
+        db.session.commit()
         
-        total_amount = 0
+        return jsonify({
+            'message': 'تم إنشاء الفاتورة بنجاح',
+            'sale_id': sale.sale_id,
+            'total_amount': float(sale.total_amount)
+        }), 201
         
-        # إضافة عناصر الفاتورة
-        for item_data in data['items']:
-            product = Product.query.get(item_data['product_id'])
-            if not product:
-                return jsonify({'error': f'المنتج غير موجود: {item_data["product_id"]}'}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@sales_bp.route('/sales/batch', methods=['POST'])
+@idempotent
+def create_sales_batch():
+    try:
+        data = request.get_json()
+        sales_data = data.get('sales') if isinstance(data, dict) else data
+        
+        if not isinstance(sales_data, list) or not sales_data:
+            return jsonify({'error': 'يجب إرسال قائمة فواتير'}), 400
+        if len(sales_data) > SALES_BATCH_LIMIT:
+            return jsonify({'error': f'الحد الأقصى {SALES_BATCH_LIMIT} فاتورة في الطلب الواحد'}), 400
+        
+        # التحقق من جميع الفواتير وجمع منتجاتها لتحميلها في استعلام واحد
+        parsed = []
+        product_ids = set()
+        customer_ids = set()
+        for sale_data in sales_data:
+            try:
+                if not isinstance(sale_data, dict):
+                    raise SaleError('بيانات الفاتورة غير صالحة')
+                requested = _requested_quantities(sale_data.get('items'))
+                sale_date = sale_data.get('sale_date')
+                sale_date = parse_utc_datetime(sale_date) if sale_date else datetime.utcnow()
+                customer_id = _parse_customer_id(sale_data.get('customer_id'))
+                product_ids.update(requested.keys())
+                if customer_id is not None:
+                    customer_ids.add(customer_id)
+                parsed.append((sale_data, requested, sale_date, customer_id, None))
+            except (SaleError, ValueError, TypeError) as e:
+                parsed.append((sale_data, None, None, None, str(e)))
+        
+        products = _load_products(product_ids)
+        available = {product_id: product.quantity for product_id, product in products.items()}
+        # العملاء المشار إليهم في استعلام واحد، فالفاتورة لعميل غير موجود تفشل وحدها
+        # بدلاً من أن يفشل الإدراج الجماعي كله بخرق المفتاح الأجنبي
+        known_customers = {
+            customer_id for (customer_id,) in db.session.query(Customer.customer_id).filter(
+                Customer.customer_id.in_(customer_ids)
+            )
+        } if customer_ids else set()
+        
+        # قبول الفواتير بالترتيب ما دام المخزون المتبقي يكفيها، ورفض ما عداها فقط
+        results = []
+        accepted = []
+        sold = defaultdict(int)
+        for index, (sale_data, requested, sale_date, customer_id, error) in enumerate(parsed):
+            result = {'index': index}
+            if isinstance(sale_data, dict) and sale_data.get('client_ref') is not None:
+                result['client_ref'] = sale_data['client_ref']
             
-            quantity = item_data['quantity']
-            if product.quantity < quantity:
-                return jsonify({'error': f'الكمية المطلوبة غير متوفرة للمنتج: {product.name}'}), 400
+            if error is None:
+                try:
+                    if customer_id is not None and customer_id not in known_customers:
+                        raise SaleError(f'العميل غير موجود: {customer_id}')
+                    _check_stock(requested, products, available)
+                    lines, subtotal = _price_items(sale_data['items'], products)
+                    discount_amount = _to_decimal(sale_data.get('discount_amount', 0))
+                    tax_amount = _to_decimal(sale_data.get('tax_amount', 0))
+                except SaleError as e:
+                    error = str(e)
             
-            unit_price = item_data.get('unit_price', product.price)
-            total_price = quantity * unit_price
+            if error is not None:
+                result.update({'status': 'failed', 'error': error})
+                results.append(result)
+                continue
             
-            sale_item = SaleItem(
-                sale_id=sale.sale_id,
-                product_id=product.product_id,
-                quantity=quantity,
-                unit_price=unit_price,
-                total_price=total_price
-            )
+            for product_id, quantity in requested.items():
+                available[product_id] -= quantity
+                sold[product_id] += quantity
             
-            db.session.add(sale_item)
+            accepted.append((result, lines, {
+                'customer_id': customer_id,
+                'sale_date': sale_date,
+                'total_amount': subtotal + tax_amount - discount_amount,
+                'discount_amount': discount_amount,
+                'tax_amount': tax_amount,
+                'payment_method': sale_data.get('payment_method', 'نقدي'),
+                'status': sale_data.get('status', 'completed')
+            }))
+            results.append(result)
+        
+        if accepted:
+            # إدراج جماعي للفواتير ثم لعناصرها
+            sale_ids = db.session.scalars(
+                insert(Sale).returning(Sale.sale_id, sort_by_parameter_order=True),
+                [sale_row for _, _, sale_row in accepted]
+            ).all()
             
-            # تحديث كمية المنتج
-            product.quantity -= quantity
+            item_rows = []
+            records = []
+            for sale_id, (result, lines, sale_row) in zip(sale_ids, accepted):
+                item_rows.extend({'sale_id': sale_id, **line} for line in lines)
+                records.append(SaleRecord(
+                    sale_id=sale_id,
+                    customer_id=sale_row['customer_id'],
+                    sale_date=sale_row['sale_date'],
+                    total_amount=sale_row['total_amount'],
+                    tax_amount=sale_row['tax_amount'],
+                    discount_amount=sale_row['discount_amount'],
+                    lines=lines
+                ))
+                result.update({
+                    'status': 'created',
+                    'sale_id': sale_id,
+                    'total_amount': float(sale_row['total_amount'])
+                })
+            db.session.execute(insert(SaleItem), item_rows)
             
-            total_amount += total_price
-        
-        # تحديث إجمالي الفاتورة
-        sale.total_amount = total_amount + sale.tax_amount - sale.discount_amount
+            # خصم مجموع الكميات المقبولة لكل منتج بتحديث شرطي واحد لكل منتج
+            failed_product_id = _decrement_stock(sold)
+            if failed_product_id is not None:
+                db.session.rollback()
+                return jsonify({
+                    'error': f'تغير مخزون المنتج أثناء المعالجة: {products[failed_product_id].name}، أعد المحاولة'
+                }), 409
+            
+            apply_sale_effects(records)
         
         db.session.commit()
         
         return jsonify({
-            'message': 'تم إنشاء الفاتورة بنجاح',
-            'sale_id': sale.sale_id,
-            'total_amount': float(sale.total_amount)
-        }), 201
+            'created': len(accepted),
+            'failed': len(results) - len(accepted),
+            'results': results
+        }), 200
         
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@sales_bp.route('/sales/stream', methods=['GET'])
+def sales_stream():
+    # الاتصال يحجز خيطاً من خيوط العامل، فعند بلوغ الحد يرفض ويعود العميل إلى الاستطلاع
+    subscriber = live_sales_feed.subscribe(current_app.config.get('LIVE_SALES_MAX_SUBSCRIBERS', 2))
+    if subscriber is None:
+        response = jsonify({
+            'error': 'تم بلوغ الحد الأقصى لاتصالات البث المباشر، استخدم /api/sales/reports/daily',
+            'poll_url': '/api/sales/reports/daily'
+        })
+        response.headers['Retry-After'] = str(SSE_RETRY_SECONDS)
+        return response, 503
+    
+    # إنهاء الاتصال بعد مدة محددة يحرر الخيط ويعطي المنتظرين فرصة، ويعيد المتصفح الاتصال تلقائياً
+    deadline = time.monotonic() + current_app.config.get('LIVE_SALES_STREAM_SECONDS', 300)
+    
+    def generate():
+        try:
+            yield f'retry: {SSE_RETRY_SECONDS * 1000}\n\n'
+            yield format_sse('snapshot', live_sales_feed.snapshot())
+            while time.monotonic() < deadline:
+                try:
+                    message = subscriber.get(timeout=SSE_KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    live_sales_feed.resync()
+                    yield ': keepalive\n\n'
+                    continue
+                if message is WAKE:
+                    # تطبيق المبيعات المثبتة هنا لا في خطاف commit، وخطؤه لا يقطع البث
+                    try:
+                        live_sales_feed.apply_pending()
+                    except Exception:
+                        current_app.logger.exception('تعذر تطبيق تحديثات البث المباشر')
+                    continue
+                yield message
+        finally:
+            live_sales_feed.unsubscribe(subscriber)
+    
+    response = Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    # يحرر المكان أيضاً إذا أغلق الاتصال قبل بدء المولد
+    response.call_on_close(lambda: live_sales_feed.unsubscribe(subscriber))
+    return response
+
+@sales_bp.route('/sales/export', methods=['GET'])
+def export_sales():
+    try:
+        export_format = request.args.get('format', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            return jsonify({'error': 'صيغة التصدير يجب أن تكون csv أو ndjson'}), 400
+        
+        try:
+            range_start, range_end = parse_date_range(request.args.get('from'), request.args.get('to'))
+        except ValueError:
+            return jsonify({'error': 'صيغة التاريخ غير صحيحة'}), 400
+        
+        include_items = request.args.get('include_items') in ('1', 'true')
+        filters = {
+            'customer_id': request.args.get('customer_id', type=int),
+            'status': request.args.get('status')
+        }
+        
+        # الاستجابة تبث الصفوف أثناء قراءتها بدلاً من بناء الملف كاملاً في الذاكرة
+        if export_format == 'csv':
+            body = generate_csv(range_start, range_end, include_items, **filters)
+            mimetype = 'text/csv'
+        else:
+            body = generate_ndjson(range_start, range_end, include_items, **filters)
+            mimetype = 'application/x-ndjson'
+        
+        filename = 'sales_{}_{}.{}'.format(
+            request.args.get('from', 'all'), request.args.get('to', 'all'), export_format
+        )
+        return Response(
+            stream_with_context(body),
+            mimetype=mimetype,
+            headers={
+                'Content-Disposition': f'attachment; filename="{filename}"',
+                'X-Accel-Buffering': 'no'
+            }
+        )
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @sales_bp.route('/sales/<int:sale_id>', methods=['GET'])
 def get_sale(sale_id):
     try:
@@ -148,8 +541,86 @@ def get_sale(sale_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def _returned_quantities(sale_item_ids):
+    """مجموع الكميات المرجعة سابقاً لكل عنصر باستعلام SUM واحد"""
+    rows = db.session.query(
+        Return.sale_item_id, func.sum(Return.quantity)
+    ).filter(
+        Return.sale_item_id.in_(sale_item_ids)
+    ).group_by(Return.sale_item_id).all()
+    return {sale_item_id: int(total) for sale_item_id, total in rows}
+
+
+def _requested_returns(lines):
+    """التحقق من أسطر المرتجع وجمع الكمية المطلوبة لكل عنصر"""
+    if not isinstance(lines, list) or not lines:
+        raise SaleError('يجب تحديد العناصر المرجعة أو "all"')
+    
+    requested = defaultdict(int)
+    for line in lines:
+        quantity = line.get('quantity') if isinstance(line, dict) else None
+        if not is_positive_int(quantity) or not line.get('sale_item_id'):
+            raise SaleError('معرف العنصر والكمية الموجبة مطلوبان لكل سطر')
+        # المعرف يستخدم مفتاحاً لمطابقة العناصر المحملة، فيوحد إلى int ("1" و 1 نفس العنصر)
+        try:
+            sale_item_id = parse_id(line['sale_item_id'])
+        except ValueError:
+            raise SaleError('معرف العنصر يجب أن يكون رقماً صحيحاً')
+        requested[sale_item_id] += quantity
+    return requested
+
+
+def _record_returns(sale, requested, reason):
+    """تسجيل مرتجعات عدة عناصر من فاتورة واحدة داخل المعاملة الحالية دون commit"""
+    # requested: {sale_item_id: quantity}، أو None لإرجاع كل ما تبقى من الفاتورة
+    query = SaleItem.query.filter(SaleItem.sale_id == sale.sale_id)
+    if requested is not None:
+        query = query.filter(SaleItem.sale_item_id.in_(requested.keys()))
+    
+    # قفل عناصر الفاتورة حتى لا يتجاوز مرتجعان متزامنان الكمية المباعة
+    items = {item.sale_item_id: item for item in query.with_for_update().all()}
+    if requested is not None and len(items) != len(requested):
+        raise SaleError('بعض العناصر لا تنتمي لهذه الفاتورة')
+    
+    returned = _returned_quantities(list(items))
+    if requested is None:
+        requested = {
+            sale_item_id: item.quantity - returned.get(sale_item_id, 0)
+            for sale_item_id, item in items.items()
+            if item.quantity > returned.get(sale_item_id, 0)
+        }
+        if not requested:
+            raise SaleError('تم إرجاع جميع عناصر الفاتورة مسبقاً')
+    
+    restock = defaultdict(int)
+    records = []
+    returns = []
+    for sale_item_id, quantity in sorted(requested.items()):
+        item = items[sale_item_id]
+        if returned.get(sale_item_id, 0) + quantity > item.quantity:
+            raise SaleError('الكمية المرجعة تتجاوز الكمية المباعة')
+        
+        returns.append(Return(sale_item_id=sale_item_id, quantity=quantity, reason=reason))
+        restock[item.product_id] += quantity
+        records.append(ReturnRecord(
+            sale_id=sale.sale_id,
+            customer_id=sale.customer_id,
+            sale_date=sale.sale_date,
+            product_id=item.product_id,
+            quantity=quantity,
+            amount=quantity * item.unit_price
+        ))
+    
+    db.session.add_all(returns)
+    increment_stock(restock)
+    apply_return_effects(records)
+    db.session.flush()  # للحصول على return_id
+    
+    return returns, records
+
 @sales_bp.route('/sales/<int:sale_id>/return', methods=['POST'])
-def return_item():
+@idempotent
+def return_item(sale_id):
     try:
         data = request.get_json()
         sale_item_id = data.get('sale_item_id')
@@ -159,29 +630,56 @@ def return_item():
         if not sale_item_id or not quantity:
             return jsonify({'error': 'معرف العنصر والكمية مطلوبان'}), 400
         
-        sale_item = SaleItem.query.get_or_404(sale_item_id)
+        sale = Sale.query.get_or_404(sale_id)
         
-        # التحقق من الكمية
-        returned_quantity = sum(ret.quantity for ret in sale_item.returns)
-        if returned_quantity + quantity > sale_item.quantity:
-            return jsonify({'error': 'الكمية المرجعة تتجاوز الكمية المباعة'}), 400
+        try:
+            _record_returns(sale, _requested_returns([
+                {'sale_item_id': sale_item_id, 'quantity': quantity}
+            ]), reason)
+        except SaleError as e:
+            db.session.rollback()
+            return jsonify({'error': str(e)}), 400
         
-        # إنشاء المرتجع
-        return_item = Return(
-            sale_item_id=sale_item_id,
-            quantity=quantity,
-            reason=reason
-        )
+        db.session.commit()
         
-        db.session.add(return_item)
+        return jsonify({'message': 'تم إرجاع المنتج بنجاح'}), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@sales_bp.route('/sales/<int:sale_id>/returns', methods=['POST'])
+@idempotent
+def return_items(sale_id):
+    try:
+        data = request.get_json() or {}
+        lines = data.get('lines')
+        reason = data.get('reason', '')
+        
+        sale = Sale.query.get_or_404(sale_id)
         
-        # إعادة الكمية للمخزون
-        product = sale_item.product
-        product.quantity += quantity
+        # كل الأسطر في معاملة واحدة: إما أن تسجل جميعها أو لا يسجل شيء
+        try:
+            requested = None if lines == 'all' else _requested_returns(lines)
+            returns, records = _record_returns(sale, requested, reason)
+        except SaleError as e:
+            db.session.rollback()
+            return jsonify({'error': str(e)}), 400
         
         db.session.commit()
         
-        return jsonify({'message': 'تم إرجاع المنتج بنجاح'}), 200
+        return jsonify({
+            'message': 'تم إرجاع المنتجات بنجاح',
+            'sale_id': sale_id,
+            'returns': [{
+                'return_id': return_row.return_id,
+                'sale_item_id': return_row.sale_item_id,
+                'product_id': record.product_id,
+                'quantity': record.quantity,
+                'amount': float(record.amount)
+            } for return_row, record in zip(returns, records)],
+            'total_refund': float(sum(record.amount for record in records))
+        }), 200
         
     except Exception as e:
         db.session.rollback()
@@ -193,33 +691,12 @@ def daily_sales_report():
         date = request.args.get('date', datetime.now().date().isoformat())
         target_date = datetime.fromisoformat(date).date()
         
-        # مبيعات اليوم
-        sales = Sale.query.filter(
-            func.date(Sale.sale_date) == target_date
-        ).all()
-        
-        total_sales = sum(sale.total_amount for sale in sales)
-        total_transactions = len(sales)
-        
-        # أكثر المنتجات مبيعاً
-        top_products = db.session.query(
-            Product.name,
-            func.sum(SaleItem.quantity).label('total_quantity')
-        ).join(SaleItem).join(Sale).filter(
-            func.date(Sale.sale_date) == target_date
-        ).group_by(Product.product_id).order_by(
-            func.sum(SaleItem.quantity).desc()
-        ).limit(5).all()
-        
-        report_data = {
-            'date': date,
-            'total_sales': float(total_sales),
-            'total_transactions': total_transactions,
-            'top_products': [
-                {'name': product.name, 'quantity': int(quantity)}
-                for product, quantity in top_products
-            ]
-        }
+        report_data = cached_report(
+            'daily',
+            daily_period_key(target_date),
+            is_day_closed(target_date),
+            lambda: daily_sales_report_data(target_date)
+        )
         
         return jsonify(report_data), 200
         
@@ -232,42 +709,71 @@ def monthly_sales_report():
         year = request.args.get('year', datetime.now().year, type=int)
         month = request.args.get('month', datetime.now().month, type=int)
         
-        # بداية ونهاية الشهر
-        start_date = datetime(year, month, 1)
-        if month == 12:
-            end_date = datetime(year + 1, 1, 1)
-        else:
-            end_date = datetime(year, month + 1, 1)
-        
-        # مبيعات الشهر
-        sales = Sale.query.filter(
-            and_(Sale.sale_date >= start_date, Sale.sale_date < end_date)
-        ).all()
+        report_data = cached_report(
+            'monthly',
+            monthly_period_key(year, month),
+            is_month_closed(year, month),
+            lambda: monthly_sales_report_data(year, month)
+        )
         
-        total_sales = sum(sale.total_amount for sale in sales)
-        total_transactions = len(sales)
+        return jsonify(report_data), 200
         
-        # مبيعات يومية
-        daily_sales = db.session.query(
-            func.date(Sale.sale_date).label('date'),
-            func.sum(Sale.total_amount).label('total')
-        ).filter(
-            and_(Sale.sale_date >= start_date, Sale.sale_date < end_date)
-        ).group_by(func.date(Sale.sale_date)).all()
-        
-        report_data = {
-            'year': year,
-            'month': month,
-            'total_sales': float(total_sales),
-            'total_transactions': total_transactions,
-            'daily_sales': [
-                {'date': day.date.isoformat(), 'total': float(day.total)}
-                for day in daily_sales
-            ]
-        }
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def _timeseries_from_params(params):
+    range_start, range_end = parse_date_range(params.get('from'), params.get('to'))
+    range_end = range_end or datetime.utcnow()
+    range_start = range_start or range_end - timedelta(days=30)
+    return timeseries_report_data(
+        params.get('bucket', 'day'), range_start, range_end, params.get('group_by') or None
+    )
+
+@sales_bp.route('/sales/reports/timeseries', methods=['GET'])
+def timeseries_sales_report():
+    try:
+        try:
+            report_data = _timeseries_from_params(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         return jsonify(report_data), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# التقارير الطويلة (سنة كاملة، كل المنتجات) تنفذ كمهام خلفية عبر POST /sales/reports/jobs
+@register_job('sales_report_timeseries')
+def _timeseries_report_job(params):
+    return _timeseries_from_params(params)
+
+@register_job('sales_report_daily')
+def _daily_report_job(params):
+    target_date = datetime.fromisoformat(params.get('date', datetime.utcnow().date().isoformat())).date()
+    return daily_sales_report_data(target_date)
+
+@register_job('sales_report_monthly')
+def _monthly_report_job(params):
+    now = datetime.utcnow()
+    return monthly_sales_report_data(int(params.get('year', now.year)), int(params.get('month', now.month)))
+
+@sales_bp.route('/sales/reports/jobs', methods=['POST'])
+def enqueue_sales_report():
+    try:
+        data = request.get_json() or {}
+        report = data.get('report')
+        
+        try:
+            job = enqueue_job(f'sales_report_{report}', data.get('params') or {})
+        except ValueError:
+            return jsonify({'error': f'نوع التقرير غير معروف: {report}'}), 400
+        
+        return jsonify({
+            'job_id': job.job_id,
+            'status': job.status,
+            'status_url': f'/api/jobs/{job.job_id}'
+        }), 202
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
@@ -1,37 +1,47 @@
 from flask import Blueprint, request, jsonify
-from src.models.database import db, Supplier
+from src.models.database import db, Supplier, Product, Category, PurchaseOrder
+from src.services.product_totals import with_product_totals, serialize_totals
+from src.utils.arabic import normalized_word_prefix_filter
 from sqlalchemy import or_
 
 suppliers_bp = Blueprint('suppliers', __name__)
 
+def serialize_supplier(supplier, totals):
+    return {
+        'supplier_id': supplier.supplier_id,
+        'name': supplier.name,
+        'address': supplier.address,
+        'phone_number': supplier.phone_number,
+        'email': supplier.email,
+        **totals,
+        'created_at': supplier.created_at.isoformat() if supplier.created_at else None,
+        'updated_at': supplier.updated_at.isoformat() if supplier.updated_at else None
+    }
+
 @suppliers_bp.route('/suppliers', methods=['GET'])
 def get_suppliers():
     try:
         search = request.args.get('search', '')
+        include_stock = request.args.get('include_stock') in ('1', 'true')
         
-        query = Supplier.query
+        # عدد المنتجات (وقيمة المخزون عند الطلب) من استعلام تجميعي في نفس الجملة
+        query = with_product_totals(
+            db.session.query(Supplier), Supplier.supplier_id, include_stock
+        )
         
         if search:
             query = query.filter(or_(
-                Supplier.name.contains(search),
+                normalized_word_prefix_filter(Supplier.name_normalized, search),
                 Supplier.phone_number.contains(search),
                 Supplier.email.contains(search)
             ))
         
-        suppliers = query.all()
-        
-        suppliers_data = []
-        for supplier in suppliers:
-            suppliers_data.append({
-                'supplier_id': supplier.supplier_id,
-                'name': supplier.name,
-                'address': supplier.address,
-                'phone_number': supplier.phone_number,
-                'email': supplier.email,
-                'products_count': len(supplier.products),
-                'created_at': supplier.created_at.isoformat() if supplier.created_at else None,
-                'updated_at': supplier.updated_at.isoformat() if supplier.updated_at else None
-            })
+        rows = query.order_by(Supplier.supplier_id).all()
+        
+        suppliers_data = [
+            serialize_supplier(row[0], serialize_totals(row, include_stock))
+            for row in rows
+        ]
         
         return jsonify({'suppliers': suppliers_data}), 200
         
@@ -74,18 +84,14 @@ def create_supplier():
 @suppliers_bp.route('/suppliers/<int:supplier_id>', methods=['GET'])
 def get_supplier(supplier_id):
     try:
-        supplier = Supplier.query.get_or_404(supplier_id)
+        include_stock = request.args.get('include_stock') in ('1', 'true')
+        row = with_product_totals(
+            db.session.query(Supplier), Supplier.supplier_id, include_stock
+        ).filter(Supplier.supplier_id == supplier_id).first()
+        if row is None:
+            return jsonify({'error': 'المورد غير موجود'}), 404
         
-        supplier_data = {
-            'supplier_id': supplier.supplier_id,
-            'name': supplier.name,
-            'address': supplier.address,
-            'phone_number': supplier.phone_number,
-            'email': supplier.email,
-            'products_count': len(supplier.products),
-            'created_at': supplier.created_at.isoformat() if supplier.created_at else None,
-            'updated_at': supplier.updated_at.isoformat() if supplier.updated_at else None
-        }
+        supplier_data = serialize_supplier(row[0], serialize_totals(row, include_stock))
         
         return jsonify(supplier_data), 200
         
@@ -128,8 +134,10 @@ def delete_supplier(supplier_id):
         supplier = Supplier.query.get_or_404(supplier_id)
         
         # التحقق من عدم وجود منتجات مرتبطة بالمورد
-        if supplier.products:
+        if db.session.query(Product.query.filter(Product.supplier_id == supplier_id).exists()).scalar():
             return jsonify({'error': 'لا يمكن حذف المورد لوجود منتجات مرتبطة به'}), 400
+        if db.session.query(PurchaseOrder.query.filter(PurchaseOrder.supplier_id == supplier_id).exists()).scalar():
+            return jsonify({'error': 'لا يمكن حذف المورد لوجود أوامر شراء مرتبطة به'}), 400
         
         db.session.delete(supplier)
         db.session.commit()
@@ -145,8 +153,17 @@ def get_supplier_products(supplier_id):
     try:
         supplier = Supplier.query.get_or_404(supplier_id)
         
+        # اسم الفئة بربط خارجي بدلاً من التحميل الكسول لكل منتج
+        rows = db.session.query(
+            Product, Category.name.label('category_name')
+        ).outerjoin(
+            Category, Product.category_id == Category.category_id
+        ).filter(
+            Product.supplier_id == supplier.supplier_id
+        ).order_by(Product.product_id).all()
+        
         products_data = []
-        for product in supplier.products:
+        for product, category_name in rows:
             products_data.append({
                 'product_id': product.product_id,
                 'name': product.name,
@@ -154,11 +171,10 @@ def get_supplier_products(supplier_id):
                 'model': product.model,
                 'price': float(product.price),
                 'quantity': product.quantity,
-                'category_name': product.category.name if product.category else None
+                'category_name': category_name
             })
         
         return jsonify({'products': products_data}), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-
@@ -0,0 +1,101 @@
+from collections import defaultdict
+from sqlalchemy import func, case, select, update, bindparam
+from src.models.database import db, Customer, Sale, SaleItem, Return
+
+# إجمالي إنفاق العميل (صافي المرتجعات) وعدد فواتيره وتاريخ آخر شراء،
+# تحدث بجملة UPDATE ذرية في نفس معاملة البيع أو الإرجاع
+
+
+def _update_customers(values, rows):
+    if not rows:
+        return
+    table = Customer.__table__
+    # الإبقاء على updated_at كما هو، فهذه ليست تعديلاً من المستخدم
+    db.session.execute(
+        update(table).where(table.c.customer_id == bindparam('row_id')).values(
+            updated_at=table.c.updated_at, **values
+        ),
+        rows
+    )
+
+
+def add_sales_to_customer_stats(records):
+    totals = defaultdict(lambda: {'spend': 0, 'count': 0, 'last': None})
+    for record in records:
+        if record.customer_id is None:
+            continue
+        entry = totals[record.customer_id]
+        entry['spend'] += record.total_amount
+        entry['count'] += 1
+        if entry['last'] is None or record.sale_date > entry['last']:
+            entry['last'] = record.sale_date
+    
+    table = Customer.__table__
+    last_purchase_at = bindparam('last_purchase_at', type_=table.c.last_purchase_at.type)
+    _update_customers({
+        'lifetime_spend': func.coalesce(table.c.lifetime_spend, 0) + bindparam('spend'),
+        'purchase_count': func.coalesce(table.c.purchase_count, 0) + bindparam('count'),
+        'last_purchase_at': case(
+            (table.c.last_purchase_at > last_purchase_at, table.c.last_purchase_at),
+            else_=last_purchase_at
+        )
+    }, [
+        {'row_id': customer_id, 'spend': entry['spend'], 'count': entry['count'],
+         'last_purchase_at': entry['last']}
+        for customer_id, entry in sorted(totals.items())
+    ])
+
+
+def add_returns_to_customer_stats(records):
+    refunds = defaultdict(int)
+    for record in records:
+        if record.customer_id is not None:
+            refunds[record.customer_id] += record.amount
+    
+    table = Customer.__table__
+    _update_customers({
+        'lifetime_spend': func.coalesce(table.c.lifetime_spend, 0) - bindparam('refund')
+    }, [
+        {'row_id': customer_id, 'refund': refund}
+        for customer_id, refund in sorted(refunds.items())
+    ])
+
+
+def reconcile_customer_stats():
+    """إعادة حساب قيم العملاء المشتقة من جداول المبيعات والمرتجعات"""
+    customer_id = Customer.__table__.c.customer_id
+    spend = select(func.coalesce(func.sum(Sale.total_amount), 0)).where(
+        Sale.customer_id == customer_id
+    ).scalar_subquery()
+    refunds = select(
+        func.coalesce(func.sum(Return.quantity * SaleItem.unit_price), 0)
+    ).select_from(Return).join(
+        SaleItem, Return.sale_item_id == SaleItem.sale_item_id
+    ).join(
+        Sale, SaleItem.sale_id == Sale.sale_id
+    ).where(Sale.customer_id == customer_id).scalar_subquery()
+    count = select(func.count(Sale.sale_id)).where(
+        Sale.customer_id == customer_id
+    ).scalar_subquery()
+    last_purchase_at = select(func.max(Sale.sale_date)).where(
+        Sale.customer_id == customer_id
+    ).scalar_subquery()
+    
+    table = Customer.__table__
+    result = db.session.execute(update(table).values(
+        lifetime_spend=spend - refunds,
+        purchase_count=count,
+        last_purchase_at=last_purchase_at,
+        updated_at=table.c.updated_at
+    ))
+    db.session.commit()
+    return result.rowcount
+
+
+def ensure_customer_stats():
+    """حساب القيم للعملاء الموجودين قبل إضافة الأعمدة"""
+    missing = db.session.query(
+        Customer.query.filter(Customer.lifetime_spend.is_(None)).exists()
+    ).scalar()
+    if missing:
+        reconcile_customer_stats()
@@ -0,0 +1,56 @@
+from datetime import timedelta
+import numpy as np
+from sqlalchemy import select
+from src.models.database import db, Product, SalesDailyProductRollup
+
+# تحميل صافي المبيعات اليومية (بعد المرتجعات) كمصفوفة كثيفة منتج × يوم من جدول
+# الملخص اليومي، لتحسب نماذج الطلب لكل المنتجات بعمليات NumPy على المصفوفة كاملة
+
+
+def load_products(columns, min_product_id=None, limit=None):
+    """أعمدة المنتجات مرتبة بـ product_id كمصفوفات، وأول عمود دائماً product_id"""
+    query = select(Product.product_id, *columns).order_by(Product.product_id)
+    if min_product_id is not None:
+        query = query.where(Product.product_id >= min_product_id)
+    if limit is not None:
+        query = query.limit(limit)
+    rows = db.session.execute(query).all()
+    return [np.array(values) for values in zip(*rows)] if rows else None
+
+
+def daily_matrix(product_ids, start_day, days, values='units'):
+    """مصفوفة (عدد المنتجات × days) لصافي الوحدات أو الإيرادات من start_day"""
+    # product_ids مصفوفة مرتبة تصاعدياً، ويقرأ نطاقها فقط حتى يمكن التحميل على دفعات
+    matrix = np.zeros((len(product_ids), days), dtype=np.float64)
+    if not len(product_ids):
+        return matrix
+    
+    rollup = SalesDailyProductRollup
+    if values == 'revenue':
+        net = rollup.revenue - rollup.returns_amount
+    else:
+        net = rollup.units - rollup.returned_units
+    
+    rows = db.session.execute(
+        select(rollup.product_id, rollup.day, net).where(
+            rollup.day >= start_day,
+            rollup.day < start_day + timedelta(days=days),
+            rollup.product_id >= int(product_ids[0]),
+            rollup.product_id <= int(product_ids[-1])
+        )
+    ).all()
+    if not rows:
+        return matrix
+    
+    row_ids, row_days, row_values = zip(*rows)
+    positions = np.searchsorted(product_ids, np.array(row_ids))
+    offsets = np.array([(day - start_day).days for day in row_days])
+    found = product_ids[np.minimum(positions, len(product_ids) - 1)] == np.array(row_ids)
+    matrix[positions[found], offsets[found]] = np.array(row_values, dtype=np.float64)[found]
+    return matrix
+
+
+def smoothing_weights(days, alpha):
+    """أوزان التنعيم الأسي لآخر days يوماً (الأقدم أولاً)، مجموعها 1"""
+    weights = alpha * (1 - alpha) ** np.arange(days - 1, -1, -1, dtype=np.float64)
+    return weights / weights.sum()
@@ -0,0 +1,154 @@
+from datetime import datetime, timedelta
+import numpy as np
+from flask import current_app
+from sqlalchemy import event, func, insert, delete, select
+from src.models.database import (
+    db, Product, Category, SalesDailyProductRollup, ProductForecast, CategoryForecast
+)
+from src.services.demand import load_products, daily_matrix, smoothing_weights
+
+# توقع مبيعات الأيام القادمة لكل المنتجات بنموذج موسمية أسبوعية مع تنعيم أسي:
+#   معامل اليوم = متوسط مبيعات يوم الأسبوع ÷ المتوسط العام (مع تقليص نحو 1 للمنتجات قليلة البيانات)
+#   المستوى = متوسط أسي للمبيعات بعد إزالة الموسمية
+#   التوقع = المستوى × مجموع معاملات أيام الأسبوع في فترة التوقع
+# تحسب المنتجات على دفعات من مصفوفة كثيفة (منتج × يوم) فلا تتجاوز الذاكرة حجم الدفعة
+
+# معامل التنعيم الأسي للمستوى
+SMOOTHING_ALPHA = 0.1
+
+# عدد الأيام الافتراضية التي يقلص بها معامل كل يوم نحو 1
+SEASONAL_PRIOR_DAYS = 4
+
+
+def weekday_columns(start_day, days):
+    """رقم يوم الأسبوع (0 = الاثنين) لكل عمود من start_day"""
+    return (start_day.weekday() + np.arange(days)) % 7
+
+
+def forecast_matrix(history, start_day, horizon_days, alpha=SMOOTHING_ALPHA):
+    """المستوى اليومي وتوقع الوحدات لكل صف من مصفوفة التاريخ"""
+    days = history.shape[1]
+    weekdays = weekday_columns(start_day, days)
+    
+    # مجموع المبيعات وعدد الأيام لكل يوم أسبوع: (منتج × 7)
+    weekday_onehot = np.eye(7)[weekdays]
+    weekday_sums = history @ weekday_onehot
+    weekday_counts = weekday_onehot.sum(axis=0)
+    
+    mean = history.mean(axis=1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        relative = np.where(mean > 0, weekday_sums / mean, weekday_counts)
+    seasonal = (relative + SEASONAL_PRIOR_DAYS) / (weekday_counts + SEASONAL_PRIOR_DAYS)
+    
+    level = (history / seasonal[:, weekdays]) @ smoothing_weights(days, alpha)
+    level = np.maximum(level, 0)
+    
+    future = weekday_columns(start_day + timedelta(days=days), horizon_days)
+    units = level * seasonal[:, future].sum(axis=1)
+    return level, units
+
+
+def _unit_prices(product_ids, list_prices, since):
+    """متوسط سعر الوحدة الفعلي من الملخص اليومي، أو سعر المنتج إذا لم تكن له مبيعات"""
+    rollup = SalesDailyProductRollup
+    rows = db.session.execute(
+        select(
+            rollup.product_id,
+            func.sum(rollup.revenue - rollup.returns_amount),
+            func.sum(rollup.units - rollup.returned_units)
+        ).where(
+            rollup.day >= since,
+            rollup.product_id >= int(product_ids[0]),
+            rollup.product_id <= int(product_ids[-1])
+        ).group_by(rollup.product_id)
+    ).all()
+    prices = list_prices.astype(np.float64)
+    positions = {int(product_id): index for index, product_id in enumerate(product_ids)}
+    for product_id, revenue, units in rows:
+        if units and units > 0 and product_id in positions:
+            prices[positions[product_id]] = float(revenue) / units
+    return prices
+
+
+def refresh_forecasts():
+    """إعادة حساب توقعات المنتجات والفئات، ويرجع عدد المنتجات"""
+    config = current_app.config
+    history_days = config.get('FORECAST_HISTORY_DAYS', 728)
+    horizon_days = config.get('FORECAST_HORIZON_DAYS', 30)
+    chunk_size = config.get('FORECAST_CHUNK_SIZE', 5000)
+    
+    start_day = datetime.utcnow().date() - timedelta(days=history_days)
+    computed_at = datetime.utcnow()
+    
+    db.session.execute(delete(ProductForecast.__table__))
+    db.session.execute(delete(CategoryForecast.__table__))
+    
+    categories = {}
+    count = 0
+    next_id = None
+    while True:
+        products = load_products(
+            [func.coalesce(Product.category_id, 0), Product.price],
+            min_product_id=next_id, limit=chunk_size
+        )
+        if products is None:
+            break
+        product_ids, category_ids, list_prices = products
+        next_id = int(product_ids[-1]) + 1
+        
+        history = daily_matrix(product_ids, start_day, history_days)
+        level, units = forecast_matrix(history, start_day, horizon_days)
+        revenue = units * _unit_prices(product_ids, list_prices, start_day)
+        
+        # تجميع توقعات الفئات في الدفعة دون حلقة على المنتجات
+        chunk_categories, inverse = np.unique(category_ids, return_inverse=True)
+        category_units = np.bincount(inverse, weights=units)
+        category_revenue = np.bincount(inverse, weights=revenue)
+        category_counts = np.bincount(inverse)
+        for index, category_id in enumerate(chunk_categories.tolist()):
+            totals = categories.setdefault(category_id, [0.0, 0.0, 0])
+            totals[0] += category_units[index]
+            totals[1] += category_revenue[index]
+            totals[2] += int(category_counts[index])
+        
+        db.session.execute(insert(ProductForecast.__table__), [{
+            'product_id': product_id,
+            'category_id': category_id or None,
+            'daily_level': round(product_level, 4),
+            'units_forecast': round(product_units, 2),
+            'revenue_forecast': round(product_revenue, 2),
+            'horizon_days': horizon_days,
+            'computed_at': computed_at
+        } for product_id, category_id, product_level, product_units, product_revenue in zip(
+            product_ids.tolist(), category_ids.tolist(), level.tolist(), units.tolist(), revenue.tolist()
+        )])
+        count += len(product_ids)
+    
+    # المنتجات بلا فئة تدخل في الإجمالي فقط
+    categories.pop(0, None)
+    if categories:
+        db.session.execute(insert(CategoryForecast.__table__), [{
+            'category_id': category_id,
+            'units_forecast': round(float(totals[0]), 2),
+            'revenue_forecast': round(float(totals[1]), 2),
+            'products_count': totals[2],
+            'horizon_days': horizon_days,
+            'computed_at': computed_at
+        } for category_id, totals in categories.items()])
+    
+    db.session.commit()
+    return count
+
+
+@event.listens_for(Product, 'before_delete')
+def _product_deleted(mapper, connection, target):
+    connection.execute(delete(ProductForecast.__table__).where(
+        ProductForecast.__table__.c.product_id == target.product_id
+    ))
+
+
+@event.listens_for(Category, 'before_delete')
+def _category_deleted(mapper, connection, target):
+    connection.execute(delete(CategoryForecast.__table__).where(
+        CategoryForecast.__table__.c.category_id == target.category_id
+    ))
@@ -0,0 +1,128 @@
+import hashlib
+import time
+from datetime import datetime, timedelta
+from functools import wraps
+from flask import request, jsonify, make_response, current_app
+from sqlalchemy import and_, or_, update, delete
+from sqlalchemy.exc import IntegrityError
+from src.models.database import db, IdempotencyKey
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+
+_last_sweep = {'at': 0.0}
+
+
+def _request_hash():
+    digest = hashlib.sha256()
+    digest.update(request.method.encode('utf-8'))
+    digest.update(request.path.encode('utf-8'))
+    digest.update(request.get_data())
+    return digest.hexdigest()
+
+
+def sweep_expired_keys():
+    """حذف مفاتيح Idempotency المنتهية، ويرجع عدد المحذوف"""
+    deleted = IdempotencyKey.query.filter(
+        IdempotencyKey.expires_at <= datetime.utcnow()
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
+
+
+def _maybe_sweep():
+    interval = current_app.config.get('IDEMPOTENCY_SWEEP_INTERVAL', 600)
+    now = time.monotonic()
+    if now - _last_sweep['at'] >= interval:
+        _last_sweep['at'] = now
+        sweep_expired_keys()
+
+
+def _take_over(key, now, lease):
+    """حجز مفتاح لم يسجل طلبه نتيجة بعد انتهاء مهلته، ويرجع True إذا نجح الحجز"""
+    # تحديث شرطي حتى لا تحجز إعادتا محاولة متزامنتان نفس المفتاح
+    table = IdempotencyKey.__table__
+    result = db.session.execute(update(table).where(
+        table.c.key == key,
+        table.c.status_code.is_(None),
+        or_(table.c.locked_until.is_(None), table.c.locked_until <= now)
+    ).values(locked_until=lease))
+    db.session.commit()
+    return result.rowcount == 1
+
+
+def _store_response(key, lease, response):
+    """تسجيل نتيجة الطلب ما دام المفتاح محجوزاً لهذا الطلب"""
+    table = IdempotencyKey.__table__
+    owned = and_(table.c.key == key, table.c.locked_until == lease)
+    if response.status_code >= 500:
+        # أخطاء الخادم لا تخزن حتى يمكن إعادة المحاولة بنفس المفتاح
+        statement = delete(table).where(owned)
+    else:
+        statement = update(table).where(owned).values(
+            status_code=response.status_code,
+            response_body=response.get_data(as_text=True)
+        )
+    db.session.execute(statement)
+    db.session.commit()
+
+
+def idempotent(view):
+    """إعادة الاستجابة المخزنة عند تكرار الطلب بنفس ترويسة Idempotency-Key بدلاً من تنفيذه مرة أخرى"""
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return view(*args, **kwargs)
+        if len(key) > 255:
+            return jsonify({'error': 'مفتاح Idempotency-Key طويل جداً'}), 400
+        
+        request_hash = _request_hash()
+        now = datetime.utcnow()
+        
+        record = db.session.get(IdempotencyKey, key)
+        if record and record.expires_at <= now:
+            db.session.delete(record)
+            db.session.commit()
+            record = None
+        
+        lease = now + timedelta(seconds=current_app.config.get('IDEMPOTENCY_LOCK_TIMEOUT', 60))
+        
+        if record:
+            if record.endpoint != request.endpoint or record.request_hash != request_hash:
+                return jsonify({'error': 'تم استخدام مفتاح Idempotency-Key مع طلب مختلف'}), 422
+            if record.status_code is not None:
+                response = current_app.response_class(
+                    record.response_body,
+                    status=record.status_code,
+                    mimetype='application/json'
+                )
+                response.headers['Idempotent-Replayed'] = 'true'
+                return response
+            # لا نتيجة بعد: الطلب الأصلي قيد التنفيذ، أو توقف العامل قبل تسجيلها
+            # فيعاد تنفيذه بعد انتهاء المهلة
+            if not _take_over(key, now, lease):
+                return jsonify({'error': 'الطلب الأصلي بنفس المفتاح ما زال قيد التنفيذ'}), 409
+        else:
+            # حجز المفتاح قبل التنفيذ حتى لا ينفذ طلبان متزامنان بنفس المفتاح
+            ttl = current_app.config.get('IDEMPOTENCY_KEY_TTL', 24 * 3600)
+            db.session.add(IdempotencyKey(
+                key=key,
+                endpoint=request.endpoint,
+                request_hash=request_hash,
+                locked_until=lease,
+                expires_at=now + timedelta(seconds=ttl)
+            ))
+            try:
+                db.session.commit()
+            except IntegrityError:
+                db.session.rollback()
+                return jsonify({'error': 'الطلب الأصلي بنفس المفتاح ما زال قيد التنفيذ'}), 409
+        
+        response = make_response(view(*args, **kwargs))
+        _store_response(key, lease, response)
+        
+        _maybe_sweep()
+        return response
+
+    return wrapper
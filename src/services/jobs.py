@@ -0,0 +1,211 @@
+import json
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import update, func
+from src.models.database import db, Job
+
+# مهام خلفية محفوظة في جدول jobs وتنفذ في مجموعة خيوط داخل كل عملية،
+# حتى لا تحجز التقارير الطويلة عامل gunicorn المخصص لطلبات نقطة البيع.
+# تحجز المهمة بتحديث شرطي (queued -> running) فلا تنفذها عمليتان معاً.
+#
+# خيط مراقبة في كل عملية يحدث heartbeat_at للمهام التي تنفذها كل JOB_HEARTBEAT_INTERVAL ثانية،
+# ويعيد إلى الانتظار أي مهمة قيد التنفيذ انقطعت نبضتها أكثر من JOB_STALE_AFTER ثانية
+# (توقفت عمليتها) ويرسلها للتنفيذ، فتستأنف المهمة دون انتظار إعادة تشغيل أخرى.
+# وقت بدء التنفيذ started_at يميز كل حجز، فلا يسجل التنفيذ القديم نتيجته بعد إعادة الحجز.
+
+JOB_HANDLERS = {}
+
+_runtime = {
+    'app': None,
+    'executor': None,
+    'lock': threading.Lock(),
+    # المهام المرسلة لمجموعة خيوط هذه العملية، والمهام قيد التنفيذ فيها مع وقت حجزها
+    'submitted': set(),
+    'running': {},
+    'monitor': None
+}
+
+logger = logging.getLogger(__name__)
+
+
+def register_job(job_type):
+    """تسجيل دالة تنفذ نوع مهمة وتستقبل params وترجع نتيجة قابلة للتحويل إلى JSON"""
+    def decorator(handler):
+        JOB_HANDLERS[job_type] = handler
+        return handler
+    return decorator
+
+
+def init_jobs(app):
+    """تشغيل مجموعة الخيوط وخيط المراقبة واستئناف المهام غير المكتملة"""
+    _runtime['app'] = app
+    _runtime['executor'] = ThreadPoolExecutor(
+        max_workers=app.config.get('JOB_WORKERS', 2),
+        thread_name_prefix='jobs'
+    )
+    resume_pending_jobs()
+    
+    if _runtime['monitor'] is None:
+        _runtime['monitor'] = threading.Thread(target=_monitor, name='jobs-monitor', daemon=True)
+        _runtime['monitor'].start()
+
+
+def enqueue_job(job_type, params):
+    """حفظ مهمة جديدة وإرسالها للتنفيذ، ويرجع كائن المهمة"""
+    if job_type not in JOB_HANDLERS:
+        raise ValueError(f'نوع المهمة غير معروف: {job_type}')
+    
+    job = Job(
+        job_id=uuid.uuid4().hex,
+        job_type=job_type,
+        params=json.dumps(params or {}, ensure_ascii=False),
+        status='queued'
+    )
+    db.session.add(job)
+    db.session.commit()
+    
+    _submit(job.job_id)
+    return job
+
+
+def enqueue_job_once(job_type, params):
+    """إرسال مهمة ما لم تكن مهمة من نفس النوع منتظرة أو قيد التنفيذ، ويرجع كائن المهمة"""
+    pending = Job.query.filter(
+        Job.job_type == job_type, Job.status.in_(('queued', 'running'))
+    ).order_by(Job.created_at).first()
+    return pending or enqueue_job(job_type, params)
+
+
+def _submit(job_id):
+    if _runtime['executor'] is None:
+        return
+    with _runtime['lock']:
+        if job_id in _runtime['submitted']:
+            return
+        _runtime['submitted'].add(job_id)
+    _runtime['executor'].submit(_run_job, job_id)
+
+
+def _monitor():
+    app = _runtime['app']
+    interval = app.config.get('JOB_HEARTBEAT_INTERVAL', 15)
+    while True:
+        time.sleep(interval)
+        with app.app_context():
+            try:
+                send_heartbeats()
+                recover_stale_jobs()
+            except Exception:
+                db.session.rollback()
+                logger.exception('تعذر فحص المهام الخلفية')
+
+
+def send_heartbeats():
+    """تحديث نبضة المهام قيد التنفيذ في هذه العملية"""
+    with _runtime['lock']:
+        running = list(_runtime['running'].items())
+    if not running:
+        return
+    now = datetime.utcnow()
+    for job_id, started_at in running:
+        db.session.execute(
+            update(Job)
+            .where(Job.job_id == job_id, Job.status == 'running', Job.started_at == started_at)
+            .values(heartbeat_at=now)
+        )
+    db.session.commit()
+
+
+def recover_stale_jobs():
+    """إعادة المهام المتوقفة (بلا نبضة حديثة) إلى الانتظار وإرسالها، ويرجع عددها"""
+    app = _runtime['app']
+    stale_before = datetime.utcnow() - timedelta(seconds=app.config.get('JOB_STALE_AFTER', 60))
+    
+    stale = db.session.query(Job.job_id, Job.started_at).filter(
+        Job.status == 'running',
+        func.coalesce(Job.heartbeat_at, Job.started_at) < stale_before
+    ).all()
+    recovered = []
+    for job_id, started_at in stale:
+        # شرط وقت الحجز حتى لا تعاد مهمة حجزتها عملية أخرى بعد قراءتها
+        if db.session.execute(
+            update(Job)
+            .where(Job.job_id == job_id, Job.status == 'running', Job.started_at == started_at)
+            .values(status='queued', started_at=None, heartbeat_at=None)
+        ).rowcount:
+            recovered.append(job_id)
+    
+    # مهام منتظرة منذ مدة أرسلتها عملية توقفت قبل تنفيذها
+    orphaned = db.session.query(Job.job_id).filter(
+        Job.status == 'queued', Job.created_at < stale_before
+    ).all()
+    db.session.commit()
+    
+    for job_id in recovered + [job_id for (job_id,) in orphaned]:
+        _submit(job_id)
+    return len(recovered)
+
+
+def resume_pending_jobs():
+    """إعادة المهام المتوقفة إلى الانتظار وإرسال كل المهام المنتظرة للتنفيذ"""
+    recover_stale_jobs()
+    for (job_id,) in db.session.query(Job.job_id).filter(Job.status == 'queued').order_by(Job.created_at):
+        _submit(job_id)
+
+
+def _run_job(job_id):
+    try:
+        with _runtime['app'].app_context():
+            _execute_job(job_id)
+    finally:
+        with _runtime['lock']:
+            _runtime['submitted'].discard(job_id)
+            _runtime['running'].pop(job_id, None)
+
+
+def _execute_job(job_id):
+    started_at = datetime.utcnow()
+    claimed = db.session.execute(
+        update(Job)
+        .where(Job.job_id == job_id, Job.status == 'queued')
+        .values(status='running', started_at=started_at, heartbeat_at=started_at)
+    ).rowcount
+    db.session.commit()
+    if not claimed:
+        return
+    with _runtime['lock']:
+        _runtime['running'][job_id] = started_at
+    
+    job = db.session.get(Job, job_id)
+    try:
+        result = JOB_HANDLERS[job.job_type](json.loads(job.params or '{}'))
+        values = {'status': 'completed', 'result': json.dumps(result, ensure_ascii=False)}
+    except Exception as e:
+        db.session.rollback()
+        values = {'status': 'failed', 'error': str(e)}
+    
+    # تسجيل النتيجة فقط إذا بقي الحجز لهذا التنفيذ
+    db.session.execute(
+        update(Job)
+        .where(Job.job_id == job_id, Job.status == 'running', Job.started_at == started_at)
+        .values(finished_at=datetime.utcnow(), **values)
+    )
+    db.session.commit()
+
+
+def serialize_job(job):
+    return {
+        'job_id': job.job_id,
+        'job_type': job.job_type,
+        'status': job.status,
+        'params': json.loads(job.params) if job.params else None,
+        'result': json.loads(job.result) if job.result else None,
+        'error': job.error,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None
+    }
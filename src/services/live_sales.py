@@ -0,0 +1,247 @@
+import json
+import logging
+import queue
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from decimal import Decimal
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from src.models.database import db, Product, SalesDailyRollup, SalesDailyProductRollup
+
+# بث مباشر لإجماليات مبيعات اليوم عبر Server-Sent Events.
+# تحتفظ كل عملية بحالة واحدة في الذاكرة وتوزع التحديثات على جميع المشتركين،
+# فلا يكلف المشترك الإضافي أي استعلام. ويعاد تحميل الحالة من جدول الملخص كل
+# LIVE_SALES_RESYNC_INTERVAL ثانية (استعلام واحد للعملية) لالتقاط مبيعات عمال gunicorn الآخرين.
+#
+# بعد commit البيع أو الإرجاع يضيف الخطاف السجلات إلى قائمة انتظار في الذاكرة وينبه
+# المشتركين فقط، دون أي استعلام، فلا يؤخر البيع ولا يفشله. يطبق أول مولد بث يستيقظ
+# القائمة على الحالة (مع ما يلزم من تحميل) ويبث التحديث للجميع من خيط البث.
+#
+# كل اتصال بث مفتوح يشغل خيطاً من خيوط عامل gthread طوال مدته، فعدد المشتركين
+# محدود لكل عملية (LIVE_SALES_MAX_SUBSCRIBERS) حتى تبقى بقية الخيوط لطلبات نقاط البيع.
+
+LIVE_SALES_RESYNC_INTERVAL = 30
+
+# أقصى عدد معاملات تنتظر التطبيق، وبعده تعاد الحالة من الملخص بدلاً من تطبيقها
+LIVE_SALES_PENDING_LIMIT = 1000
+
+# رسالة داخلية توقظ مولد البث لتطبيق المعاملات المنتظرة، ولا ترسل للعميل
+WAKE = object()
+
+_PENDING_KEY = 'live_sales_pending'
+
+logger = logging.getLogger(__name__)
+
+
+def format_sse(event_name, data):
+    return f'event: {event_name}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n'
+
+
+class LiveSalesFeed:
+    """حالة مبيعات اليوم في الذاكرة مع توزيعها على المشتركين"""
+
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        # _lock يحمي الحالة ويمسك أثناء تحميلها، و_subscribers_lock يحمي المشتركين
+        # والمعاملات المنتظرة ولا يمسك أثناء أي استعلام لأن خطاف commit يأخذه
+        self._lock = threading.Lock()
+        self._subscribers_lock = threading.Lock()
+        self._subscribers = set()
+        self._pending = []
+        self._invalid = False
+        self._day = None
+        self._loaded_at = 0.0
+        self._total_sales = Decimal('0')
+        self._total_returns = Decimal('0')
+        self._transactions = 0
+        self._units = Counter()
+        self._names = {}
+
+    def subscribe(self, limit=None):
+        """إضافة مشترك جديد، أو None إذا بلغ عدد المشتركين الحد limit"""
+        subscriber = queue.Queue(maxsize=self.queue_size)
+        with self._subscribers_lock:
+            if limit is not None and len(self._subscribers) >= limit:
+                return None
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._subscribers_lock:
+            self._subscribers.discard(subscriber)
+
+    def _load(self, connection, day):
+        # وقت بدء التحميل: المعاملات المثبتة قبله متضمنة في الحالة المحملة
+        loaded_at = time.monotonic()
+        rollup = connection.execute(
+            select(SalesDailyRollup).where(SalesDailyRollup.day == day)
+        ).first()
+        rows = connection.execute(
+            select(SalesDailyProductRollup.product_id, SalesDailyProductRollup.units, Product.name)
+            .join(Product, SalesDailyProductRollup.product_id == Product.product_id)
+            .where(SalesDailyProductRollup.day == day)
+        ).all()
+        
+        self._day = day
+        self._loaded_at = loaded_at
+        self._total_sales = Decimal(rollup.revenue) if rollup else Decimal('0')
+        self._total_returns = Decimal(rollup.returns_amount) if rollup else Decimal('0')
+        self._transactions = rollup.transactions if rollup else 0
+        self._units = Counter({row.product_id: row.units for row in rows})
+        self._names.update({row.product_id: row.name for row in rows})
+
+    def _ensure_loaded(self, force=False):
+        today = datetime.utcnow().date()
+        stale = time.monotonic() - self._loaded_at >= LIVE_SALES_RESYNC_INTERVAL
+        with self._subscribers_lock:
+            invalid, self._invalid = self._invalid, False
+        if force or invalid or self._day != today or stale:
+            with db.engine.connect() as connection:
+                self._load(connection, today)
+            return True
+        return False
+
+    def _top_products(self):
+        return [
+            {'product_id': product_id, 'name': self._names.get(product_id), 'quantity': units}
+            for product_id, units in self._units.most_common(5)
+        ]
+
+    def _snapshot(self):
+        return {
+            'date': self._day.isoformat(),
+            'total_sales': float(self._total_sales),
+            'total_returns': float(self._total_returns),
+            'total_transactions': self._transactions,
+            'top_products': self._top_products()
+        }
+
+    def snapshot(self):
+        with self._lock:
+            self._ensure_loaded()
+            return self._snapshot()
+
+    def resync(self):
+        """إعادة التحميل الدوري من الملخص وبث لقطة جديدة عند الحاجة"""
+        with self._lock:
+            if not self._subscribers or not self._ensure_loaded():
+                return
+            self._broadcast(format_sse('snapshot', self._snapshot()))
+
+    def _broadcast(self, message):
+        with self._subscribers_lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(message)
+            except queue.Full:
+                # مشترك بطيء لا يقرأ، نتجاوز التحديث له وسيصله في اللقطة التالية
+                pass
+
+    def publish(self, sales, returns):
+        """إضافة فواتير ومرتجعات مثبتة إلى قائمة الانتظار وتنبيه المشتركين، دون استعلامات"""
+        with self._subscribers_lock:
+            if not self._subscribers:
+                # لا يوجد مشتركون: تحمل الحالة من جديد عند أول اشتراك
+                self._invalid = True
+                return
+            if len(self._pending) >= LIVE_SALES_PENDING_LIMIT:
+                self._pending = []
+                self._invalid = True
+            else:
+                self._pending.append((time.monotonic(), sales, returns))
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(WAKE)
+            except queue.Full:
+                pass
+
+    def apply_pending(self):
+        """تطبيق المعاملات المنتظرة على حالة اليوم وبث الفرق، ويستدعى من خيط البث"""
+        with self._lock:
+            with self._subscribers_lock:
+                pending, self._pending = self._pending, []
+                invalid = self._invalid
+            reloaded = self._ensure_loaded()
+            if invalid:
+                self._broadcast(format_sse('snapshot', self._snapshot()))
+                return
+            
+            sales_delta = Decimal('0')
+            returns_delta = Decimal('0')
+            transactions_delta = 0
+            product_deltas = Counter()
+            for committed_at, sales, returns in pending:
+                # المعاملات المثبتة قبل آخر تحميل متضمنة في الحالة المحملة
+                if committed_at <= self._loaded_at:
+                    continue
+                for record in sales:
+                    if record.sale_date.date() != self._day:
+                        continue
+                    sales_delta += Decimal(record.total_amount)
+                    transactions_delta += 1
+                    for line in record.lines:
+                        product_deltas[line['product_id']] += line['quantity']
+                for record in returns:
+                    if record.sale_date.date() == self._day:
+                        returns_delta += Decimal(record.amount)
+            
+            if not (transactions_delta or returns_delta):
+                if reloaded:
+                    self._broadcast(format_sse('snapshot', self._snapshot()))
+                return
+            
+            self._total_sales += sales_delta
+            self._total_returns += returns_delta
+            self._transactions += transactions_delta
+            self._units.update(product_deltas)
+            
+            unknown = [product_id for product_id in product_deltas if product_id not in self._names]
+            if unknown:
+                with db.engine.connect() as connection:
+                    self._names.update(connection.execute(
+                        select(Product.product_id, Product.name).where(Product.product_id.in_(unknown))
+                    ).all())
+            
+            self._broadcast(format_sse('update', {
+                **self._snapshot(),
+                'delta': {
+                    'total_sales': float(sales_delta),
+                    'total_returns': float(returns_delta),
+                    'total_transactions': transactions_delta,
+                    'products': [
+                        {'product_id': product_id, 'name': self._names.get(product_id), 'quantity': units}
+                        for product_id, units in product_deltas.most_common(5)
+                    ]
+                }
+            }))
+
+
+live_sales_feed = LiveSalesFeed()
+
+
+def queue_live_update(sales=(), returns=()):
+    """تأجيل بث الفواتير والمرتجعات حتى نجاح commit المعاملة الحالية"""
+    pending = db.session.info.setdefault(_PENDING_KEY, ([], []))
+    pending[0].extend(sales)
+    pending[1].extend(returns)
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish_after_commit(session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending:
+        return
+    # البيع مثبت مسبقاً، فأي خطأ في البث يسجل ولا يصل إلى commit
+    try:
+        live_sales_feed.publish(*pending)
+    except Exception:
+        logger.exception('تعذر نشر تحديث البث المباشر')
+
+
+@event.listens_for(Session, 'after_rollback')
+def _reset_after_rollback(session):
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,69 @@
+import os
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from src.models.database import Product
+from src.utils.lru import LRUCache
+
+# ذاكرة مؤقتة لنتائج مسح الباركود/الرقم التسلسلي في نقطة البيع.
+# الذاكرة لكل عملية، فتنتهي كل قيمة بعد SERIAL_CACHE_TTL ثانية حتى لا يبقى السعر أو الكمية
+# قديمين لدى عمال gunicorn الآخرين أكثر من ذلك. وبعد commit في نفس العملية تحذف فقط
+# المنتجات التي تغيرت، سواء عبر كائنات ORM أو عبر UPDATE جماعي يمرر معرفاتها بخيار
+# التنفيذ PRODUCT_IDS_OPTION (مثل خصم المخزون). أي UPDATE/DELETE آخر على المنتجات يفرغ الذاكرة.
+
+SERIAL_CACHE_TTL = float(os.environ.get('SERIAL_CACHE_TTL', 5))
+
+serial_cache = LRUCache(maxsize=2048, ttl=SERIAL_CACHE_TTL)
+
+# خيار تنفيذ لجمل UPDATE على المنتجات: معرفات المنتجات التي تغيرها الجملة
+PRODUCT_IDS_OPTION = 'changed_product_ids'
+
+_CHANGED_KEY = 'products_changed'
+
+# علامة تغيير منتجات غير معروفة
+_ALL = None
+
+
+def _mark_changed(session, product_ids):
+    changed = session.info.get(_CHANGED_KEY, set())
+    if changed is _ALL or product_ids is _ALL:
+        session.info[_CHANGED_KEY] = _ALL
+    else:
+        session.info[_CHANGED_KEY] = changed | set(product_ids)
+
+
+@event.listens_for(Session, 'after_flush')
+def _track_flushed_products(session, flush_context):
+    product_ids = {
+        instance.product_id
+        for instance in (*session.dirty, *session.deleted)
+        if isinstance(instance, Product)
+    }
+    if product_ids:
+        _mark_changed(session, product_ids)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _track_bulk_product_writes(orm_execute_state):
+    if orm_execute_state.is_update or orm_execute_state.is_delete:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None and mapper.class_ is Product:
+            _mark_changed(
+                orm_execute_state.session,
+                orm_execute_state.execution_options.get(PRODUCT_IDS_OPTION, _ALL)
+            )
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_after_commit(session):
+    if _CHANGED_KEY not in session.info:
+        return
+    changed = session.info.pop(_CHANGED_KEY)
+    if changed is _ALL:
+        serial_cache.clear()
+    else:
+        serial_cache.discard_where(lambda product: product['product_id'] in changed)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _reset_after_rollback(session):
+    session.info.pop(_CHANGED_KEY, None)
@@ -0,0 +1,131 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import event, func, case, select, update, insert, delete, bindparam
+from src.models.database import (
+    db, Product, SalesDailyProductRollup, ProductSalesStats
+)
+from src.models.upsert import upsert_increments
+
+# عدادات المبيعات لكل منتج (7/30/90 يوماً ومنذ البداية).
+# تزداد مع كل بيع وتنقص مع كل إرجاع في نفس المعاملة، ومرة يومياً تعاد النوافذ
+# الزمنية من جدول الملخص اليومي لإخراج الأيام التي خرجت من النافذة.
+
+WINDOWS = (7, 30, 90)
+STATS_FIELDS = tuple(
+    f'{metric}_{window}d' for window in WINDOWS for metric in ('units', 'revenue')
+) + ('units_total', 'revenue_total')
+
+
+def _increments(entries):
+    """entries: (sale_day, product_id, units, revenue) ويرجع صفوف الزيادة لكل منتج"""
+    today = datetime.utcnow().date()
+    rows = defaultdict(lambda: {field: 0 for field in STATS_FIELDS})
+    for sale_day, product_id, units, revenue in entries:
+        row = rows[product_id]
+        age = (today - sale_day).days
+        for window in WINDOWS:
+            if age < window:
+                row[f'units_{window}d'] += units
+                row[f'revenue_{window}d'] += revenue
+        row['units_total'] += units
+        row['revenue_total'] += revenue
+    return [{'product_id': product_id, **row} for product_id, row in rows.items()]
+
+
+def add_sales_to_product_stats(records):
+    upsert_increments(ProductSalesStats, ['product_id'], STATS_FIELDS, _increments(
+        (record.sale_date.date(), line['product_id'], line['quantity'], line['total_price'])
+        for record in records
+        for line in record.lines
+    ))
+
+
+def add_returns_to_product_stats(records):
+    upsert_increments(ProductSalesStats, ['product_id'], STATS_FIELDS, _increments(
+        (record.sale_date.date(), record.product_id, -record.quantity, -record.amount)
+        for record in records
+    ))
+
+
+@event.listens_for(Product, 'after_insert')
+def _product_inserted(mapper, connection, target):
+    # صف بعدادات صفرية لكل منتج جديد حتى يظهر في قائمة الأقل مبيعاً
+    connection.execute(insert(ProductSalesStats.__table__).values(product_id=target.product_id))
+
+
+@event.listens_for(Product, 'before_delete')
+def _product_deleted(mapper, connection, target):
+    table = ProductSalesStats.__table__
+    connection.execute(delete(table).where(table.c.product_id == target.product_id))
+
+
+def _window_sums(since):
+    start = {window: since - timedelta(days=window - 1) for window in WINDOWS}
+    net_units = SalesDailyProductRollup.units - SalesDailyProductRollup.returned_units
+    net_revenue = SalesDailyProductRollup.revenue - SalesDailyProductRollup.returns_amount
+    columns = [SalesDailyProductRollup.product_id]
+    for window in WINDOWS:
+        in_window = SalesDailyProductRollup.day >= start[window]
+        columns.append(func.sum(case((in_window, net_units), else_=0)))
+        columns.append(func.sum(case((in_window, net_revenue), else_=0)))
+    return columns, net_units, net_revenue, start
+
+
+def refresh_product_sales_stats(full=False):
+    """إعادة حساب النوافذ الزمنية (وإجمالي المبيعات إذا كان full) من الملخص اليومي"""
+    today = datetime.utcnow().date()
+    table = ProductSalesStats.__table__
+    
+    # إضافة صفوف للمنتجات التي ليس لها عدادات
+    db.session.execute(insert(table).from_select(
+        ['product_id'],
+        select(Product.product_id).where(
+            ~select(table.c.product_id).where(table.c.product_id == Product.product_id).exists()
+        )
+    ))
+    
+    fields = [f'{metric}_{window}d' for window in WINDOWS for metric in ('units', 'revenue')]
+    if full:
+        fields += ['units_total', 'revenue_total']
+    db.session.execute(update(table).values(
+        refreshed_on=today, **{field: 0 for field in fields}
+    ))
+    
+    columns, net_units, net_revenue, start = _window_sums(today)
+    query = db.session.query(*columns)
+    if full:
+        query = db.session.query(*columns, func.sum(net_units), func.sum(net_revenue))
+    else:
+        query = query.filter(SalesDailyProductRollup.day >= start[max(WINDOWS)])
+    
+    statement = update(table).where(
+        table.c.product_id == bindparam('row_id')
+    ).values({field: bindparam(f'new_{field}') for field in fields})
+    
+    rows = []
+    for row in query.group_by(SalesDailyProductRollup.product_id):
+        rows.append({'row_id': row[0], **{
+            f'new_{field}': value or 0 for field, value in zip(fields, row[1:])
+        }})
+        if len(rows) >= 1000:
+            db.session.execute(statement, rows)
+            rows = []
+    if rows:
+        db.session.execute(statement, rows)
+    
+    db.session.commit()
+
+
+def product_stats_refreshed_on():
+    """تاريخ آخر إعادة حساب للنوافذ الزمنية، أو None إذا لم تبن العدادات بعد"""
+    return db.session.query(func.min(ProductSalesStats.refreshed_on)).scalar()
+
+
+def ensure_product_sales_stats():
+    """بناء العدادات أول مرة، وإعادة النوافذ الزمنية مرة في اليوم"""
+    # تعيد كتابة كل صفوف العدادات، فتشغل عند بدء التطبيق أو من CLI أو مهمة خلفية فقط
+    refreshed_on = product_stats_refreshed_on()
+    if refreshed_on is None:
+        refresh_product_sales_stats(full=True)
+    elif refreshed_on < datetime.utcnow().date():
+        refresh_product_sales_stats()
@@ -0,0 +1,46 @@
+from sqlalchemy import func, case
+from src.models.database import db, Product
+
+# عدد المنتجات وقيمة المخزون والمنتجات منخفضة المخزون لكل مورد أو فئة
+# في استعلام تجميعي واحد يربط بقائمة الموردين أو الفئات
+
+
+def product_totals_subquery(group_column, include_stock=False):
+    """استعلام فرعي مجمع على عمود المنتج (supplier_id أو category_id)"""
+    columns = [
+        group_column.label('group_id'),
+        func.count(Product.product_id).label('products_count')
+    ]
+    if include_stock:
+        columns += [
+            func.sum(Product.price * Product.quantity).label('stock_value'),
+            func.sum(case(
+                (Product.quantity <= Product.min_stock_level, 1), else_=0
+            )).label('low_stock_count')
+        ]
+    return db.session.query(*columns).filter(
+        group_column.isnot(None)
+    ).group_by(group_column).subquery()
+
+
+def with_product_totals(query, key_column, include_stock=False):
+    """إضافة أعمدة الإجماليات إلى استعلام القائمة بربط خارجي"""
+    group_column = getattr(Product, key_column.key)
+    totals = product_totals_subquery(group_column, include_stock)
+    query = query.outerjoin(totals, totals.c.group_id == key_column).add_columns(
+        func.coalesce(totals.c.products_count, 0).label('products_count')
+    )
+    if include_stock:
+        query = query.add_columns(
+            func.coalesce(totals.c.stock_value, 0).label('stock_value'),
+            func.coalesce(totals.c.low_stock_count, 0).label('low_stock_count')
+        )
+    return query
+
+
+def serialize_totals(row, include_stock=False):
+    totals = {'products_count': row.products_count}
+    if include_stock:
+        totals['stock_value'] = float(row.stock_value)
+        totals['low_stock_count'] = int(row.low_stock_count)
+    return totals
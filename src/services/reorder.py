@@ -0,0 +1,144 @@
+import math
+from collections import defaultdict
+from datetime import datetime, timedelta
+import numpy as np
+from flask import current_app
+from sqlalchemy import event, func, insert, delete
+from src.models.database import (
+    db, Product, PurchaseOrder, PurchaseOrderItem, ReorderSuggestion
+)
+from src.services.demand import load_products, daily_matrix, smoothing_weights
+
+# اقتراحات إعادة الطلب لكل المنتجات دفعة واحدة:
+#   الطلب اليومي = متوسط أسي لصافي المبيعات اليومية (أحدث الأيام أثقل وزناً)
+#   مخزون الأمان = z × الانحراف المعياري اليومي × √مدة التوريد
+#   نقطة إعادة الطلب = الطلب × مدة التوريد + مخزون الأمان (ولا تقل عن min_stock_level)
+#   الكمية المقترحة = الطلب × (مدة التوريد + فترة المراجعة) + مخزون الأمان - (المخزون + الكميات المطلوبة)
+# وتحسب مدة التوريد لكل مورد من أوامر الشراء المستلمة
+
+# معامل مستوى الخدمة 95%
+SERVICE_LEVEL_Z = 1.65
+
+# أوامر الشراء المستلمة خلال هذه المدة تحدد مدة توريد المورد
+LEAD_TIME_HISTORY_DAYS = 365
+
+
+def _supplier_lead_times():
+    """متوسط الأيام بين طلب الشراء واستلامه لكل مورد"""
+    since = datetime.utcnow() - timedelta(days=LEAD_TIME_HISTORY_DAYS)
+    durations = defaultdict(list)
+    for supplier_id, order_date, received_at in db.session.query(
+        PurchaseOrder.supplier_id, PurchaseOrder.order_date, PurchaseOrder.received_at
+    ).filter(
+        PurchaseOrder.status == 'received',
+        PurchaseOrder.received_at >= since
+    ):
+        durations[supplier_id].append((received_at - order_date).total_seconds() / 86400)
+    return {
+        supplier_id: max(1, math.ceil(sum(values) / len(values)))
+        for supplier_id, values in durations.items()
+    }
+
+
+def _on_order_quantities():
+    """الكميات في أوامر الشراء المعلقة لكل منتج"""
+    return dict(db.session.query(
+        PurchaseOrderItem.product_id, func.sum(PurchaseOrderItem.quantity)
+    ).join(
+        PurchaseOrder, PurchaseOrderItem.purchase_order_id == PurchaseOrder.purchase_order_id
+    ).filter(
+        PurchaseOrder.status == 'pending'
+    ).group_by(PurchaseOrderItem.product_id).all())
+
+
+def compute_reorder_suggestions(stock, history, lead_times, on_order, review_days, alpha):
+    """حساب الاقتراحات لكل المنتجات بعمليات على المصفوفات"""
+    # stock: (المخزون الحالي، min_stock_level)، history: صافي الوحدات اليومية
+    # (منتج × يوم، الأقدم أولاً)، وباقي المدخلات مصفوفات بطول المنتجات
+    on_hand, min_stock = stock
+    
+    demand = np.maximum(history @ smoothing_weights(history.shape[1], alpha), 0)
+    demand_std = history.std(axis=1)
+    
+    safety_stock = np.ceil(SERVICE_LEVEL_Z * demand_std * np.sqrt(lead_times))
+    reorder_point = np.maximum(np.ceil(demand * lead_times + safety_stock), min_stock)
+    target = np.maximum(np.ceil(demand * (lead_times + review_days) + safety_stock), min_stock)
+    
+    position = on_hand + on_order
+    suggested = np.where(position <= reorder_point, np.maximum(target - position, 0), 0)
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        days_of_cover = np.where(demand > 0, on_hand / demand, np.nan)
+    
+    return {
+        'daily_demand': demand,
+        'demand_std': demand_std,
+        'safety_stock': safety_stock,
+        'reorder_point': reorder_point,
+        'suggested_quantity': suggested,
+        'days_of_cover': days_of_cover
+    }
+
+
+def refresh_reorder_suggestions():
+    """إعادة حساب جدول reorder_suggestions لكل المنتجات، ويرجع عدد المنتجات"""
+    config = current_app.config
+    history_days = config.get('REORDER_HISTORY_DAYS', 90)
+    default_lead_time = config.get('REORDER_LEAD_TIME_DAYS', 7)
+    
+    table = ReorderSuggestion.__table__
+    db.session.execute(delete(table))
+    
+    products = load_products([
+        Product.supplier_id, Product.quantity, func.coalesce(Product.min_stock_level, 0)
+    ])
+    if products is None:
+        db.session.commit()
+        return 0
+    product_ids, supplier_ids, on_hand, min_stock = products
+    supplier_ids = supplier_ids.tolist()
+    on_hand = on_hand.astype(np.float64)
+    
+    today = datetime.utcnow().date()
+    history = daily_matrix(product_ids, today - timedelta(days=history_days - 1), history_days)
+    
+    supplier_lead_times = _supplier_lead_times()
+    lead_times = np.array([
+        supplier_lead_times.get(supplier_id, default_lead_time) for supplier_id in supplier_ids
+    ], dtype=np.float64)
+    pending = _on_order_quantities()
+    on_order = np.array([pending.get(int(product_id), 0) for product_id in product_ids], dtype=np.float64)
+    
+    result = compute_reorder_suggestions(
+        (on_hand, min_stock.astype(np.float64)),
+        history, lead_times, on_order,
+        config.get('REORDER_REVIEW_DAYS', 14), config.get('REORDER_SMOOTHING', 0.1)
+    )
+    
+    computed_at = datetime.utcnow()
+    rows = [{
+        'product_id': int(product_ids[i]),
+        'supplier_id': supplier_ids[i],
+        'daily_demand': round(float(result['daily_demand'][i]), 4),
+        'demand_std': round(float(result['demand_std'][i]), 4),
+        'lead_time_days': int(lead_times[i]),
+        'safety_stock': int(result['safety_stock'][i]),
+        'reorder_point': int(result['reorder_point'][i]),
+        'on_hand': int(on_hand[i]),
+        'on_order': int(on_order[i]),
+        'days_of_cover': None if np.isnan(result['days_of_cover'][i]) else round(float(result['days_of_cover'][i]), 1),
+        'suggested_quantity': int(result['suggested_quantity'][i]),
+        'computed_at': computed_at
+    } for i in range(len(product_ids))]
+    
+    for start in range(0, len(rows), 1000):
+        db.session.execute(insert(table), rows[start:start + 1000])
+    db.session.commit()
+    return len(rows)
+
+
+@event.listens_for(Product, 'before_delete')
+def _product_deleted(mapper, connection, target):
+    connection.execute(delete(ReorderSuggestion.__table__).where(
+        ReorderSuggestion.__table__.c.product_id == target.product_id
+    ))
@@ -0,0 +1,107 @@
+import json
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError, OperationalError
+from src.models.database import db, ReportCache
+from src.models.upsert import dialect_insert
+from src.services.reports import month_bounds
+
+# ذاكرة دائمة لنتائج التقارير في جدول report_cache.
+# تقارير الفترات المنتهية لا تتغير إلا بمرتجع أو بفاتورة متأخرة (مزامنة غير متصلة)،
+# فتحفظ بلا انتهاء ويلغيها أي بيع أو إرجاع يخص نفس الفترة داخل معاملته.
+# الفترات المفتوحة تحفظ لمدة قصيرة REPORT_CACHE_OPEN_TTL.
+#
+# الإلغاء يزيد رقم الجيل (generation) لصف الفترة ويجعله منتهياً، وينشئ الصف إن لم يوجد.
+# يلغى فقط ما يخص فترة مغلقة (فاتورة بتاريخ سابق أو مرتجع لفاتورة قديمة)، فلا تقفل كل
+# عملية بيع صفي اليوم والشهر الحاليين حتى commit، وتقارير الفترة المفتوحة تنتهي بالمدة.
+# تعتبر الفترة مغلقة بعد نهايتها بـ REPORT_CLOSE_GRACE، أطول من أي معاملة بيع، حتى لا يحفظ
+# تقرير الأمس دائماً قبل commit بيع بدأ قبل منتصف الليل ولم يلغه لأن يومه كان مفتوحاً.
+# بناء التقرير يقرأ الجيل قبل البدء ويحفظ النتيجة بتحديث شرطي على نفس الجيل،
+# فإذا ثبت بيع أو إرجاع للفترة أثناء البناء لا تحفظ النتيجة القديمة.
+
+
+REPORT_CLOSE_GRACE = timedelta(minutes=10)
+
+
+def is_day_closed(day, now=None):
+    return day < ((now or datetime.utcnow()) - REPORT_CLOSE_GRACE).date()
+
+
+def is_month_closed(year, month, now=None):
+    _, end_date = month_bounds(year, month)
+    return end_date <= (now or datetime.utcnow()) - REPORT_CLOSE_GRACE
+
+
+def daily_period_key(day):
+    return day.isoformat()
+
+
+def monthly_period_key(year, month):
+    return f'{year:04d}-{month:02d}'
+
+
+def cached_report(report_type, period_key, is_closed, build):
+    """إرجاع التقرير من الذاكرة الدائمة أو بناؤه وحفظه"""
+    now = datetime.utcnow()
+    entry = db.session.get(ReportCache, (report_type, period_key))
+    if entry and (entry.expires_at is None or entry.expires_at > now):
+        return json.loads(entry.payload)
+    generation = (entry.generation or 0) if entry else None
+    
+    data = build()
+    
+    ttl = current_app.config.get('REPORT_CACHE_OPEN_TTL', 60)
+    values = {
+        'payload': json.dumps(data, ensure_ascii=False),
+        'is_closed': is_closed,
+        'expires_at': None if is_closed else now + timedelta(seconds=ttl),
+        'created_at': now
+    }
+    table = ReportCache.__table__
+    try:
+        if generation is None:
+            # إذا أنشأ إلغاء أو طلب متزامن الصف أثناء البناء يفشل الإدراج ولا نحفظ
+            db.session.execute(table.insert().values(
+                report_type=report_type, period_key=period_key, generation=0, **values
+            ))
+        else:
+            db.session.execute(table.update().where(
+                table.c.report_type == report_type,
+                table.c.period_key == period_key,
+                func.coalesce(table.c.generation, 0) == generation
+            ).values(**values))
+        db.session.commit()
+    except (IntegrityError, OperationalError):
+        # تعذر الحفظ لا يمنع إرجاع التقرير
+        db.session.rollback()
+    return data
+
+
+def invalidate_report_periods(days):
+    """إلغاء تقارير الأيام والأشهر المغلقة التي تغيرت أرقامها داخل المعاملة الحالية"""
+    now = datetime.utcnow()
+    keys = set()
+    for day in days:
+        if is_day_closed(day, now):
+            keys.add(('daily', daily_period_key(day)))
+        if is_month_closed(day.year, day.month, now):
+            keys.add(('monthly', monthly_period_key(day.year, day.month)))
+    if not keys:
+        return
+    
+    table = ReportCache.__table__
+    # ترتيب ثابت للصفوف حتى لا تتقاطع أقفال المعاملات المتزامنة
+    statement = dialect_insert(ReportCache).values([{
+        'report_type': report_type,
+        'period_key': period_key,
+        'payload': '',
+        'is_closed': False,
+        'expires_at': now,
+        'generation': 1,
+        'created_at': now
+    } for report_type, period_key in sorted(keys)])
+    db.session.execute(statement.on_conflict_do_update(
+        index_elements=['report_type', 'period_key'],
+        set_={'generation': func.coalesce(table.c.generation, 0) + 1, 'expires_at': now}
+    ))
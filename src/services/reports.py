@@ -0,0 +1,187 @@
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import func
+from src.models.database import (
+    db, Sale, SaleItem, Product, Category, SalesDailyRollup, SalesDailyProductRollup
+)
+
+# تقارير المبيعات تقرأ من جداول الملخص اليومي بدلاً من جداول المبيعات الخام
+
+
+def parse_utc_datetime(value):
+    """قراءة تاريخ ISO وتحويله إلى UTC بدون منطقة زمنية كما تخزن التواريخ في الجداول"""
+    # القيمة بدون منطقة زمنية تعتبر UTC، ومع منطقة زمنية تحول إليه (10:00+03:00 = 07:00)
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def parse_date_range(start, end):
+    """تحويل معاملات from/to إلى نطاق نصف مفتوح [start, end)"""
+    # التاريخ بدون وقت في نهاية النطاق يشمل اليوم كاملاً
+    range_start = parse_utc_datetime(start) if start else None
+    range_end = None
+    if end:
+        range_end = parse_utc_datetime(end)
+        if 'T' not in end and ' ' not in end.strip():
+            range_end += timedelta(days=1)
+    return range_start, range_end
+
+
+def month_bounds(year, month):
+    """بداية الشهر وبداية الشهر التالي"""
+    start_date = datetime(year, month, 1)
+    if month == 12:
+        end_date = datetime(year + 1, 1, 1)
+    else:
+        end_date = datetime(year, month + 1, 1)
+    return start_date, end_date
+
+
+def daily_sales_report_data(target_date):
+    """تقرير مبيعات يوم واحد من صف الملخص وأعلى 5 منتجات"""
+    rollup = db.session.get(SalesDailyRollup, target_date)
+    
+    # أكثر المنتجات مبيعاً
+    top_products = db.session.query(
+        Product.name,
+        SalesDailyProductRollup.units
+    ).join(
+        Product, SalesDailyProductRollup.product_id == Product.product_id
+    ).filter(
+        SalesDailyProductRollup.day == target_date
+    ).order_by(
+        SalesDailyProductRollup.units.desc()
+    ).limit(5).all()
+    
+    return {
+        'date': target_date.isoformat(),
+        'total_sales': float(rollup.revenue) if rollup else 0.0,
+        'total_transactions': rollup.transactions if rollup else 0,
+        'total_returns': float(rollup.returns_amount) if rollup else 0.0,
+        'top_products': [
+            {'name': name, 'quantity': int(quantity)}
+            for name, quantity in top_products
+        ]
+    }
+
+
+def monthly_sales_report_data(year, month):
+    """تقرير مبيعات شهر من صفوف الملخص اليومي للشهر"""
+    start_date, end_date = month_bounds(year, month)
+    
+    days = SalesDailyRollup.query.filter(
+        SalesDailyRollup.day >= start_date.date(),
+        SalesDailyRollup.day < end_date.date()
+    ).order_by(SalesDailyRollup.day).all()
+    
+    return {
+        'year': year,
+        'month': month,
+        'total_sales': float(sum(day.revenue for day in days)),
+        'total_transactions': sum(day.transactions for day in days),
+        'total_returns': float(sum(day.returns_amount for day in days)),
+        'daily_sales': [
+            {'date': day.day.isoformat(), 'total': float(day.revenue)}
+            for day in days
+        ]
+    }
+
+
+TIMESERIES_BUCKETS = ('hour', 'day', 'week', 'month', 'year')
+TIMESERIES_GROUPS = ('product', 'category', 'payment_method')
+
+# صيغ strftime في SQLite المكافئة لـ date_trunc في PostgreSQL
+_SQLITE_BUCKET_FORMATS = {
+    'hour': '%Y-%m-%d %H:00:00',
+    'day': '%Y-%m-%d',
+    'month': '%Y-%m-01',
+    'year': '%Y-01-01',
+}
+
+
+def _bucket_expression(bucket, column):
+    if db.session.get_bind().dialect.name == 'postgresql':
+        return func.date_trunc(bucket, column)
+    if bucket == 'week':
+        # الأسبوع يبدأ يوم الاثنين كما في date_trunc
+        return func.date(column, 'weekday 0', '-6 days')
+    return func.strftime(_SQLITE_BUCKET_FORMATS[bucket], column)
+
+
+def _bucket_label(value, bucket):
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if bucket == 'hour':
+        return value.isoformat()
+    return value.date().isoformat() if isinstance(value, datetime) else value.isoformat()
+
+
+def timeseries_report_data(bucket, range_start, range_end, group_by=None):
+    """سلسلة زمنية للمبيعات مجمعة في SQL حسب الفترة وبعد اختياري، في استعلام واحد"""
+    if bucket not in TIMESERIES_BUCKETS:
+        raise ValueError(f'الفترة غير مدعومة: {bucket}')
+    if group_by and group_by not in TIMESERIES_GROUPS:
+        raise ValueError(f'التجميع غير مدعوم: {group_by}')
+    
+    period = _bucket_expression(bucket, Sale.sale_date).label('period')
+    
+    if group_by == 'product':
+        query = db.session.query(
+            period,
+            SaleItem.product_id.label('key'),
+            Product.name.label('name'),
+            func.sum(SaleItem.quantity).label('units'),
+            func.sum(SaleItem.total_price).label('revenue')
+        ).select_from(SaleItem).join(
+            Sale, SaleItem.sale_id == Sale.sale_id
+        ).join(
+            Product, SaleItem.product_id == Product.product_id
+        ).group_by(period, SaleItem.product_id, Product.name)
+    elif group_by == 'category':
+        query = db.session.query(
+            period,
+            Product.category_id.label('key'),
+            Category.name.label('name'),
+            func.sum(SaleItem.quantity).label('units'),
+            func.sum(SaleItem.total_price).label('revenue')
+        ).select_from(SaleItem).join(
+            Sale, SaleItem.sale_id == Sale.sale_id
+        ).join(
+            Product, SaleItem.product_id == Product.product_id
+        ).outerjoin(
+            Category, Product.category_id == Category.category_id
+        ).group_by(period, Product.category_id, Category.name)
+    elif group_by == 'payment_method':
+        query = db.session.query(
+            period,
+            Sale.payment_method.label('key'),
+            func.sum(Sale.total_amount).label('revenue'),
+            func.count(Sale.sale_id).label('transactions')
+        ).group_by(period, Sale.payment_method)
+    else:
+        query = db.session.query(
+            period,
+            func.sum(Sale.total_amount).label('revenue'),
+            func.count(Sale.sale_id).label('transactions')
+        ).group_by(period)
+    
+    # نطاق نصف مفتوح على العمود نفسه حتى يستخدم فهرس sale_date
+    query = query.filter(Sale.sale_date >= range_start, Sale.sale_date < range_end)
+    
+    series = []
+    for row in query.order_by(period).all():
+        point = row._asdict()
+        point['period'] = _bucket_label(row.period, bucket)
+        point['revenue'] = float(row.revenue or 0)
+        if 'units' in point:
+            point['units'] = int(row.units or 0)
+        series.append(point)
+    
+    return {
+        'bucket': bucket,
+        'group_by': group_by,
+        'from': range_start.isoformat(),
+        'to': range_end.isoformat(),
+        'series': series
+    }
@@ -0,0 +1,160 @@
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+from sqlalchemy import func
+from src.models.database import (
+    db, Sale, SaleItem, Return, SalesDailyRollup, SalesDailyProductRollup
+)
+from src.models.upsert import upsert_increments
+
+# الحقول التي تجمع تراكمياً في جداول الملخص اليومي
+DAY_FIELDS = ('revenue', 'transactions', 'units', 'tax_amount', 'discount_amount',
+              'returned_units', 'returns_amount')
+PRODUCT_FIELDS = ('units', 'revenue', 'returned_units', 'returns_amount')
+
+
+def _empty_row(fields):
+    return {field: 0 for field in fields}
+
+
+def add_sales_to_rollup(records):
+    """تحديث الملخص اليومي بفواتير جديدة (SaleRecord) داخل المعاملة الحالية"""
+    days = defaultdict(lambda: _empty_row(DAY_FIELDS))
+    products = defaultdict(lambda: _empty_row(PRODUCT_FIELDS))
+    
+    for record in records:
+        day = record.sale_date.date()
+        totals = days[day]
+        totals['revenue'] += record.total_amount
+        totals['transactions'] += 1
+        totals['tax_amount'] += record.tax_amount
+        totals['discount_amount'] += record.discount_amount
+        for line in record.lines:
+            totals['units'] += line['quantity']
+            product_totals = products[(day, line['product_id'])]
+            product_totals['units'] += line['quantity']
+            product_totals['revenue'] += line['total_price']
+    
+    upsert_increments(SalesDailyRollup, ['day'], DAY_FIELDS, [
+        {'day': day, **totals} for day, totals in days.items()
+    ])
+    upsert_increments(SalesDailyProductRollup, ['day', 'product_id'], PRODUCT_FIELDS, [
+        {'day': day, 'product_id': product_id, **totals}
+        for (day, product_id), totals in products.items()
+    ])
+
+
+def add_returns_to_rollup(records):
+    """تسجيل المرتجعات (ReturnRecord) على يوم الفاتورة الأصلية"""
+    days = defaultdict(lambda: _empty_row(DAY_FIELDS))
+    products = defaultdict(lambda: _empty_row(PRODUCT_FIELDS))
+    
+    for record in records:
+        day = record.sale_date.date()
+        days[day]['returned_units'] += record.quantity
+        days[day]['returns_amount'] += record.amount
+        product_totals = products[(day, record.product_id)]
+        product_totals['returned_units'] += record.quantity
+        product_totals['returns_amount'] += record.amount
+    
+    upsert_increments(SalesDailyRollup, ['day'], DAY_FIELDS, [
+        {'day': day, **totals} for day, totals in days.items()
+    ])
+    upsert_increments(SalesDailyProductRollup, ['day', 'product_id'], PRODUCT_FIELDS, [
+        {'day': day, 'product_id': product_id, **totals}
+        for (day, product_id), totals in products.items()
+    ])
+
+
+def _as_date(value):
+    # func.date يرجع نصاً في SQLite وتاريخاً في PostgreSQL
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _insert_in_chunks(model, rows, chunk_size=1000):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            db.session.execute(model.__table__.insert(), chunk)
+            chunk = []
+    if chunk:
+        db.session.execute(model.__table__.insert(), chunk)
+
+
+def rebuild_sales_rollup():
+    """إعادة حساب الملخص اليومي بالكامل من جداول المبيعات والمرتجعات"""
+    SalesDailyProductRollup.query.delete(synchronize_session=False)
+    SalesDailyRollup.query.delete(synchronize_session=False)
+    
+    sale_day = func.date(Sale.sale_date)
+    
+    # الملخص اليومي للفواتير
+    days = {}
+    for day, revenue, transactions, tax_amount, discount_amount in db.session.query(
+        sale_day,
+        func.sum(Sale.total_amount),
+        func.count(Sale.sale_id),
+        func.sum(Sale.tax_amount),
+        func.sum(Sale.discount_amount)
+    ).group_by(sale_day):
+        days[_as_date(day)] = {
+            'day': _as_date(day),
+            'revenue': revenue or 0,
+            'transactions': transactions,
+            'units': 0,
+            'tax_amount': tax_amount or 0,
+            'discount_amount': discount_amount or 0,
+            'returned_units': 0,
+            'returns_amount': 0
+        }
+    
+    # المرتجعات مجمعة حسب يوم الفاتورة والمنتج
+    returns = {}
+    for day, product_id, quantity, amount in db.session.query(
+        sale_day,
+        SaleItem.product_id,
+        func.sum(Return.quantity),
+        func.sum(Return.quantity * SaleItem.unit_price)
+    ).join(SaleItem, Return.sale_item_id == SaleItem.sale_item_id).join(
+        Sale, SaleItem.sale_id == Sale.sale_id
+    ).group_by(sale_day, SaleItem.product_id):
+        returns[(_as_date(day), product_id)] = (quantity or 0, Decimal(amount or 0))
+    
+    product_rows = []
+    for day, product_id, units, revenue in db.session.query(
+        sale_day,
+        SaleItem.product_id,
+        func.sum(SaleItem.quantity),
+        func.sum(SaleItem.total_price)
+    ).join(Sale, SaleItem.sale_id == Sale.sale_id).group_by(
+        sale_day, SaleItem.product_id
+    ).yield_per(5000):
+        day = _as_date(day)
+        returned_units, returns_amount = returns.get((day, product_id), (0, 0))
+        days[day]['units'] += units or 0
+        days[day]['returned_units'] += returned_units
+        days[day]['returns_amount'] += returns_amount
+        product_rows.append({
+            'day': day,
+            'product_id': product_id,
+            'units': units or 0,
+            'revenue': revenue or 0,
+            'returned_units': returned_units,
+            'returns_amount': returns_amount
+        })
+        if len(product_rows) >= 5000:
+            _insert_in_chunks(SalesDailyProductRollup, product_rows)
+            product_rows = []
+    
+    _insert_in_chunks(SalesDailyProductRollup, product_rows)
+    _insert_in_chunks(SalesDailyRollup, days.values())
+    db.session.commit()
+    return len(days)
+
+
+def ensure_sales_rollup():
+    """بناء الملخص اليومي عند أول تشغيل بعد إضافته لقاعدة بيانات فيها مبيعات سابقة"""
+    if db.session.query(SalesDailyRollup.day).first() is None and \
+            db.session.query(Sale.sale_id).first() is not None:
+        rebuild_sales_rollup()
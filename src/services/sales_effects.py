@@ -0,0 +1,38 @@
+from collections import namedtuple
+from src.services.rollup import add_sales_to_rollup, add_returns_to_rollup
+from src.services.product_stats import add_sales_to_product_stats, add_returns_to_product_stats
+from src.services.customer_stats import add_sales_to_customer_stats, add_returns_to_customer_stats
+from src.services.report_cache import invalidate_report_periods
+from src.services.live_sales import queue_live_update
+
+# وصف موحد للفاتورة أو المرتجع بعد كتابتهما، تستخدمه جميع مسارات البيع
+# (فاتورة واحدة، دفعة مزامنة، مرتجعات) لتحديث البيانات المشتقة في نفس المعاملة.
+# lines: قائمة قواميس فيها product_id و quantity و total_price
+SaleRecord = namedtuple('SaleRecord', [
+    'sale_id', 'customer_id', 'sale_date', 'total_amount',
+    'tax_amount', 'discount_amount', 'lines'
+])
+
+ReturnRecord = namedtuple('ReturnRecord', [
+    'sale_id', 'customer_id', 'sale_date', 'product_id', 'quantity', 'amount'
+])
+
+
+def apply_sale_effects(records):
+    """تحديث الجداول المشتقة بعد تسجيل فواتير جديدة، قبل commit"""
+    if records:
+        add_sales_to_rollup(records)
+        add_sales_to_product_stats(records)
+        add_sales_to_customer_stats(records)
+        invalidate_report_periods(record.sale_date.date() for record in records)
+        queue_live_update(sales=records)
+
+
+def apply_return_effects(records):
+    """تحديث الجداول المشتقة بعد تسجيل مرتجعات، قبل commit"""
+    if records:
+        add_returns_to_rollup(records)
+        add_returns_to_product_stats(records)
+        add_returns_to_customer_stats(records)
+        invalidate_report_periods(record.sale_date.date() for record in records)
+        queue_live_update(returns=records)
@@ -0,0 +1,135 @@
+import csv
+import io
+import json
+from sqlalchemy import select
+from src.models.database import db, Sale, SaleItem, Product, Customer
+
+# تصدير المبيعات للمحاسبة: الصفوف تقرأ بمؤشر من جهة الخادم على دفعات
+# وتكتب مباشرة في الاستجابة، فلا تتجاوز الذاكرة دفعة واحدة مهما طال النطاق
+
+EXPORT_FORMATS = ('csv', 'ndjson')
+
+# عدد الصفوف المقروءة من قاعدة البيانات والمكتوبة للاستجابة في كل دفعة
+EXPORT_BATCH_SIZE = 1000
+
+SALE_COLUMNS = [
+    'sale_id', 'sale_date', 'customer_id', 'customer_name', 'payment_method',
+    'status', 'total_amount', 'discount_amount', 'tax_amount'
+]
+
+ITEM_COLUMNS = [
+    'sale_item_id', 'product_id', 'product_name', 'quantity', 'unit_price', 'total_price'
+]
+
+
+def _export_statement(range_start, range_end, include_items, customer_id=None, status=None):
+    stmt = select(
+        Sale.sale_id, Sale.sale_date, Sale.customer_id,
+        Customer.name.label('customer_name'), Sale.payment_method, Sale.status,
+        Sale.total_amount, Sale.discount_amount, Sale.tax_amount
+    ).outerjoin(Customer, Sale.customer_id == Customer.customer_id)
+
+    order = [Sale.sale_date, Sale.sale_id]
+    if include_items:
+        stmt = stmt.add_columns(
+            SaleItem.sale_item_id, SaleItem.product_id, Product.name.label('product_name'),
+            SaleItem.quantity, SaleItem.unit_price, SaleItem.total_price
+        ).outerjoin(
+            SaleItem, SaleItem.sale_id == Sale.sale_id
+        ).outerjoin(
+            Product, SaleItem.product_id == Product.product_id
+        )
+        order.append(SaleItem.sale_item_id)
+
+    if range_start:
+        stmt = stmt.where(Sale.sale_date >= range_start)
+    if range_end:
+        stmt = stmt.where(Sale.sale_date < range_end)
+    if customer_id:
+        stmt = stmt.where(Sale.customer_id == customer_id)
+    if status:
+        stmt = stmt.where(Sale.status == status)
+
+    return stmt.order_by(*order)
+
+
+def _iter_batches(stmt):
+    # yield_per يفعّل stream_results (مؤشر خادم في PostgreSQL) ويجلب الصفوف دفعة دفعة
+    result = db.session.execute(stmt.execution_options(yield_per=EXPORT_BATCH_SIZE))
+    try:
+        for batch in result.mappings().partitions():
+            yield batch
+    finally:
+        result.close()
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def _json_value(value):
+    if value is None or isinstance(value, (int, str)):
+        return value
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return float(value)
+
+
+def _sale_dict(row):
+    sale = {column: _json_value(row[column]) for column in SALE_COLUMNS}
+    if sale['customer_name'] is None:
+        sale['customer_name'] = 'عميل نقدي'
+    return sale
+
+
+def generate_csv(range_start, range_end, include_items, **filters):
+    """ملف CSV بسطر لكل فاتورة، أو لكل عنصر فاتورة مع تكرار بيانات الفاتورة"""
+    columns = SALE_COLUMNS + (ITEM_COLUMNS if include_items else [])
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    # BOM حتى يفتح Excel الأسماء العربية بترميز UTF-8
+    buffer.write('\ufeff')
+    writer.writerow(columns)
+    yield buffer.getvalue()
+
+    stmt = _export_statement(range_start, range_end, include_items, **filters)
+    for batch in _iter_batches(stmt):
+        buffer.seek(0)
+        buffer.truncate()
+        for row in batch:
+            writer.writerow([_csv_value(row[column]) for column in columns])
+        yield buffer.getvalue()
+
+
+def generate_ndjson(range_start, range_end, include_items, **filters):
+    """سطر JSON لكل فاتورة، مع عناصرها عند طلبها"""
+    stmt = _export_statement(range_start, range_end, include_items, **filters)
+    current = None
+
+    for batch in _iter_batches(stmt):
+        lines = []
+        for row in batch:
+            if not include_items:
+                lines.append(json.dumps(_sale_dict(row), ensure_ascii=False))
+                continue
+
+            # صفوف الفاتورة الواحدة متتالية بفضل الترتيب على sale_id
+            if current is None or current['sale_id'] != row['sale_id']:
+                if current is not None:
+                    lines.append(json.dumps(current, ensure_ascii=False))
+                current = _sale_dict(row)
+                current['items'] = []
+            if row['sale_item_id'] is not None:
+                current['items'].append(
+                    {column: _json_value(row[column]) for column in ITEM_COLUMNS}
+                )
+        if lines:
+            yield '\n'.join(lines) + '\n'
+
+    if current is not None:
+        yield json.dumps(current, ensure_ascii=False) + '\n'
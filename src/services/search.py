@@ -0,0 +1,185 @@
+import re
+from sqlalchemy import event, inspect, select, text, Integer, Float
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from src.models.database import db, Product
+from src.utils.arabic import normalize_arabic, prefix_filter
+
+# فهرس البحث النصي للمنتجات:
+# - SQLite: جدول افتراضي FTS5 باسم products_fts (rowid = product_id)
+# - PostgreSQL: جدول product_search بعمود tsvector وفهرس GIN
+# تتم مزامنة الفهرس من أحداث SQLAlchemy عند إضافة المنتج أو تعديله أو حذفه
+
+SEARCH_FIELDS = ('name', 'brand', 'model', 'serial_number')
+
+# البحث يرسل مع كل حرف في نقطة البيع، وترتيب كل المطابقات لكلمة شائعة مكلف في الجداول الكبيرة:
+# - الكلمات الأقصر من SEARCH_MIN_RANK_LENGTH حرفاً تبحث ببادئة الاسم على فهرسه دون ترتيب بالصلة
+# - يؤخذ في المسارين أول SEARCH_CANDIDATE_LIMIT مطابقة من الفهرس فقط، فلا تتجاوز النتائج هذا العدد
+SEARCH_MIN_RANK_LENGTH = 3
+SEARCH_CANDIDATE_LIMIT = 1000
+
+_state = {'enabled': False}
+
+
+def is_search_enabled():
+    return _state['enabled']
+
+
+def search_document(product):
+    """النصوص المفهرسة للمنتج بعد توحيد الحروف العربية"""
+    return {field: normalize_arabic(getattr(product, field)) for field in SEARCH_FIELDS}
+
+
+def _tokens(term):
+    return re.findall(r'\w+', normalize_arabic(term))
+
+
+def setup_product_search():
+    """إنشاء بنية فهرس البحث حسب نوع قاعدة البيانات وبناؤه إذا كان فارغاً"""
+    dialect = db.engine.dialect.name
+    try:
+        with db.engine.begin() as connection:
+            if dialect == 'postgresql':
+                connection.execute(text(
+                    "CREATE TABLE IF NOT EXISTS product_search ("
+                    "product_id INTEGER PRIMARY KEY REFERENCES products(product_id) ON DELETE CASCADE, "
+                    "document tsvector NOT NULL)"
+                ))
+                connection.execute(text(
+                    "CREATE INDEX IF NOT EXISTS ix_product_search_document "
+                    "ON product_search USING GIN (document)"
+                ))
+                indexed = connection.execute(text("SELECT COUNT(*) FROM product_search")).scalar()
+            elif dialect == 'sqlite':
+                connection.execute(text(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5("
+                    "name, brand, model, serial_number, "
+                    "tokenize='unicode61 remove_diacritics 2')"
+                ))
+                indexed = connection.execute(text("SELECT COUNT(*) FROM products_fts")).scalar()
+            else:
+                return False
+    except (OperationalError, ProgrammingError) as e:
+        # قاعدة البيانات لا تدعم البحث النصي (مثلاً SQLite بدون FTS5)، نعود للبحث بـ LIKE
+        print(f"⚠️ تعذر تفعيل فهرس البحث النصي: {e}")
+        _state['enabled'] = False
+        return False
+    
+    _state['enabled'] = True
+    
+    if not indexed and db.session.query(Product.product_id).first() is not None:
+        rebuild_product_search()
+    
+    return True
+
+
+def _index_product(connection, product):
+    document = search_document(product)
+    if connection.dialect.name == 'postgresql':
+        connection.execute(text(
+            "INSERT INTO product_search (product_id, document) VALUES (:product_id, "
+            "setweight(to_tsvector('simple', :name), 'A') || "
+            "setweight(to_tsvector('simple', :brand || ' ' || :model), 'B') || "
+            "setweight(to_tsvector('simple', :serial_number), 'A')) "
+            "ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document"
+        ), {'product_id': product.product_id, **document})
+    else:
+        connection.execute(
+            text("DELETE FROM products_fts WHERE rowid = :product_id"),
+            {'product_id': product.product_id}
+        )
+        connection.execute(text(
+            "INSERT INTO products_fts (rowid, name, brand, model, serial_number) "
+            "VALUES (:product_id, :name, :brand, :model, :serial_number)"
+        ), {'product_id': product.product_id, **document})
+
+
+def _unindex_product(connection, product_id):
+    if connection.dialect.name == 'postgresql':
+        connection.execute(
+            text("DELETE FROM product_search WHERE product_id = :product_id"),
+            {'product_id': product_id}
+        )
+    else:
+        connection.execute(
+            text("DELETE FROM products_fts WHERE rowid = :product_id"),
+            {'product_id': product_id}
+        )
+
+
+@event.listens_for(Product, 'after_insert')
+def _product_inserted(mapper, connection, target):
+    if _state['enabled']:
+        _index_product(connection, target)
+
+
+@event.listens_for(Product, 'after_update')
+def _product_updated(mapper, connection, target):
+    if not _state['enabled']:
+        return
+    state = inspect(target)
+    if any(state.attrs[field].history.has_changes() for field in SEARCH_FIELDS):
+        _index_product(connection, target)
+
+
+@event.listens_for(Product, 'after_delete')
+def _product_deleted(mapper, connection, target):
+    if _state['enabled']:
+        _unindex_product(connection, target.product_id)
+
+
+def rebuild_product_search(batch_size=1000):
+    """إعادة بناء فهرس البحث بالكامل من جدول المنتجات"""
+    if not _state['enabled']:
+        return 0
+    
+    connection = db.session.connection()
+    if connection.dialect.name == 'postgresql':
+        connection.execute(text("DELETE FROM product_search"))
+    else:
+        connection.execute(text("DELETE FROM products_fts"))
+    
+    count = 0
+    for product in Product.query.order_by(Product.product_id).yield_per(batch_size):
+        _index_product(connection, product)
+        count += 1
+    
+    db.session.commit()
+    return count
+
+
+def is_short_term(term):
+    """كلمات البحث أقصر من أن ترتب بالفهرس النصي"""
+    return len(''.join(_tokens(term))) < SEARCH_MIN_RANK_LENGTH
+
+
+def product_prefix_subquery(term):
+    """استعلام فرعي (product_id) لأول المنتجات التي يبدأ اسمها الموحد بالكلمة، من فهرس الاسم"""
+    return select(Product.product_id).where(
+        prefix_filter(Product.name_normalized, normalize_arabic(term))
+    ).limit(SEARCH_CANDIDATE_LIMIT).subquery('product_prefix_results')
+
+
+def product_search_subquery(term):
+    """استعلام فرعي (product_id, rank) للمنتجات المطابقة، القيمة الأصغر هي الأكثر صلة"""
+    # None يعني أن الفهرس غير مفعل أو لا توجد كلمات صالحة، فيستخدم المستدعي LIKE
+    tokens = _tokens(term)
+    if not _state['enabled'] or not tokens:
+        return None
+    
+    # LIMIT بدون ORDER BY يوقف قراءة المطابقات عند الحد، فتحسب الصلة للمرشحين فقط
+    if db.engine.dialect.name == 'postgresql':
+        # بحث بالبادئة لكل كلمة مع ترتيب ts_rank (مقلوب ليكون الأصغر أفضل)،
+        # وتحويله إلى float8 لأن ts_rank يرجع real فلا تطابق قيمة المؤشر عند المقارنة
+        statement = text(
+            "SELECT product_id, -CAST(ts_rank(document, to_tsquery('simple', :query)) AS float8) AS rank "
+            "FROM product_search WHERE document @@ to_tsquery('simple', :query) LIMIT :candidates"
+        ).bindparams(query=' & '.join(f'{token}:*' for token in tokens))
+    else:
+        # bm25 في SQLite يعطي قيمة أصغر للنتيجة الأكثر صلة، مع وزن أكبر للاسم والرقم التسلسلي
+        statement = text(
+            "SELECT rowid AS product_id, bm25(products_fts, 10.0, 2.0, 2.0, 10.0) AS rank "
+            "FROM products_fts WHERE products_fts MATCH :query LIMIT :candidates"
+        ).bindparams(query=' '.join(f'"{token}"*' for token in tokens))
+    statement = statement.bindparams(candidates=SEARCH_CANDIDATE_LIMIT)
+    
+    return statement.columns(product_id=Integer, rank=Float).subquery('product_search_results')
@@ -0,0 +1,16 @@
+from sqlalchemy import update, case
+from src.models.database import db, Product
+from src.services.product_cache import PRODUCT_IDS_OPTION
+
+
+def increment_stock(quantities):
+    """زيادة مخزون عدة منتجات بجملة UPDATE نسبية واحدة: {product_id: quantity}"""
+    # الزيادة نسبية (quantity + n) فلا تلغي عمليات البيع المتزامنة
+    if not quantities:
+        return
+    db.session.execute(
+        update(Product)
+        .where(Product.product_id.in_(quantities.keys()))
+        .values(quantity=Product.quantity + case(quantities, value=Product.product_id))
+        .execution_options(synchronize_session=False, **{PRODUCT_IDS_OPTION: tuple(quantities)})
+    )
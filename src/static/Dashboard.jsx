@@ -44,11 +44,11 @@ const Dashboard = () => {
     const fetchDashboardData = async () => {
       try {
         // جلب إحصائيات المنتجات
-        const productsResponse = await fetch('http://localhost:5000/api/products')
+        const productsResponse = await fetch('http://localhost:5000/api/products/summary')
         const products = await productsResponse.json()
 
         // جلب إحصائيات العملاء
-        const customersResponse = await fetch('http://localhost:5000/api/customers')
+        const customersResponse = await fetch('http://localhost:5000/api/customers/summary')
         const customers = await customersResponse.json()
 
         // جلب إحصائيات المبيعات
@@ -60,11 +60,11 @@ const Dashboard = () => {
         const lowStockProducts = await lowStockResponse.json()
 
         setStats({
-          totalProducts: products.length,
-          totalCustomers: customers.length,
+          totalProducts: products.total_products || 0,
+          totalCustomers: customers.total_customers || 0,
           todaySales: salesStats.today_sales || 0,
           todayRevenue: salesStats.today_revenue || 0,
-          lowStockProducts: lowStockProducts
+          lowStockProducts: lowStockProducts.low_stock_products || []
         })
       } catch (error) {
         console.error('Error fetching dashboard data:', error)
@@ -0,0 +1,76 @@
+import re
+from sqlalchemy import and_, or_
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ColumnElement
+
+# التشكيل (الفتحة، الضمة، الكسرة، التنوين، الشدة، السكون، الألف الخنجرية) والتطويل
+_TASHKEEL = re.compile('[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]')
+
+_FOLDING = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ة': 'ه',
+    'ى': 'ي', 'ئ': 'ي',
+    'ؤ': 'و',
+    '٠': '0', '١': '1', '٢': '2', '٣': '3', '٤': '4',
+    '٥': '5', '٦': '6', '٧': '7', '٨': '8', '٩': '9',
+})
+
+_WHITESPACE = re.compile(r'\s+')
+
+# أعلى محرف في BMP، يستخدم كحد أعلى لنطاق البحث بالبادئة في SQLite (ترتيب ثنائي)
+_PREFIX_UPPER_BOUND = '\uffff'
+
+
+def normalize_arabic(text):
+    """توحيد النص العربي للبحث: حذف التشكيل وتوحيد الهمزات والألف والتاء المربوطة والياء"""
+    if not text:
+        return ''
+    text = _TASHKEEL.sub('', text).translate(_FOLDING).lower()
+    return _WHITESPACE.sub(' ', text).strip()
+
+
+class _PrefixMatch(ColumnElement):
+    """شرط column يبدأ بـ prefix يترجم حسب قاعدة البيانات بصيغة تستخدم الفهرس"""
+    inherit_cache = False
+
+    def __init__(self, column, prefix):
+        self.column = column
+        self.prefix = prefix
+
+
+@compiles(_PrefixMatch)
+def _compile_prefix_range(element, compiler, **kw):
+    # في SQLite الترتيب ثنائي، فالنطاق [prefix, prefix + U+FFFF) يغطي كل ما يبدأ بالبادئة
+    return '(%s)' % compiler.process(and_(
+        element.column >= element.prefix,
+        element.column < element.prefix + _PREFIX_UPPER_BOUND
+    ), **kw)
+
+
+@compiles(_PrefixMatch, 'postgresql')
+def _compile_prefix_like(element, compiler, **kw):
+    # في PostgreSQL لا وزن محدداً لـ U+FFFF في ترتيب اللغة فقد يستبعد النطاق نتائج صحيحة،
+    # و LIKE 'prefix%' يستخدم فهرس varchar_pattern_ops على العمود
+    return '(%s)' % compiler.process(
+        element.column.like(_escape_like(element.prefix) + '%', escape='/'), **kw
+    )
+
+
+def _escape_like(text):
+    return text.replace('/', '//').replace('%', '/%').replace('_', '/_')
+
+
+def prefix_filter(column, prefix):
+    """شرط بحث بالبادئة يستطيع استخدام فهرس العمود"""
+    return _PrefixMatch(column, prefix)
+
+
+def normalized_word_prefix_filter(column, term):
+    """شرط بحث على عمود موحد: بداية الاسم أو بداية أي كلمة فيه"""
+    # "الامل" تطابق "شركة الأمل" و"أحمد" تطابق "محمد أحمد" كما كان البحث بـ contains،
+    # والبادئة وحدها تبقى بصيغة الفهرس. العمود الموحد يفصل كلماته بمسافة واحدة
+    term = normalize_arabic(term)
+    return or_(
+        prefix_filter(column, term),
+        column.like('% ' + _escape_like(term) + '%', escape='/')
+    )
@@ -0,0 +1,46 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """ذاكرة مؤقتة صغيرة داخل العملية تحذف الأقدم استخداماً عند الامتلاء"""
+
+    def __init__(self, maxsize=1024, ttl=None):
+        # ttl: مدة صلاحية كل قيمة بالثواني، أو None بلا انتهاء
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            value, expires_at = self._data[key]
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard_where(self, predicate):
+        """حذف القيم التي يتحقق فيها predicate(value)"""
+        with self._lock:
+            for key in [key for key, (value, _) in self._data.items() if predicate(value)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
@@ -0,0 +1,33 @@
+import base64
+import json
+
+DEFAULT_PAGE_LIMIT = 50
+MAX_PAGE_LIMIT = 200
+
+
+def get_page_limit(args, default=DEFAULT_PAGE_LIMIT, maximum=MAX_PAGE_LIMIT):
+    """قراءة حجم الصفحة من معاملات الطلب مع حصره ضمن الحدود المسموحة"""
+    limit = args.get('limit', default, type=int)
+    if limit is None or limit < 1:
+        return default
+    return min(limit, maximum)
+
+
+def encode_cursor(*values):
+    """ترميز قيم مفتاح الصفحة في مؤشر نصي معتم"""
+    raw = json.dumps(list(values), separators=(',', ':'), default=str)
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """فك ترميز المؤشر وإرجاع قائمة القيم، أو None إذا لم يُرسل مؤشر"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError):
+        raise ValueError('مؤشر الصفحة غير صالح')
+    if not isinstance(values, list):
+        raise ValueError('مؤشر الصفحة غير صالح')
+    return values
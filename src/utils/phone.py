@@ -0,0 +1,38 @@
+import os
+import re
+
+# رمز الدولة المضاف للأرقام المحلية (05xxxxxxxx أو 5xxxxxxxx)
+DEFAULT_COUNTRY_CODE = os.environ.get('PHONE_COUNTRY_CODE', '966')
+
+# أطول رقم محلي بدون رمز الدولة (9 أرقام للجوال السعودي)
+_NATIONAL_MAX_LENGTH = 9
+
+# الأرقام العربية الهندية والفارسية
+_DIGITS = str.maketrans('٠١٢٣٤٥٦٧٨٩۰۱۲۳۴۵۶۷۸۹', '01234567890123456789')
+
+_NON_DIGITS = re.compile(r'\D')
+
+
+def phone_digits(value):
+    """أرقام الهاتف فقط كما كتبت، بعد تحويل الأرقام العربية"""
+    if not value:
+        return ''
+    return _NON_DIGITS.sub('', value.translate(_DIGITS))
+
+
+def normalize_phone(value, country_code=DEFAULT_COUNTRY_CODE):
+    """توحيد رقم الهاتف إلى أرقام E.164 بدون علامة + (مثل 966501234567)"""
+    digits = phone_digits(value)
+    if not digits:
+        return ''
+
+    stripped = value.strip()
+    if stripped.startswith('+'):
+        return digits
+    if digits.startswith('00'):
+        return digits[2:]
+    if digits.startswith(country_code) and len(digits) > _NATIONAL_MAX_LENGTH:
+        return digits
+
+    # رقم محلي: حذف الصفر البادئ وإضافة رمز الدولة
+    return country_code + digits.lstrip('0')
@@ -0,0 +1,21 @@
+# التحقق من المعرفات والكميات في أجسام الطلبات (JSON)
+
+
+def parse_id(value):
+    """معرف سجل موجب من رقم صحيح أو نص أرقام ("12")، ويرفع ValueError لغير ذلك"""
+    # bool فرع من int في بايثون فيستبعد صراحة، وكذلك الأرقام العشرية والقوائم والقواميس
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError('معرف غير صالح')
+    if isinstance(value, str):
+        value = value.strip()
+        if not value.isdigit():
+            raise ValueError('معرف غير صالح')
+    value = int(value)
+    if value <= 0:
+        raise ValueError('معرف غير صالح')
+    return value
+
+
+def is_positive_int(value):
+    """كمية صحيحة موجبة (true و 1.0 ليستا كمية)"""
+    return isinstance(value, int) and not isinstance(value, bool) and value > 0
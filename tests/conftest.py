@@ -0,0 +1,32 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# قاعدة بيانات الاختبارات: TEST_DATABASE_URL (مثلاً PostgreSQL) أو ملف SQLite مؤقت،
+# وتضبط قبل استيراد التطبيق لأن الإعدادات تقرأ عند الاستيراد
+os.environ['DATABASE_URL'] = (
+    os.environ.get('TEST_DATABASE_URL')
+    or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'test.db')
+)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.main import app as flask_app  # noqa: E402
+from src.models.database import db  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def app():
+    return flask_app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def dialect(app):
+    with app.app_context():
+        return db.engine.dialect.name
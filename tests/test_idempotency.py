@@ -0,0 +1,51 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.models.database import db, IdempotencyKey
+
+
+@pytest.fixture
+def sale_request(client):
+    response = client.post('/api/products', json={
+        'name': 'منتج إعادة المحاولة',
+        'price': 10,
+        'quantity': 10,
+        'serial_number': f'IDEM-{uuid.uuid4().hex}'
+    })
+    return {'items': [{'product_id': response.get_json()['product_id'], 'quantity': 1}]}
+
+
+def _reserve_unfinished(app, client, key, payload, locked_until):
+    """محاكاة طلب أول حجز المفتاح ثم توقف عامله قبل تسجيل النتيجة"""
+    # الطلب نفسه يعطي البصمة المطابقة، ثم يعاد المفتاح إلى حالة قيد التنفيذ
+    client.post('/api/sales', json=payload, headers={'Idempotency-Key': key})
+    with app.app_context():
+        record = db.session.get(IdempotencyKey, key)
+        record.status_code = None
+        record.response_body = None
+        record.locked_until = locked_until
+        db.session.commit()
+
+
+def test_retry_takes_over_abandoned_key(app, client, sale_request):
+    key = f'abandoned-{uuid.uuid4().hex}'
+    _reserve_unfinished(app, client, key, sale_request, datetime.utcnow() - timedelta(seconds=1))
+
+    retry = client.post('/api/sales', json=sale_request, headers={'Idempotency-Key': key})
+    assert retry.status_code == 201
+    assert 'Idempotent-Replayed' not in retry.headers
+
+    replay = client.post('/api/sales', json=sale_request, headers={'Idempotency-Key': key})
+    assert replay.status_code == 201
+    assert replay.headers['Idempotent-Replayed'] == 'true'
+    assert replay.get_json() == retry.get_json()
+
+
+def test_retry_waits_while_original_request_holds_the_key(app, client, sale_request):
+    key = f'in-progress-{uuid.uuid4().hex}'
+    _reserve_unfinished(app, client, key, sale_request, datetime.utcnow() + timedelta(seconds=60))
+
+    retry = client.post('/api/sales', json=sale_request, headers={'Idempotency-Key': key})
+    assert retry.status_code == 409
@@ -0,0 +1,92 @@
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.models.database import db, Job
+from src.services.jobs import register_job, enqueue_job, recover_stale_jobs, send_heartbeats
+
+release = threading.Event()
+
+
+@register_job('test_echo')
+def echo_job(params):
+    return params
+
+
+@register_job('test_blocking')
+def blocking_job(params):
+    release.wait(10)
+    return {'done': True}
+
+
+def wait_for_status(app, job_id, status, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with app.app_context():
+            job = db.session.get(Job, job_id)
+            if job.status == status:
+                return job
+        time.sleep(0.05)
+    pytest.fail(f'المهمة {job_id} لم تصل إلى الحالة {status}')
+
+
+def insert_running_job(app, heartbeat_age):
+    job_id = uuid.uuid4().hex
+    now = datetime.utcnow()
+    with app.app_context():
+        db.session.add(Job(
+            job_id=job_id,
+            job_type='test_echo',
+            params='{"value": 1}',
+            status='running',
+            created_at=now - heartbeat_age,
+            started_at=now - heartbeat_age,
+            heartbeat_at=now - heartbeat_age
+        ))
+        db.session.commit()
+    return job_id
+
+
+def test_job_of_crashed_worker_is_resumed(app):
+    # العامل توقف قبل دقائق وأعيد تشغيله خلال الساعة: لا نبضة منذ توقفه
+    job_id = insert_running_job(app, timedelta(minutes=5))
+
+    with app.app_context():
+        assert recover_stale_jobs() >= 1
+
+    job = wait_for_status(app, job_id, 'completed')
+    assert job.result == '{"value": 1}'
+
+
+def test_job_with_recent_heartbeat_is_left_running(app):
+    job_id = insert_running_job(app, timedelta(seconds=1))
+
+    with app.app_context():
+        recover_stale_jobs()
+        assert db.session.get(Job, job_id).status == 'running'
+        db.session.delete(db.session.get(Job, job_id))
+        db.session.commit()
+
+
+def test_running_job_heartbeat_keeps_it_claimed(app):
+    release.clear()
+    with app.app_context():
+        job_id = enqueue_job('test_blocking', {}).job_id
+    wait_for_status(app, job_id, 'running')
+
+    with app.app_context():
+        # نبضة قديمة كأن المهمة متوقفة، ثم نبضة خيط المراقبة تجددها
+        db.session.query(Job).filter(Job.job_id == job_id).update(
+            {'heartbeat_at': datetime.utcnow() - timedelta(minutes=5)}
+        )
+        db.session.commit()
+        send_heartbeats()
+        recover_stale_jobs()
+        assert db.session.get(Job, job_id).status == 'running'
+
+    release.set()
+    job = wait_for_status(app, job_id, 'completed')
+    assert job.result == '{"done": true}'
@@ -0,0 +1,21 @@
+import pytest
+
+
+@pytest.mark.parametrize('search', ['محمد', 'أحمد', 'احمد', 'محمد أحم'])
+def test_customer_found_by_any_word_of_name(client, search):
+    customer_id = client.post('/api/customers', json={'name': 'محمد أحمد'}).get_json()['customer_id']
+
+    response = client.get('/api/customers', query_string={'search': search, 'limit': 100})
+
+    assert response.status_code == 200
+    assert customer_id in [customer['customer_id'] for customer in response.get_json()['customers']]
+
+
+@pytest.mark.parametrize('search', ['شركة', 'الأمل', 'الامل', 'الأم'])
+def test_supplier_found_by_any_word_of_name(client, search):
+    supplier_id = client.post('/api/suppliers', json={'name': 'شركة الأمل'}).get_json()['supplier_id']
+
+    response = client.get('/api/suppliers', query_string={'search': search})
+
+    assert response.status_code == 200
+    assert supplier_id in [supplier['supplier_id'] for supplier in response.get_json()['suppliers']]
@@ -0,0 +1,59 @@
+import time
+import uuid
+
+import pytest
+from sqlalchemy import update
+
+from src.models.database import db, Product
+from src.services.product_cache import serial_cache
+
+
+def create_product(client):
+    serial_number = f'SCAN-{uuid.uuid4().hex}'
+    product_id = client.post('/api/products', json={
+        'name': 'منتج المسح',
+        'price': 10,
+        'quantity': 10,
+        'serial_number': serial_number
+    }).get_json()['product_id']
+    return product_id, serial_number
+
+
+def test_sale_evicts_only_sold_products(client):
+    sold_id, sold_serial = create_product(client)
+    _, other_serial = create_product(client)
+    client.get(f'/api/products/by-serial/{sold_serial}')
+    client.get(f'/api/products/by-serial/{other_serial}')
+
+    response = client.post('/api/sales', json={'items': [{'product_id': sold_id, 'quantity': 3}]})
+
+    assert response.status_code == 201
+    assert serial_cache.get(sold_serial) is None
+    assert serial_cache.get(other_serial) is not None
+    assert client.get(f'/api/products/by-serial/{sold_serial}').get_json()['quantity'] == 7
+
+
+def test_change_from_another_worker_expires_with_ttl(app, client, monkeypatch):
+    monkeypatch.setattr(serial_cache, 'ttl', 0.2)
+    product_id, serial_number = create_product(client)
+    assert client.get(f'/api/products/by-serial/{serial_number}').get_json()['quantity'] == 10
+
+    # تغيير من عملية أخرى لا يمر بأحداث جلسة هذه العملية
+    with app.app_context(), db.engine.begin() as connection:
+        connection.execute(update(Product.__table__).where(
+            Product.__table__.c.product_id == product_id
+        ).values(quantity=4))
+    assert client.get(f'/api/products/by-serial/{serial_number}').get_json()['quantity'] == 10
+
+    time.sleep(0.3)
+    assert client.get(f'/api/products/by-serial/{serial_number}').get_json()['quantity'] == 4
+
+
+@pytest.mark.parametrize('changes', [{'price': 12}, {'serial_number': f'NEW-{uuid.uuid4().hex}'}])
+def test_product_update_evicts_its_entry(client, changes):
+    product_id, serial_number = create_product(client)
+    client.get(f'/api/products/by-serial/{serial_number}')
+
+    client.put(f'/api/products/{product_id}', json=changes)
+
+    assert serial_cache.get(serial_number) is None
@@ -0,0 +1,56 @@
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from src.models.database import db, Job, ProductSalesStats
+from src.services import jobs
+
+
+def refresh_jobs(app, statuses=('queued', 'running')):
+    with app.app_context():
+        return [job.job_id for job in Job.query.filter(
+            Job.job_type == 'product_sales_stats', Job.status.in_(statuses)
+        )]
+
+
+def test_movers_is_read_only_and_flags_stale_counters(app, client, monkeypatch):
+    client.post('/api/products', json={
+        'name': 'منتج الأكثر مبيعاً', 'price': 5, 'quantity': 1, 'serial_number': f'MOVERS-{uuid.uuid4().hex}'
+    })
+    yesterday = datetime.utcnow().date() - timedelta(days=1)
+    with app.app_context():
+        db.session.query(ProductSalesStats).update({'refreshed_on': yesterday})
+        db.session.commit()
+        engine = db.engine
+    # بدون إرسال للتنفيذ تبقى المهمة منتظرة، فيظهر أن الطلب لم يحدث العدادات بنفسه
+    monkeypatch.setattr(jobs, '_submit', lambda job_id: None)
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement.lower())
+
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        first = client.get('/api/products/reports/movers')
+        second = client.get('/api/products/reports/movers')
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+
+    assert first.status_code == 200
+    assert first.get_json()['stale'] is True
+    assert first.get_json()['refreshed_on'] == yesterday.isoformat()
+    assert second.get_json()['stale'] is True
+    assert not [statement for statement in statements
+                if statement.startswith('update') and 'product_sales_stats' in statement]
+    # طلبان متتاليان يرسلان مهمة تحديث واحدة
+    pending = refresh_jobs(app)
+    assert len(pending) == 1
+
+    jobs._run_job(pending[0])
+
+    response = client.get('/api/products/reports/movers').get_json()
+    assert response['stale'] is False
+    assert response['refreshed_on'] == datetime.utcnow().date().isoformat()
+    assert refresh_jobs(app, ('completed',)) == pending
@@ -0,0 +1,49 @@
+import uuid
+
+import pytest
+
+from src.services import search as search_service
+
+
+@pytest.fixture
+def products(client):
+    # بادئة غير مستخدمة في بقية الاختبارات حتى لا تختلط نتائجها
+    prefix = 'ظظ' + uuid.uuid4().hex[:6]
+    names = [f'{prefix} شاحن', f'{prefix} جراب', f'{prefix} سماعة', f'منتج {prefix}']
+    return [
+        client.post('/api/products', json={
+            'name': name,
+            'price': 10,
+            'quantity': 5,
+            'serial_number': f'SEARCH-{uuid.uuid4().hex}'
+        }).get_json()['product_id']
+        for name in names
+    ]
+
+
+def test_short_term_matches_name_prefix_in_pages(client, products):
+    found = []
+    cursor = None
+    while True:
+        response = client.get('/api/products', query_string={
+            'search': 'ظظ', 'limit': 2, **({'cursor': cursor} if cursor else {})
+        })
+        assert response.status_code == 200
+        body = response.get_json()
+        found.extend(product['product_id'] for product in body['products'])
+        cursor = body['next_cursor']
+        if not cursor:
+            break
+    
+    assert [product_id for product_id in found if product_id in products] == products[:3]
+
+
+def test_results_are_capped_by_candidate_limit(client, products, monkeypatch):
+    monkeypatch.setattr(search_service, 'SEARCH_CANDIDATE_LIMIT', 2)
+    name = client.get(f'/api/products/{products[0]}').get_json()['name']
+    
+    for term in ('ظظ', name.split()[0]):
+        response = client.get('/api/products', query_string={'search': term, 'limit': 100})
+        
+        assert response.status_code == 200
+        assert len(response.get_json()['products']) <= 2
@@ -0,0 +1,88 @@
+import uuid
+
+import pytest
+
+
+@pytest.fixture
+def supplier_id(client):
+    return client.post('/api/suppliers', json={'name': 'مورد أوامر الشراء'}).get_json()['supplier_id']
+
+
+@pytest.fixture
+def product_id(client):
+    response = client.post('/api/products', json={
+        'name': 'منتج أوامر الشراء',
+        'price': 10,
+        'quantity': 5,
+        'serial_number': f'PO-{uuid.uuid4().hex}'
+    })
+    return response.get_json()['product_id']
+
+
+def create_order(client, supplier_id, items):
+    return client.post(f'/api/suppliers/{supplier_id}/purchase-orders', json={'items': items})
+
+
+def stock(client, product_id):
+    return client.get(f'/api/products/{product_id}').get_json()['quantity']
+
+
+def test_receive_increments_stock_exactly_once(client, supplier_id, product_id):
+    order_id = create_order(client, supplier_id, [
+        {'product_id': product_id, 'quantity': 3, 'unit_cost': 4},
+        {'product_id': str(product_id), 'quantity': 2, 'unit_cost': 4}
+    ]).get_json()['purchase_order_id']
+    url = f'/api/suppliers/{supplier_id}/purchase-orders/{order_id}'
+
+    first = client.post(f'{url}/receive')
+    second = client.post(f'{url}/receive')
+
+    assert first.status_code == 200
+    assert first.get_json()['received'] == [{'product_id': product_id, 'quantity': 5}]
+    assert second.status_code == 409
+    assert stock(client, product_id) == 10
+    assert client.get(url).get_json()['status'] == 'received'
+
+
+def test_cancelled_order_cannot_be_received(client, supplier_id, product_id):
+    order_id = create_order(client, supplier_id, [
+        {'product_id': product_id, 'quantity': 3, 'unit_cost': 4}
+    ]).get_json()['purchase_order_id']
+    url = f'/api/suppliers/{supplier_id}/purchase-orders/{order_id}'
+
+    assert client.post(f'{url}/cancel').status_code == 200
+    assert client.post(f'{url}/receive').status_code == 409
+    assert client.post(f'{url}/cancel').status_code == 409
+    assert stock(client, product_id) == 5
+
+
+@pytest.mark.parametrize('line', [
+    {'product_id': [1], 'quantity': 1},
+    {'product_id': {'id': 1}, 'quantity': 1},
+    {'product_id': True, 'quantity': 1},
+    {'product_id': 'abc', 'quantity': 1},
+    {'product_id': 99999999, 'quantity': 1},
+    {'quantity': 1},
+    {'product_id': 'PRODUCT', 'quantity': True},
+    {'product_id': 'PRODUCT', 'quantity': 1.5},
+    {'product_id': 'PRODUCT', 'quantity': 1, 'unit_cost': 'NaN'},
+    {'product_id': 'PRODUCT', 'quantity': 1, 'unit_cost': -1},
+    'not a line',
+])
+def test_invalid_lines_are_rejected(client, supplier_id, product_id, line):
+    if isinstance(line, dict) and line.get('product_id') == 'PRODUCT':
+        line = {**line, 'product_id': product_id}
+
+    response = create_order(client, supplier_id, [line])
+
+    assert response.status_code == 400
+
+
+def test_mixed_missing_ids_are_rejected(client, supplier_id):
+    response = create_order(client, supplier_id, [
+        {'product_id': '99999998', 'quantity': 1},
+        {'product_id': 99999999, 'quantity': 1}
+    ])
+
+    assert response.status_code == 400
+    assert '99999998' in response.get_json()['error']
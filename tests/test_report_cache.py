@@ -0,0 +1,54 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.models.database import db, ReportCache
+from src.services.report_cache import daily_period_key, monthly_period_key
+
+
+@pytest.fixture
+def product_id(client):
+    response = client.post('/api/products', json={
+        'name': 'منتج ذاكرة التقارير',
+        'price': 10,
+        'quantity': 100,
+        'serial_number': f'CACHE-{uuid.uuid4().hex}'
+    })
+    return response.get_json()['product_id']
+
+
+def cache_rows(app, day):
+    with app.app_context():
+        return {
+            (row.report_type, row.period_key): row.generation
+            for row in ReportCache.query.filter(ReportCache.period_key.in_(
+                (daily_period_key(day), monthly_period_key(day.year, day.month))
+            ))
+        }
+
+
+def test_sale_in_open_period_does_not_touch_report_cache(app, client, product_id):
+    today = datetime.utcnow().date()
+    before = cache_rows(app, today)
+
+    response = client.post('/api/sales', json={'items': [{'product_id': product_id, 'quantity': 1}]})
+
+    assert response.status_code == 201
+    assert cache_rows(app, today) == before
+
+
+def test_backdated_sale_invalidates_closed_report(app, client, product_id):
+    day = datetime.utcnow().date() - timedelta(days=40)
+    sale = {'items': [{'product_id': product_id, 'quantity': 1}], 'sale_date': f'{day.isoformat()}T12:00:00'}
+    client.post('/api/sales/batch', json=[sale])
+    report = client.get('/api/sales/reports/daily', query_string={'date': day.isoformat()}).get_json()
+    generations = cache_rows(app, day)
+
+    client.post('/api/sales/batch', json=[sale])
+
+    updated = client.get('/api/sales/reports/daily', query_string={'date': day.isoformat()}).get_json()
+    assert updated['total_transactions'] == report['total_transactions'] + 1
+    bumped = cache_rows(app, day)
+    assert bumped[('daily', daily_period_key(day))] > generations[('daily', daily_period_key(day))]
+    assert ('monthly', monthly_period_key(day.year, day.month)) in bumped
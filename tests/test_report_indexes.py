@@ -0,0 +1,90 @@
+import uuid
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+from src.models.database import db
+
+# الاستعلامات التي تنفذها مسارات التقارير والقوائم، والفهرس الذي يجب أن تستخدمه
+REPORT_QUERIES = [
+    ('/api/sales?start_date=2024-02-02&end_date=2024-02-04', 'ix_sales_sale_date_status'),
+    ('/api/sales?start_date=2024-02-02&end_date=2024-02-04', 'ix_sale_items_sale_id'),
+    ('/api/sales/reports/timeseries?bucket=hour&from=2024-02-02&to=2024-02-04', 'ix_sales_sale_date_status'),
+    ('/api/customers/{customer_id}/purchases?from=2024-02-02&to=2024-02-04', 'ix_sales_customer_id_sale_date'),
+]
+
+
+@pytest.fixture(scope='module')
+def customer_id(app):
+    client = app.test_client()
+    product = client.post('/api/products', json={
+        'name': 'منتج خطة الاستعلام',
+        'price': 10,
+        'quantity': 1000,
+        'serial_number': f'PLAN-{uuid.uuid4().hex}'
+    }).get_json()
+    customer = client.post('/api/customers', json={'name': 'عميل خطة الاستعلام'}).get_json()
+    client.post('/api/sales/batch', json=[{
+        'customer_id': customer['customer_id'],
+        'sale_date': f'2024-02-{day:02d}T10:00:00',
+        'items': [{'product_id': product['product_id'], 'quantity': 1}]
+    } for day in range(1, 10)])
+    return customer['customer_id']
+
+
+@contextmanager
+def _captured_selects(engine):
+    """جمل SELECT على جداول المبيعات التي ينفذها الطلب مع معاملاتها"""
+    statements = []
+
+    def capture(connection, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT') and 'sales' in statement:
+            statements.append((statement, parameters))
+
+    event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', capture)
+
+
+def _explain(connection, statement, parameters):
+    if connection.dialect.name == 'postgresql':
+        # الجداول صغيرة في الاختبار فيفضل المخطط المسح الكامل، وتعطيله يبين الفهرس الذي يمكن استخدامه
+        connection.exec_driver_sql('SET LOCAL enable_seqscan = off')
+        rows = connection.exec_driver_sql('EXPLAIN ' + statement, parameters).all()
+        return '\n'.join(row[0] for row in rows)
+    rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).all()
+    return '\n'.join(row[-1] for row in rows)
+
+
+def _request_plans(app, url):
+    with app.app_context():
+        engine = db.engine
+    with _captured_selects(engine) as statements:
+        response = app.test_client().get(url)
+    assert response.status_code == 200, response.get_json()
+    assert statements, f'{url} لم ينفذ أي استعلام على المبيعات'
+
+    with engine.begin() as connection:
+        return [_explain(connection, statement, parameters) for statement, parameters in statements]
+
+
+def _assert_uses_index(app, customer_id, url, index_name):
+    plans = _request_plans(app, url.format(customer_id=customer_id))
+    assert any(index_name in plan for plan in plans), '\n\n'.join(plans)
+
+
+@pytest.mark.parametrize('url, index_name', REPORT_QUERIES)
+def test_report_queries_use_indexes_sqlite(app, dialect, customer_id, url, index_name):
+    if dialect != 'sqlite':
+        pytest.skip('خطة SQLite فقط')
+    _assert_uses_index(app, customer_id, url, index_name)
+
+
+@pytest.mark.parametrize('url, index_name', REPORT_QUERIES)
+def test_report_queries_use_indexes_postgresql(app, dialect, customer_id, url, index_name):
+    if dialect != 'postgresql':
+        pytest.skip('يتطلب TEST_DATABASE_URL لقاعدة PostgreSQL')
+    _assert_uses_index(app, customer_id, url, index_name)
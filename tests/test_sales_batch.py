@@ -0,0 +1,74 @@
+import uuid
+
+import pytest
+
+from src.models.database import db, Sale
+
+
+@pytest.fixture
+def product_id(client):
+    response = client.post('/api/products', json={
+        'name': 'منتج دفعة المزامنة',
+        'price': 10,
+        'quantity': 100,
+        'serial_number': f'BATCH-{uuid.uuid4().hex}'
+    })
+    return response.get_json()['product_id']
+
+
+@pytest.mark.parametrize('bad_fields', [
+    {'unit_price': 'abc'},
+    {'discount_amount': 'x'},
+    {'tax_amount': 'NaN'},
+    {'items': {'product_id': 1, 'quantity': 1}},
+    {'items': ['x']},
+])
+def test_malformed_invoice_fails_alone(client, product_id, bad_fields):
+    good = {'items': [{'product_id': product_id, 'quantity': 1}]}
+    bad = {'items': [{'product_id': product_id, 'quantity': 1}]}
+    if 'unit_price' in bad_fields:
+        bad['items'][0]['unit_price'] = bad_fields['unit_price']
+    else:
+        bad.update(bad_fields)
+
+    response = client.post('/api/sales/batch', json=[good, bad])
+
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert [result['status'] for result in results] == ['created', 'failed']
+    assert client.get(f'/api/products/{product_id}').get_json()['quantity'] == 99
+
+
+def test_offset_aware_sale_date_stored_as_utc(app, client, product_id):
+    items = [{'product_id': product_id, 'quantity': 1}]
+    response = client.post('/api/sales/batch', json=[
+        {'items': items, 'sale_date': '2024-05-01T10:00:00+03:00', 'client_ref': 'aware'},
+        {'items': items, 'sale_date': '2024-05-01T09:00:00', 'client_ref': 'naive'},
+    ])
+
+    assert response.status_code == 200
+    results = {result['client_ref']: result for result in response.get_json()['results']}
+    assert all(result['status'] == 'created' for result in results.values())
+    with app.app_context():
+        sale = db.session.get(Sale, results['aware']['sale_id'])
+        assert sale.sale_date.isoformat() == '2024-05-01T07:00:00'
+
+
+def test_unknown_customer_fails_only_its_invoice(client, product_id):
+    customer_id = client.post('/api/customers', json={'name': 'عميل الدفعة'}).get_json()['customer_id']
+    items = [{'product_id': product_id, 'quantity': 1}]
+
+    response = client.post('/api/sales/batch', json=[
+        {'items': items, 'customer_id': customer_id},
+        {'items': items, 'customer_id': 99999999},
+        {'items': items, 'customer_id': str(customer_id)},
+        {'items': items, 'customer_id': [customer_id]},
+        {'items': items}
+    ])
+
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert [result['status'] for result in results] == ['created', 'failed', 'created', 'failed', 'created']
+    assert client.get(f'/api/products/{product_id}').get_json()['quantity'] == 97
+    with client.application.app_context():
+        assert db.session.get(Sale, results[2]['sale_id']).customer_id == customer_id
@@ -0,0 +1,80 @@
+import threading
+import uuid
+from collections import Counter
+
+from src.models.database import db, Product, SaleItem
+
+TERMINALS = 50
+
+
+def _create_product(client, quantity):
+    response = client.post('/api/products', json={
+        'name': 'جوال اختبار التزامن',
+        'price': 100,
+        'quantity': quantity,
+        'serial_number': f'STRESS-{uuid.uuid4().hex}'
+    })
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()['product_id']
+
+
+def _checkout_in_parallel(app, items):
+    """تشغيل TERMINALS عملية بيع متزامنة لنفس العناصر، ويرجع رموز الاستجابة"""
+    barrier = threading.Barrier(TERMINALS)
+    codes = []
+    lock = threading.Lock()
+
+    def checkout():
+        client = app.test_client()
+        barrier.wait()
+        response = client.post('/api/sales', json={'items': items, 'payment_method': 'cash'})
+        with lock:
+            codes.append(response.status_code)
+
+    threads = [threading.Thread(target=checkout) for _ in range(TERMINALS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return Counter(codes)
+
+
+def _stock_and_sold(app, product_id):
+    with app.app_context():
+        quantity = db.session.get(Product, product_id).quantity
+        sold = db.session.query(db.func.coalesce(db.func.sum(SaleItem.quantity), 0)).filter(
+            SaleItem.product_id == product_id
+        ).scalar()
+    return quantity, sold
+
+
+def test_parallel_checkouts_do_not_oversell(app, client):
+    initial_stock = 20
+    product_id = _create_product(client, initial_stock)
+
+    codes = _checkout_in_parallel(app, [{'product_id': product_id, 'quantity': 1}])
+
+    quantity, sold = _stock_and_sold(app, product_id)
+    assert quantity >= 0
+    assert codes[201] == initial_stock
+    assert codes[400] == TERMINALS - initial_stock
+    assert quantity == 0
+    assert sold == initial_stock
+
+
+def test_parallel_multi_line_checkouts_fail_whole_invoice(app, client):
+    # الفاتورة تشتري من منتجين، ونفاد أحدهما يجب أن يلغي الفاتورة كاملة دون خصم من الآخر
+    scarce_id = _create_product(client, 10)
+    plenty_id = _create_product(client, 1000)
+
+    codes = _checkout_in_parallel(app, [
+        {'product_id': plenty_id, 'quantity': 2},
+        {'product_id': scarce_id, 'quantity': 1}
+    ])
+
+    scarce_quantity, scarce_sold = _stock_and_sold(app, scarce_id)
+    plenty_quantity, plenty_sold = _stock_and_sold(app, plenty_id)
+    assert codes[201] == 10
+    assert codes[400] == TERMINALS - 10
+    assert scarce_quantity == 0 and scarce_sold == 10
+    assert plenty_sold == 20 and plenty_quantity == 1000 - 20
@@ -0,0 +1,48 @@
+import uuid
+
+import pytest
+
+
+@pytest.fixture
+def product_id(client):
+    response = client.post('/api/products', json={
+        'name': 'منتج معرفات الفاتورة',
+        'price': 10,
+        'quantity': 10,
+        'serial_number': f'ITEMS-{uuid.uuid4().hex}'
+    })
+    return response.get_json()['product_id']
+
+
+def test_string_product_id_is_accepted(client, product_id):
+    response = client.post('/api/sales', json={
+        'items': [{'product_id': str(product_id), 'quantity': 2}, {'product_id': product_id, 'quantity': 1}]
+    })
+
+    assert response.status_code == 201, response.get_json()
+    assert response.get_json()['total_amount'] == 30.0
+    assert client.get(f'/api/products/{product_id}').get_json()['quantity'] == 7
+
+
+def test_string_product_id_is_accepted_in_batch(client, product_id):
+    response = client.post('/api/sales/batch', json=[{'items': [{'product_id': str(product_id), 'quantity': 1}]}])
+
+    assert response.status_code == 200
+    assert response.get_json()['results'][0]['status'] == 'created'
+    assert client.get(f'/api/products/{product_id}').get_json()['quantity'] == 9
+
+
+@pytest.mark.parametrize('bad_id', [[1], {'id': 1}, True, 1.5, 'abc', -1])
+def test_invalid_product_id_is_rejected(client, product_id, bad_id):
+    response = client.post('/api/sales', json={'items': [{'product_id': bad_id, 'quantity': 1}]})
+
+    assert response.status_code == 400
+    assert client.get(f'/api/products/{product_id}').get_json()['quantity'] == 10
+
+
+@pytest.mark.parametrize('bad_quantity', [True, 1.0, '1', 0])
+def test_invalid_quantity_is_rejected(client, product_id, bad_quantity):
+    response = client.post('/api/sales', json={'items': [{'product_id': product_id, 'quantity': bad_quantity}]})
+
+    assert response.status_code == 400
+    assert client.get(f'/api/products/{product_id}').get_json()['quantity'] == 10
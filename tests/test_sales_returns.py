@@ -0,0 +1,42 @@
+import uuid
+
+import pytest
+
+
+@pytest.fixture
+def sale(client):
+    product = client.post('/api/products', json={
+        'name': 'منتج المرتجعات',
+        'price': 10,
+        'quantity': 10,
+        'serial_number': f'RETURN-{uuid.uuid4().hex}'
+    }).get_json()
+    sale_id = client.post('/api/sales', json={
+        'items': [{'product_id': product['product_id'], 'quantity': 3}]
+    }).get_json()['sale_id']
+    item = client.get(f'/api/sales/{sale_id}').get_json()['items'][0]
+    return sale_id, item['sale_item_id'], product['product_id']
+
+
+def test_string_sale_item_id_is_coerced(client, sale):
+    sale_id, sale_item_id, product_id = sale
+
+    response = client.post(f'/api/sales/{sale_id}/returns', json={
+        'lines': [{'sale_item_id': str(sale_item_id), 'quantity': 1}]
+    })
+
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json()['returns'][0]['sale_item_id'] == sale_item_id
+    assert client.get(f'/api/products/{product_id}').get_json()['quantity'] == 8
+
+
+@pytest.mark.parametrize('bad_id', ['abc', 1.5, True, [1], {'id': 1}])
+def test_invalid_sale_item_id_is_rejected(client, sale, bad_id):
+    sale_id, _, product_id = sale
+
+    response = client.post(f'/api/sales/{sale_id}/returns', json={
+        'lines': [{'sale_item_id': bad_id, 'quantity': 1}]
+    })
+
+    assert response.status_code == 400
+    assert client.get(f'/api/products/{product_id}').get_json()['quantity'] == 7
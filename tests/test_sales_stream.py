@@ -0,0 +1,85 @@
+import json
+import uuid
+
+import pytest
+
+from src.services.live_sales import live_sales_feed
+
+
+@pytest.fixture
+def one_subscriber(app):
+    previous = app.config.get('LIVE_SALES_MAX_SUBSCRIBERS')
+    app.config['LIVE_SALES_MAX_SUBSCRIBERS'] = 1
+    yield
+    app.config['LIVE_SALES_MAX_SUBSCRIBERS'] = previous
+
+
+def test_stream_rejects_subscribers_over_limit(client, one_subscriber):
+    first = client.get('/api/sales/stream', buffered=False)
+    assert first.status_code == 200
+
+    second = client.get('/api/sales/stream', buffered=False)
+    assert second.status_code == 503
+    assert second.headers['Retry-After']
+    assert second.get_json()['poll_url'] == '/api/sales/reports/daily'
+
+    # إغلاق الاتصال الأول يحرر مكانه
+    first.close()
+    assert not live_sales_feed._subscribers
+    third = client.get('/api/sales/stream', buffered=False)
+    assert third.status_code == 200
+    third.close()
+
+
+@pytest.fixture
+def product_id(client):
+    response = client.post('/api/products', json={
+        'name': 'منتج البث المباشر',
+        'price': 25,
+        'quantity': 50,
+        'serial_number': f'LIVE-{uuid.uuid4().hex}'
+    })
+    return response.get_json()['product_id']
+
+
+def next_event(chunks):
+    """أول رسالة حدث من البث بعد تجاوز رسائل الإبقاء على الاتصال"""
+    for chunk in chunks:
+        text = chunk.decode() if isinstance(chunk, bytes) else chunk
+        if text.startswith('event: '):
+            name, data = text.split('\n')[:2]
+            return name[len('event: '):], json.loads(data[len('data: '):])
+
+
+def test_committed_sale_is_streamed_to_subscriber(client, product_id):
+    stream = client.get('/api/sales/stream', buffered=False)
+    chunks = iter(stream.response)
+    event_name, snapshot = next_event(chunks)
+    assert event_name == 'snapshot'
+
+    response = client.post('/api/sales', json={'items': [{'product_id': product_id, 'quantity': 2}]})
+    assert response.status_code == 201
+
+    event_name, update = next_event(chunks)
+    stream.close()
+    assert event_name == 'update'
+    assert update['delta']['total_transactions'] == 1
+    assert update['delta']['total_sales'] == 50.0
+    assert update['total_transactions'] == snapshot['total_transactions'] + 1
+    assert update['delta']['products'] == [
+        {'product_id': product_id, 'name': 'منتج البث المباشر', 'quantity': 2}
+    ]
+
+
+def test_failing_feed_does_not_fail_committed_sale(client, product_id, monkeypatch):
+    def broken_publish(sales, returns):
+        raise RuntimeError('feed down')
+
+    monkeypatch.setattr(live_sales_feed, 'publish', broken_publish)
+
+    response = client.post('/api/sales', json={'items': [{'product_id': product_id, 'quantity': 1}]})
+
+    assert response.status_code == 201
+    sale = client.get(f"/api/sales/{response.get_json()['sale_id']}").get_json()
+    assert sale['items'][0]['quantity'] == 1
+    assert client.get(f'/api/products/{product_id}').get_json()['quantity'] == 49